@@ -0,0 +1,221 @@
+#!/usr/bin/env python
+"""
+MIT License
+
+Copyright (c) 2017 Raphael "rGunti" Guntersweiler
+
+Permission is hereby granted, free of charge, to any person obtaining a copy
+of this software and associated documentation files (the "Software"), to deal
+in the Software without restriction, including without limitation the rights
+to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+copies of the Software, and to permit persons to whom the Software is
+furnished to do so, subject to the following conditions:
+
+The above copyright notice and this permission notice shall be included in all
+copies or substantial portions of the Software.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+SOFTWARE.
+"""
+from math import radians, sin, cos, tan, atan, atan2, sqrt, isnan
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+# WGS-84 Ellipsoid
+WGS84_A = 6378137.0  # Semi-major axis in [m]
+WGS84_F = 1 / 298.257223563  # Flattening
+WGS84_B = WGS84_A * (1 - WGS84_F)  # Semi-minor axis in [m]
+WGS84_E2 = WGS84_F * (2 - WGS84_F)  # First eccentricity squared
+
+# Mean earth radius in [m] used by the Haversine formula
+EARTH_RADIUS = 6371008.8
+
+METHOD_HAVERSINE = 'haversine'
+METHOD_ELLIPSOID = 'ellipsoid'
+METHOD_VINCENTY = 'vincenty'
+
+VINCENTY_MAX_ITERATIONS = 200
+VINCENTY_TOLERANCE = 1e-12
+
+
+def haversine_distance(lat1, lon1, lat2, lon2):
+    """
+    Great circle distance on a sphere with the mean earth radius.
+    Off by up to 0.6% compared to the ellipsoid.
+    :param float lat1: Latitude of the first point in degrees
+    :param float lon1: Longitude of the first point in degrees
+    :param float lat2: Latitude of the second point in degrees
+    :param float lon2: Longitude of the second point in degrees
+    :return float: Distance in meters
+    """
+    phi1 = radians(lat1)
+    phi2 = radians(lat2)
+    a = sin((phi2 - phi1) / 2) ** 2 + cos(phi1) * cos(phi2) * sin(radians(lon2 - lon1) / 2) ** 2
+    return 2 * EARTH_RADIUS * atan2(sqrt(a), sqrt(1 - a))
+
+
+def ellipsoid_distance(lat1, lon1, lat2, lon2):
+    """
+    Flat earth approximation using the radii of curvature of the WGS-84 ellipsoid
+    at the mean latitude of both points. Needs no iteration and only one
+    trigonometric call. The error stays in the millimeter range for the
+    distance between two GPS samples, but grows with the distance
+    (a few meters at 100 km), so it should only be used for short distances.
+    :param float lat1: Latitude of the first point in degrees
+    :param float lon1: Longitude of the first point in degrees
+    :param float lat2: Latitude of the second point in degrees
+    :param float lon2: Longitude of the second point in degrees
+    :return float: Distance in meters
+    """
+    phi = radians((lat1 + lat2) / 2.0)
+    cos_phi = cos(phi)
+    w2 = 1 - WGS84_E2 * (1 - cos_phi * cos_phi)
+    w = sqrt(w2)
+    # Radius of curvature in the prime vertical (N) and in the meridian (M)
+    n = WGS84_A / w
+    m = n * (1 - WGS84_E2) / w2
+
+    d_lon = lon2 - lon1
+    if d_lon > 180:
+        d_lon -= 360
+    elif d_lon < -180:
+        d_lon += 360
+
+    dx = radians(d_lon) * n * cos_phi
+    dy = radians(lat2 - lat1) * m
+    return sqrt(dx * dx + dy * dy)
+
+
+def vincenty_distance(lat1, lon1, lat2, lon2):
+    """
+    Distance on the WGS-84 ellipsoid using Vincenty's inverse formula
+    (same as geopy.distance.vincenty). Accurate to less than a millimeter,
+    but iterative and therefore slow.
+    Returns NaN if the formula does not converge (nearly antipodal points).
+    :param float lat1: Latitude of the first point in degrees
+    :param float lon1: Longitude of the first point in degrees
+    :param float lat2: Latitude of the second point in degrees
+    :param float lon2: Longitude of the second point in degrees
+    :return float: Distance in meters
+    """
+    if isnan(lat1) or isnan(lat2):
+        return float('nan')
+    if lat1 == lat2 and lon1 == lon2:
+        return 0.0
+
+    u1 = atan((1 - WGS84_F) * tan(radians(lat1)))
+    u2 = atan((1 - WGS84_F) * tan(radians(lat2)))
+    sin_u1, cos_u1 = sin(u1), cos(u1)
+    sin_u2, cos_u2 = sin(u2), cos(u2)
+
+    l = radians(lon2 - lon1)
+    lam = l
+    for i in range(VINCENTY_MAX_ITERATIONS):
+        sin_lam, cos_lam = sin(lam), cos(lam)
+        sin_sigma = sqrt((cos_u2 * sin_lam) ** 2 + (cos_u1 * sin_u2 - sin_u1 * cos_u2 * cos_lam) ** 2)
+        if sin_sigma == 0:
+            return 0.0
+        cos_sigma = sin_u1 * sin_u2 + cos_u1 * cos_u2 * cos_lam
+        sigma = atan2(sin_sigma, cos_sigma)
+        sin_alpha = cos_u1 * cos_u2 * sin_lam / sin_sigma
+        cos2_alpha = 1 - sin_alpha ** 2
+        cos_2sigma_m = cos_sigma - 2 * sin_u1 * sin_u2 / cos2_alpha if cos2_alpha != 0 else 0
+        c = WGS84_F / 16 * cos2_alpha * (4 + WGS84_F * (4 - 3 * cos2_alpha))
+        lam_prev = lam
+        lam = l + (1 - c) * WGS84_F * sin_alpha * (
+            sigma + c * sin_sigma * (cos_2sigma_m + c * cos_sigma * (-1 + 2 * cos_2sigma_m ** 2)))
+        if abs(lam - lam_prev) < VINCENTY_TOLERANCE:
+            break
+    else:
+        return float('nan')
+
+    u_sq = cos2_alpha * (WGS84_A ** 2 - WGS84_B ** 2) / WGS84_B ** 2
+    a = 1 + u_sq / 16384 * (4096 + u_sq * (-768 + u_sq * (320 - 175 * u_sq)))
+    b = u_sq / 1024 * (256 + u_sq * (-128 + u_sq * (74 - 47 * u_sq)))
+    delta_sigma = b * sin_sigma * (cos_2sigma_m + b / 4 * (
+        cos_sigma * (-1 + 2 * cos_2sigma_m ** 2) -
+        b / 6 * cos_2sigma_m * (-3 + 4 * sin_sigma ** 2) * (-3 + 4 * cos_2sigma_m ** 2)))
+    return WGS84_B * a * (sigma - delta_sigma)
+
+
+DISTANCE_FUNCTIONS = {
+    METHOD_HAVERSINE: haversine_distance,
+    METHOD_ELLIPSOID: ellipsoid_distance,
+    METHOD_VINCENTY: vincenty_distance
+}
+
+
+def get_distance_function(method):
+    """
+    Returns the distance function for the given method
+    (haversine, ellipsoid or vincenty)
+    :param str method:
+    :return function:
+    """
+    if method not in DISTANCE_FUNCTIONS:
+        raise ValueError('Unknown distance method "{}"'.format(method))
+    return DISTANCE_FUNCTIONS[method]
+
+
+def _get_path_distances_numpy(lats, lons, method):
+    """
+    Vectorized version of get_path_distances (Haversine and ellipsoid only)
+    """
+    phi = numpy.radians(numpy.asarray(lats, dtype=numpy.float64))
+    lam = numpy.asarray(lons, dtype=numpy.float64)
+    d_phi = numpy.diff(phi)
+    d_lam = numpy.radians((numpy.diff(lam) + 180) % 360 - 180)
+
+    if method == METHOD_HAVERSINE:
+        a = numpy.sin(d_phi / 2) ** 2 + numpy.cos(phi[:-1]) * numpy.cos(phi[1:]) * numpy.sin(d_lam / 2) ** 2
+        return 2 * EARTH_RADIUS * numpy.arctan2(numpy.sqrt(a), numpy.sqrt(1 - a))
+
+    cos_phi = numpy.cos((phi[:-1] + phi[1:]) / 2)
+    w2 = 1 - WGS84_E2 * (1 - cos_phi * cos_phi)
+    n = WGS84_A / numpy.sqrt(w2)
+    m = n * (1 - WGS84_E2) / w2
+    return numpy.hypot(d_lam * n * cos_phi, d_phi * m)
+
+
+def get_path_distances(lats, lons, method=METHOD_ELLIPSOID):
+    """
+    Returns the distance between every two consecutive points of a path.
+    Segments with a missing (NaN) point have a distance of NaN.
+    Uses numpy if it is available (except for the vincenty method).
+    :param list of float lats: Latitudes in degrees (list, array.array or numpy array)
+    :param list of float lons: Longitudes in degrees
+    :param str method: haversine, ellipsoid or vincenty
+    :return list of float: One distance in meters less than there are points
+    """
+    f = get_distance_function(method)
+    if len(lats) < 2:
+        return []
+    if numpy is not None and method != METHOD_VINCENTY:
+        return _get_path_distances_numpy(lats, lons, method)
+    return [f(lats[i - 1], lons[i - 1], lats[i], lons[i]) for i in range(1, len(lats))]
+
+
+def get_path_distance(lats, lons, method=METHOD_ELLIPSOID):
+    """
+    Returns the length of a path in meters, segments with a missing point are skipped
+    :param list of float lats: Latitudes in degrees
+    :param list of float lons: Longitudes in degrees
+    :param str method: haversine, ellipsoid or vincenty
+    :return float:
+    """
+    distances = get_path_distances(lats, lons, method)
+    if numpy is not None and isinstance(distances, numpy.ndarray):
+        return float(numpy.nansum(distances))
+    return sum([d for d in distances if not isnan(d)])
+
+
+if __name__ == "__main__":
+    print("This script is not intended to be run standalone!")
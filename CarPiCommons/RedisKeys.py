@@ -23,6 +23,13 @@ OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
 SOFTWARE.
 """
 
+# Value Types used in the key schemas (see KEY_SCHEMA)
+TYPE_STR = 'str'  # type: str
+TYPE_UNICODE = 'unicode'  # type: str
+TYPE_INT = 'int'  # type: str
+TYPE_FLOAT = 'float'  # type: str
+TYPE_DATETIME = 'datetime'  # type: str
+
 
 class GpsRedisKeys:
     KEY_LATITUDE = 'GPS.Latitude'  # type: str
@@ -75,6 +82,43 @@ class GpsRedisKeys:
         KEY_LAST_UPDATED
     ]
 
+    # Struct format of float values when using the packed encoding
+    PACKED_FLOAT_FORMAT = 'd'  # type: str
+
+    # Hash used when storing values in the hash layout
+    HASH = 'GPS'  # type: str
+    HASH_KEYS = KEYS + [
+        KEY_LOCATION_COUNTRY,
+        KEY_LOCATION_CITY,
+        KEY_LOCATION_ADMIN1,
+        KEY_LOCATION_ADMIN2
+    ]
+
+    # Type and default value of each key
+    SCHEMA = {
+        KEY_ALIVE: (TYPE_DATETIME, None),
+        KEY_LATITUDE: (TYPE_FLOAT, None),
+        KEY_LONGITUDE: (TYPE_FLOAT, None),
+        KEY_ALTITUDE: (TYPE_FLOAT, None),
+        KEY_FIX_MODE: (TYPE_INT, 0),
+        KEY_EPX: (TYPE_FLOAT, None),
+        KEY_EPY: (TYPE_FLOAT, None),
+        KEY_EPV: (TYPE_FLOAT, None),
+        KEY_EPT: (TYPE_FLOAT, None),
+        KEY_EPD: (TYPE_FLOAT, None),
+        KEY_EPS: (TYPE_FLOAT, None),
+        KEY_EPC: (TYPE_FLOAT, None),
+        KEY_CLIMB: (TYPE_FLOAT, None),
+        KEY_TRACK: (TYPE_FLOAT, None),
+        KEY_SPEED: (TYPE_FLOAT, None),
+        KEY_SPEED_KMH: (TYPE_FLOAT, None),
+        KEY_SPEED_MPH: (TYPE_FLOAT, None),
+        KEY_LOCATION_COUNTRY: (TYPE_UNICODE, None),
+        KEY_LOCATION_CITY: (TYPE_UNICODE, None),
+        KEY_LOCATION_ADMIN1: (TYPE_UNICODE, None),
+        KEY_LOCATION_ADMIN2: (TYPE_UNICODE, None)
+    }
+
 
 class PersistentGpsRedisKeys:
     KEY_ODO = 'GPS.ODO'
@@ -90,6 +134,13 @@ class PersistentGpsRedisKeys:
         KEY_TRIP_A_RECORDING
     ]
 
+    # Type and default value of each key
+    SCHEMA = {
+        KEY_ODO: (TYPE_FLOAT, None),
+        KEY_TRIP_A: (TYPE_FLOAT, None),
+        KEY_TRIP_B: (TYPE_FLOAT, None)
+    }
+
 
 class NetworkInfoRedisKeys:
     KEY_ETH0_IP = 'Net.eth0.IP'  # type: str
@@ -113,6 +164,19 @@ class NetworkInfoRedisKeys:
         KEY_WLAN1_SSID
     ]
 
+    # Type and default value of each key
+    SCHEMA = {
+        KEY_ALIVE: (TYPE_DATETIME, None),
+        KEY_WLAN0_STRENGTH: (TYPE_INT, 0),
+        KEY_WLAN0_SSID: (TYPE_UNICODE, None),
+        KEY_WLAN1_STRENGTH: (TYPE_INT, 0),
+        KEY_WLAN1_SSID: (TYPE_UNICODE, None)
+    }
+
+    # Hash used when storing values in the hash layout
+    HASH = 'Net'  # type: str
+    HASH_KEYS = KEYS
+
 
 class MpdDataRedisKeys:
     KEY_STATE = 'MPD.State'  # type: str
@@ -139,6 +203,30 @@ class MpdDataRedisKeys:
         KEY_VOLUME
     ]
 
+    # Hash used when storing values in the hash layout
+    HASH = 'MPD'  # type: str
+    HASH_KEYS = KEYS + [
+        KEY_STATE,
+        KEY_SONG_LENGTH,
+        KEY_SONG_LENGTH_FORMATTED,
+        KEY_RANDOM,
+        KEY_REPEAT
+    ]
+
+    # Type and default value of each key
+    SCHEMA = {
+        KEY_ALIVE: (TYPE_DATETIME, None),
+        KEY_SONG_TITLE: (TYPE_UNICODE, u''),
+        KEY_SONG_ARTIST: (TYPE_UNICODE, u''),
+        KEY_SONG_ALBUM: (TYPE_UNICODE, u''),
+        KEY_SONG_LENGTH: (TYPE_INT, 0),
+        KEY_CURRENT_TIME: (TYPE_STR, '0:0'),
+        KEY_CURRENT_TIME_FORMATTED: (TYPE_STR, '--:--/--:--'),
+        KEY_VOLUME: (TYPE_INT, 100),
+        KEY_RANDOM: (TYPE_INT, 0),
+        KEY_REPEAT: (TYPE_INT, 0)
+    }
+
 
 class MpdCommandRedisKeys:
     KEY_ALIVE = MpdDataRedisKeys.KEY_ALIVE
@@ -150,6 +238,9 @@ class MpdCommandRedisKeys:
     COMMAND_NEXT = 'CommandRequest(MPD.Next)'
     COMMAND_PREV = 'CommandRequest(MPD.Prev)'
 
+    # List the Command Requests are queued in
+    COMMAND_QUEUE = 'CommandQueue(MPD)'
+
     # Parameters
     # COMMAND_PAUSE
     PARAM_PAUSE_VALUE = 'PauseValue'
@@ -199,6 +290,202 @@ class ObdRedisKeys:
         KEY_O2_SENSOR_CURRENT
     ]
 
+    # Struct format of float values when using the packed encoding
+    # (float32 is more precise than any value the adapter reports)
+    PACKED_FLOAT_FORMAT = 'f'  # type: str
+
+    # Hash used when storing values in the hash layout
+    HASH = 'OBD'  # type: str
+    HASH_KEYS = KEYS + [
+        KEY_COOLANT_TEMP,
+        KEY_FUELSYS_1_STATUS,
+        KEY_FUELSYS_2_STATUS,
+        KEY_MIL_STATUS,
+        KEY_DTC_COUNT,
+        KEY_CURRENT_DTCS,
+        KEY_PENDING_DTCS
+    ]
+
+    # Type and default value of each key
+    SCHEMA = {
+        KEY_ALIVE: (TYPE_INT, None),
+        KEY_BATTERY_VOLTAGE: (TYPE_FLOAT, None),
+        KEY_ENGINE_LOAD: (TYPE_FLOAT, None),
+        KEY_COOLANT_TEMP: (TYPE_FLOAT, None),
+        KEY_INTAKE_MAP: (TYPE_FLOAT, None),
+        KEY_ENGINE_RPM: (TYPE_FLOAT, None),
+        KEY_VEHICLE_SPEED: (TYPE_FLOAT, None),
+        KEY_INTAKE_TEMP: (TYPE_FLOAT, None),
+        KEY_O2_SENSOR_FAEQV: (TYPE_FLOAT, None),
+        KEY_O2_SENSOR_CURRENT: (TYPE_FLOAT, None),
+        KEY_DTC_COUNT: (TYPE_INT, None)
+    }
+
+
+class PersistentObdRedisKeys:
+    # Supported PIDs per vehicle (VIN) or adapter,
+    # use get_supported_pids_key to build the key
+    KEY_SUPPORTED_PIDS = 'OBD.SupportedPIDs'
+
+    @staticmethod
+    def get_supported_pids_key(identity):
+        """
+        :param str identity: VIN or adapter address
+        :return str:
+        """
+        return PersistentObdRedisKeys.KEY_SUPPORTED_PIDS + '(' + identity + ')'
+
+
+class FusionRedisKeys:
+    KEY_SPEED = 'Fusion.Speed'  # type: str
+    KEY_SPEED_KMH = 'Fusion.Speed.KMH'  # type: str
+    KEY_TRACK = 'Fusion.Track'  # type: str
+    KEY_LATITUDE = 'Fusion.Latitude'  # type: str
+    KEY_LONGITUDE = 'Fusion.Longitude'  # type: str
+    KEY_EPX = 'Fusion.EPX'  # type: str
+    KEY_EPY = 'Fusion.EPY'  # type: str
+
+    KEY_ALIVE = 'DaemonAlive.Fusion'  # type: str
+
+    KEYS = [
+        KEY_ALIVE,
+        KEY_SPEED,
+        KEY_SPEED_KMH,
+        KEY_TRACK,
+        KEY_LATITUDE,
+        KEY_LONGITUDE,
+        KEY_EPX,
+        KEY_EPY
+    ]
+
+    # Struct format of float values when using the packed encoding
+    PACKED_FLOAT_FORMAT = 'd'  # type: str
+
+    # Hash used when storing values in the hash layout
+    HASH = 'Fusion'  # type: str
+    HASH_KEYS = KEYS
+
+    # Type and default value of each key
+    SCHEMA = {
+        KEY_ALIVE: (TYPE_DATETIME, None),
+        KEY_SPEED: (TYPE_FLOAT, None),
+        KEY_SPEED_KMH: (TYPE_FLOAT, None),
+        KEY_TRACK: (TYPE_FLOAT, None),
+        KEY_LATITUDE: (TYPE_FLOAT, None),
+        KEY_LONGITUDE: (TYPE_FLOAT, None),
+        KEY_EPX: (TYPE_FLOAT, None),
+        KEY_EPY: (TYPE_FLOAT, None)
+    }
+
+
+class HistoryRedisKeys:
+    # History (capped time series) of a value, use get_history_key to build the key
+    KEY_HISTORY = 'History'
+
+    # Values recorded by the GPS Daemon
+    GPS_KEYS = [
+        GpsRedisKeys.KEY_SPEED_KMH,
+        GpsRedisKeys.KEY_ALTITUDE
+    ]
+
+    # Values recorded by the OBD Daemon (all inputs of the fuel consumption)
+    OBD_KEYS = [
+        ObdRedisKeys.KEY_VEHICLE_SPEED,
+        ObdRedisKeys.KEY_ENGINE_RPM,
+        ObdRedisKeys.KEY_INTAKE_MAP,
+        ObdRedisKeys.KEY_INTAKE_TEMP
+    ]
+
+    @staticmethod
+    def get_history_key(key):
+        """
+        :param str key: Key of the recorded value
+        :return str:
+        """
+        return HistoryRedisKeys.KEY_HISTORY + '(' + key + ')'
+
+
+def _build_hash_key_map(sources):
+    """
+    :param list sources: Key classes with a HASH and HASH_KEYS attribute
+    :return dict of (str, str):
+    """
+    key_map = {}
+    for source in sources:
+        for key in source.HASH_KEYS:
+            key_map[key] = source.HASH
+    return key_map
+
+
+# Maps each key to the hash it is stored in when using the hash layout
+HASH_KEY_MAP = _build_hash_key_map([
+    GpsRedisKeys,
+    NetworkInfoRedisKeys,
+    MpdDataRedisKeys,
+    ObdRedisKeys,
+    FusionRedisKeys
+])  # type: dict of (str, str)
+
+
+def _build_key_schema(sources):
+    """
+    :param list sources: Key classes with a SCHEMA attribute
+    :return dict of (str, tuple of (str, object)):
+    """
+    schema = {}
+    for source in sources:
+        schema.update(source.SCHEMA)
+    return schema
+
+
+# Type and default value of each key, keys not listed here are kept as they are stored in Redis
+KEY_SCHEMA = _build_key_schema([
+    GpsRedisKeys,
+    PersistentGpsRedisKeys,
+    NetworkInfoRedisKeys,
+    MpdDataRedisKeys,
+    ObdRedisKeys,
+    FusionRedisKeys
+])  # type: dict of (str, tuple of (str, object))
+
+
+def _build_packed_float_format_map(sources):
+    """
+    :param list sources: Key classes with a PACKED_FLOAT_FORMAT and HASH_KEYS attribute
+    :return dict of (str, str):
+    """
+    format_map = {}
+    for source in sources:
+        for key in source.HASH_KEYS:
+            format_map[key] = source.PACKED_FLOAT_FORMAT
+    return format_map
+
+
+# Maps each key which may be stored in the packed encoding to the struct format of its float values
+PACKED_FLOAT_FORMAT_MAP = _build_packed_float_format_map([
+    GpsRedisKeys,
+    ObdRedisKeys,
+    FusionRedisKeys
+])  # type: dict of (str, str)
+
+
+def _build_command_queue_map(sources):
+    """
+    :param list sources: Key classes with a COMMAND_QUEUE and COMMANDS attribute
+    :return dict of (str, str):
+    """
+    queue_map = {}
+    for source in sources:
+        for command in source.COMMANDS:
+            queue_map[command] = source.COMMAND_QUEUE
+    return queue_map
+
+
+# Maps each command to the queue its requests are sent to
+COMMAND_QUEUE_MAP = _build_command_queue_map([
+    MpdCommandRedisKeys
+])  # type: dict of (str, str)
+
 
 def prepare_dict(keys, default_value=None):
     dict = {}
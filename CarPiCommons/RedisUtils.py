@@ -23,12 +23,21 @@ OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
 SOFTWARE.
 """
 
-from redis import Redis, exceptions
+from redis import Redis, ConnectionPool, UnixDomainSocketConnection, exceptions
 from CarPiLogging import log
 from CarPiThreading import CarPiThread
 from ConfigParser import ConfigParser, NoOptionError
-from time import sleep
-
+from RedisKeys import HASH_KEY_MAP, COMMAND_QUEUE_MAP, KEY_SCHEMA, PACKED_FLOAT_FORMAT_MAP, HistoryRedisKeys, \
+    prepare_dict, TYPE_STR, TYPE_UNICODE, TYPE_INT, TYPE_FLOAT, TYPE_DATETIME
+from json import dumps, loads
+from calendar import timegm
+from datetime import datetime, timedelta
+from math import ceil, isnan
+from struct import Struct, error as StructError
+from threading import Event, Lock
+from time import sleep, time
+
+import pytz
 
 # Config Sections and Keys
 RCONFIG_SECTION = 'Redis'
@@ -36,10 +45,102 @@ RCONFIG_PERSISTENT_SECTION = 'Persistent_Redis'
 RCONFIG_KEY_HOST = 'host'
 RCONFIG_KEY_PORT = 'port'
 RCONFIG_KEY_DB = 'db'
+RCONFIG_KEY_SOCKET = 'socket'
 RCONFIG_KEY_EXPIRE = 'expire'
+RCONFIG_KEY_LAYOUT = 'layout'
+RCONFIG_KEY_NOTIFY = 'notify'
+RCONFIG_KEY_ENCODING = 'encoding'
+
+# Storage Layouts
+# keys: every value is stored in its own key (e.g. GPS.Latitude)
+# hash: values are stored in one hash per source (e.g. GPS), see RedisKeys.HASH_KEY_MAP
+# both: values are written in both layouts and read from their keys (for migrating)
+LAYOUT_KEYS = 'keys'
+LAYOUT_HASH = 'hash'
+LAYOUT_BOTH = 'both'
 
 RCONFIG_VALUE_EXPIRE = None
 RCONFIG_VALUE_EXPIRE_COMMANDS = 5
+RCONFIG_VALUE_LAYOUT = LAYOUT_KEYS
+RCONFIG_VALUE_NOTIFY = False
+
+# Value Encodings
+# text: every value is stored as a string
+# packed: float values and timestamps of the keys in RedisKeys.PACKED_FLOAT_FORMAT_MAP
+#         are stored as PACKED_PREFIX + type code + struct-packed value,
+#         readers detect packed values on their own
+ENCODING_TEXT = 'text'
+ENCODING_PACKED = 'packed'
+RCONFIG_VALUE_ENCODING = ENCODING_TEXT
+
+PACKED_PREFIX = '\x00'
+PACKED_TYPE_TIMESTAMP = 't'  # milliseconds since epoch (UTC)
+PACKED_STRUCTS = {
+    'f': Struct('<f'),
+    'd': Struct('<d'),
+    PACKED_TYPE_TIMESTAMP: Struct('<q')
+}
+
+# Text form of timestamps (as written by str(datetime), without the UTC offset)
+DATETIME_TEXT_FORMAT = '%Y-%m-%d %H:%M:%S.%f'
+
+# Command Requests are queued as JSON objects in a list per request processor
+COMMAND_QUEUE_DEFAULT = 'CommandQueue'
+COMMAND_FIELD_NAME = 'command'
+COMMAND_FIELD_PARAMS = 'params'
+
+# Change notifications are published on one channel per source,
+# the message contains the changed keys separated by CHANGE_SEPARATOR
+CHANGE_CHANNEL_PREFIX = 'CarPi.Changed.'
+CHANGE_CHANNEL_OTHER = 'Other'
+CHANGE_SEPARATOR = ','
+
+REDIS_CONNECT_TIMEOUT = 5
+
+# History Config
+HCONFIG_SECTION = 'History'
+HCONFIG_KEY_ENABLED = 'enabled'
+HCONFIG_KEY_MAX_SAMPLES = 'max_samples'
+HCONFIG_KEY_INTERVAL = 'interval'
+
+# Samples are stored as members of a sorted set scored by their time in milliseconds,
+# the member contains the time as well to keep equal values apart: <time>:<value>
+HISTORY_SEPARATOR = ':'
+HISTORY_DEFAULT_MAX_SAMPLES = 1200
+HISTORY_DEFAULT_INTERVAL = 0.5
+
+# Redis clients shared by the whole process, one per server and database.
+# All fetchers, publishers and command senders talking to the same database
+# share the connection pool of its client.
+_REDIS_CLIENTS = {}  # type: dict of (tuple, Redis)
+_REDIS_CLIENTS_LOCK = Lock()
+
+
+def get_shared_redis(host='localhost', port=6379, db=0, socket=None):
+    """
+    Returns the Redis client of this process for the given server and database.
+    The client is created on first use, later calls with the same server and
+    database return the same client (and thus use the same connection pool).
+    :param str host: Host name (ignored if a socket is given)
+    :param int port: Port (ignored if a socket is given)
+    :param int db: Database
+    :param str|None socket: Path to a Unix Domain Socket
+    :return Redis:
+    """
+    key = (socket, db) if socket else (host, port, db)
+    with _REDIS_CLIENTS_LOCK:
+        if key not in _REDIS_CLIENTS:
+            if socket:
+                pool = ConnectionPool(connection_class=UnixDomainSocketConnection,
+                                      path=socket,
+                                      db=db)
+            else:
+                pool = ConnectionPool(host=host,
+                                      port=port,
+                                      db=db,
+                                      socket_connect_timeout=REDIS_CONNECT_TIMEOUT)
+            _REDIS_CLIENTS[key] = Redis(connection_pool=pool)
+        return _REDIS_CLIENTS[key]
 
 
 def _get_redis(config, section):
@@ -48,10 +149,16 @@ def _get_redis(config, section):
     :param str section:
     :return Redis:
     """
-    return Redis(host=config.get(section, RCONFIG_KEY_HOST),
-                 port=config.getint(section, RCONFIG_KEY_PORT),
-                 db=config.get(section, RCONFIG_KEY_DB),
-                 socket_connect_timeout=5)
+    socket = None
+    if config.has_option(section, RCONFIG_KEY_SOCKET):
+        socket = config.get(section, RCONFIG_KEY_SOCKET).strip() or None
+
+    if socket:
+        log("Connecting to Redis via Unix Domain Socket {} ...".format(socket))
+    return get_shared_redis(host=config.get(section, RCONFIG_KEY_HOST),
+                            port=config.getint(section, RCONFIG_KEY_PORT),
+                            db=config.getint(section, RCONFIG_KEY_DB),
+                            socket=socket)
 
 
 def get_redis(config):
@@ -60,7 +167,7 @@ def get_redis(config):
     :param ConfigParser config:
     :return Redis:
     """
-    global RCONFIG_VALUE_EXPIRE
+    global RCONFIG_VALUE_EXPIRE, RCONFIG_VALUE_LAYOUT, RCONFIG_VALUE_NOTIFY, RCONFIG_VALUE_ENCODING
     try:
         RCONFIG_VALUE_EXPIRE = config.getint(RCONFIG_SECTION, RCONFIG_KEY_EXPIRE)
         log("The Redis values will expire after {} seconds.".format(RCONFIG_VALUE_EXPIRE))
@@ -71,6 +178,30 @@ def get_redis(config):
         log("The provided default Expire value is invalid! No expiration will be set.")
         RCONFIG_VALUE_EXPIRE = None
 
+    if config.has_option(RCONFIG_SECTION, RCONFIG_KEY_LAYOUT):
+        layout = config.get(RCONFIG_SECTION, RCONFIG_KEY_LAYOUT)
+        if layout in [LAYOUT_KEYS, LAYOUT_HASH, LAYOUT_BOTH]:
+            RCONFIG_VALUE_LAYOUT = layout
+        else:
+            log("The provided storage layout \"{}\" is invalid! Values will be stored in keys.".format(layout))
+            RCONFIG_VALUE_LAYOUT = LAYOUT_KEYS
+    log("The Redis values will be stored using the \"{}\" layout.".format(RCONFIG_VALUE_LAYOUT))
+
+    if config.has_option(RCONFIG_SECTION, RCONFIG_KEY_NOTIFY):
+        RCONFIG_VALUE_NOTIFY = config.getboolean(RCONFIG_SECTION, RCONFIG_KEY_NOTIFY)
+    if RCONFIG_VALUE_NOTIFY:
+        log("Changes to Redis values will be published.")
+
+    if config.has_option(RCONFIG_SECTION, RCONFIG_KEY_ENCODING):
+        encoding = config.get(RCONFIG_SECTION, RCONFIG_KEY_ENCODING)
+        if encoding in [ENCODING_TEXT, ENCODING_PACKED]:
+            RCONFIG_VALUE_ENCODING = encoding
+        else:
+            log("The provided value encoding \"{}\" is invalid! Values will be stored as text.".format(encoding))
+            RCONFIG_VALUE_ENCODING = ENCODING_TEXT
+    if RCONFIG_VALUE_ENCODING == ENCODING_PACKED:
+        log("Telemetry values will be stored in the packed encoding.")
+
     return _get_redis(config, RCONFIG_SECTION)
 
 
@@ -83,68 +214,549 @@ def get_persistent_redis(config):
     return _get_redis(config, RCONFIG_PERSISTENT_SECTION)
 
 
+def _get_write_targets(key):
+    """
+    Returns the names of all keys / hashes a value is written to
+    with the configured storage layout
+    :param str key:
+    :return list of str:
+    """
+    hash_name = HASH_KEY_MAP.get(key) if RCONFIG_VALUE_LAYOUT != LAYOUT_KEYS else None
+    if not hash_name:
+        return [key]
+    elif RCONFIG_VALUE_LAYOUT == LAYOUT_BOTH:
+        return [key, hash_name]
+    else:
+        return [hash_name]
+
+
 def get_piped(r, keys):
     """
     Creates a Pipeline and requests all listed items at once.
     Returns a dictionary with the key-value pairs being equivalent
     to the stored values in Redis.
+    When using the hash layout, all keys of one source are
+    requested with a single HMGET.
     :param Redis r:
     :param list of str keys:
     :return dict of (str, str):
     """
     data_dict = {}
+    hashes = {}
+    requested = []
     pipe = r.pipeline()
     for key in keys:
-        pipe.get(key)
         data_dict[key] = None
+        hash_name = HASH_KEY_MAP.get(key) if RCONFIG_VALUE_LAYOUT == LAYOUT_HASH else None
+        if hash_name:
+            hashes.setdefault(hash_name, []).append(key)
+        else:
+            pipe.get(key)
+            requested.append(key)
+
+    for hash_name, fields in hashes.iteritems():
+        pipe.hmget(hash_name, fields)
+        requested.append(fields)
 
     data = pipe.execute()
     for i, item in enumerate(data):
-        data_dict[keys[i]] = item
+        if type(requested[i]) is list:
+            for j, field in enumerate(requested[i]):
+                data_dict[field] = unpack_value(item[j])
+        else:
+            data_dict[requested[i]] = unpack_value(item)
 
     return data_dict
 
 
+def _decode_float(value):
+    """
+    :param str value:
+    :return float|None: None for NaN
+    """
+    f = float(value)
+    return None if isnan(f) else f
+
+
+def _decode_int(value):
+    """
+    :param str value:
+    :return int:
+    """
+    # Values may have been stored as float (e.g. "3.0")
+    return int(float(value))
+
+
+def _decode_datetime(value):
+    """
+    :param str|datetime value: Text (e.g. "2017-11-05 12:34:56.789000+00:00") or an unpacked timestamp
+    :return datetime: Timezone aware, in UTC
+    """
+    if isinstance(value, datetime):
+        return value
+    # The text form is written by str(datetime), the offset and microseconds are optional
+    offset = 0
+    if len(value) > 6 and value[-6] in '+-' and value[-3] == ':':
+        offset = int(value[-6:-3]) * 60 + (int(value[-2:]) if value[-6] == '+' else -int(value[-2:]))
+        value = value[:-6]
+    parsed = datetime.strptime(value, DATETIME_TEXT_FORMAT if '.' in value else DATETIME_TEXT_FORMAT[:-3])
+    return (parsed - timedelta(minutes=offset)).replace(tzinfo=pytz.utc)
+
+
+VALUE_DECODERS = {
+    TYPE_STR: str,
+    TYPE_UNICODE: lambda v: v.decode('utf-8'),
+    TYPE_INT: _decode_int,
+    TYPE_FLOAT: _decode_float,
+    TYPE_DATETIME: _decode_datetime
+}
+
+
+def decode_value(key, value):
+    """
+    Converts a value read from Redis to the type declared in RedisKeys.KEY_SCHEMA.
+    Missing, invalid and NaN values are replaced with the default of the key,
+    values of keys without a schema are returned unchanged.
+    :param str key:
+    :param str|None value:
+    :return object:
+    """
+    if key not in KEY_SCHEMA:
+        return value
+
+    value_type, default = KEY_SCHEMA[key]
+    if value is None:
+        return default
+    try:
+        decoded = VALUE_DECODERS[value_type](value)
+    except (ValueError, TypeError, AttributeError, UnicodeDecodeError):
+        return default
+    return default if decoded is None else decoded
+
+
+def decode_data(data_dict):
+    """
+    Converts all values of the given dictionary (e.g. returned by get_piped)
+    to the types declared in RedisKeys.KEY_SCHEMA
+    :param dict of (str, str) data_dict:
+    :return dict of (str, object):
+    """
+    return dict((key, decode_value(key, value)) for key, value in data_dict.iteritems())
+
+
+def get_hash(r, hash_name):
+    """
+    Returns all values of a source stored in the hash layout (e.g. GpsRedisKeys.HASH)
+    as one consistent snapshot
+    :param Redis r:
+    :param str hash_name:
+    :return dict of (str, str):
+    """
+    return dict((key, unpack_value(value)) for key, value in r.hgetall(hash_name).iteritems())
+
+
+def pack_value(value, float_format='d'):
+    """
+    Returns the packed encoding of a float or datetime value
+    or None if the value cannot be packed
+    :param object value:
+    :param str float_format: Struct format of float values ('f' or 'd')
+    :return str|None:
+    """
+    if type(value) is float:
+        return PACKED_PREFIX + float_format + PACKED_STRUCTS[float_format].pack(value)
+    elif isinstance(value, datetime):
+        timestamp = timegm(value.utctimetuple()) * 1000 + value.microsecond // 1000
+        return PACKED_PREFIX + PACKED_TYPE_TIMESTAMP + PACKED_STRUCTS[PACKED_TYPE_TIMESTAMP].pack(timestamp)
+    return None
+
+
+def unpack_value(value):
+    """
+    Returns the value of a packed value (float or, for timestamps,
+    a timezone aware UTC datetime). Other values are returned unchanged.
+    :param str|None value:
+    :return object:
+    """
+    if not value or value[0] != PACKED_PREFIX:
+        return value
+    try:
+        unpacked = PACKED_STRUCTS[value[1]].unpack(value[2:])[0]
+    except (IndexError, KeyError, StructError):
+        return value
+    if value[1] == PACKED_TYPE_TIMESTAMP:
+        return datetime.fromtimestamp(unpacked / 1000.0, pytz.utc)
+    return unpacked
+
+
+def _serialize(value, key=None):
+    """
+    :param object value:
+    :param str|None key: Key the value is stored in (used to choose the encoding)
+    :return str:
+    """
+    if type(value) is tuple or type(value) is list:
+        return '|'.join(value)
+    elif RCONFIG_VALUE_ENCODING == ENCODING_PACKED and key in PACKED_FLOAT_FORMAT_MAP:
+        packed = pack_value(value, PACKED_FLOAT_FORMAT_MAP[key])
+        if packed is not None:
+            return packed
+    elif type(value) is unicode:
+        return value.encode('utf-8')
+    return str(value)
+
+
+def _queue_set(pipe, key, value, expire):
+    """
+    Adds the commands required to store a single value in its own key to the given pipeline
+    :param Pipeline pipe:
+    :param str key:
+    :param object value: Value to store, None deletes the key
+    :param int|None expire: Expiration in seconds
+    """
+    if value is None:
+        pipe.delete(key)
+    else:
+        pipe.set(key, _serialize(value, key), ex=expire)
+
+
+def get_change_channel(key):
+    """
+    Returns the channel changes to the given key are published on
+    :param str key:
+    :return str:
+    """
+    return CHANGE_CHANNEL_PREFIX + HASH_KEY_MAP.get(key, CHANGE_CHANNEL_OTHER)
+
+
+def _queue_items(pipe, items, expire):
+    """
+    Adds the commands required to store the given values with the configured
+    storage layout to the given pipeline. Values stored in hashes are written
+    with one HMSET (and HDEL) per hash.
+    If enabled, a change notification is published per source afterwards.
+    Returns the name of the key, hash or channel each queued command affects.
+    :param Pipeline pipe:
+    :param list of (str, object) items:
+    :param int|None expire: Expiration in seconds
+    :return list of str:
+    """
+    targets = []
+    hashes = {}
+    for key, value in items:
+        for target in _get_write_targets(key):
+            if target == key:
+                _queue_set(pipe, key, value, expire)
+                targets.append(key)
+            else:
+                values, deleted = hashes.setdefault(target, ({}, []))
+                if value is None:
+                    deleted.append(key)
+                else:
+                    values[key] = _serialize(value, key)
+
+    for hash_name, (values, deleted) in hashes.iteritems():
+        if values:
+            pipe.hmset(hash_name, values)
+            targets.append(hash_name)
+        if deleted:
+            pipe.hdel(hash_name, *deleted)
+            targets.append(hash_name)
+        if expire:
+            pipe.expire(hash_name, expire)
+            targets.append(hash_name)
+
+    if RCONFIG_VALUE_NOTIFY and items:
+        changes = {}
+        for key, value in items:
+            changes.setdefault(get_change_channel(key), []).append(key)
+        for channel, keys in changes.iteritems():
+            pipe.publish(channel, CHANGE_SEPARATOR.join(keys))
+            targets.append(channel)
+
+    return targets
+
+
+def _flatten_data_dict(data_dict):
+    """
+    Returns a list of key-value pairs with all tuple / list keys
+    (multiple keys sharing one value tuple) split up
+    :param dict of (str, object) data_dict:
+    :return list of (str, object):
+    """
+    items = []
+    for key, value in data_dict.iteritems():
+        if type(key) is tuple or type(key) is list:
+            for i in range(len(key)):
+                items.append((key[i], value[i]))
+        else:
+            items.append((key, value))
+    return items
+
+
 def set_piped(r, data_dict):
     """
     Creates a Pipeline and sends all listed items at once.
     Returns a dictionary with the key-value pairs containing the
-    result of each operation.
+    result of each operation (by key or, for the hash layout, by hash name).
     :param Redis r:
     :param dict of (str, object) data_dict:
     :return dict of (str, str):
     """
-    keys = []
     result_dict = {}
     pipe = r.pipeline()
-    for key, value in data_dict.iteritems():
-        if type(key) is tuple or type(key) is list:
-            for i in range(len(key)):
-                if value[i] is None:
-                    pipe.delete(key[i])
-                else:
-                    pipe.set(key[i], str(value[i]), ex=RCONFIG_VALUE_EXPIRE)
-
-                result_dict[key[i]] = None
-                keys.append(key[i])
-        else:
-            if value is None:
-                pipe.delete(key)
-            elif type(value) is tuple or type(value) is list:
-                pipe.set(key, '|'.join(value), ex=RCONFIG_VALUE_EXPIRE)
-            else:
-                pipe.set(key, str(value), ex=RCONFIG_VALUE_EXPIRE)
-
-            result_dict[key] = None
-            keys.append(key)
+    targets = _queue_items(pipe, _flatten_data_dict(data_dict), RCONFIG_VALUE_EXPIRE)
 
     data = pipe.execute()
     for i, item in enumerate(data):
-        result_dict[keys[i]] = item
+        result_dict[targets[i]] = item
 
     return result_dict
 
 
+class RedisHistoryRecorder(object):
+    """
+    Records the values of the given keys in capped time series
+    (one sorted set per key, see HistoryRedisKeys.get_history_key).
+    All values are sampled at the same time, at most once per interval,
+    using the latest value passed to record() for each key.
+    Use get_history or get_histories_piped to read the recorded values.
+    """
+
+    def __init__(self, r, keys, max_samples=HISTORY_DEFAULT_MAX_SAMPLES, interval=HISTORY_DEFAULT_INTERVAL):
+        """
+        :param Redis r:
+        :param list of str keys: Keys to record
+        :param int max_samples: Number of samples kept per key
+        :param int|float interval: Min. time between two samples in seconds
+        """
+        self._r = r
+        self._keys = keys
+        self._max_samples = max_samples
+        self._interval = interval
+        self._values = {}  # type: dict of (str, object)
+        self._last_recorded = 0
+
+    def record(self, data_dict, now=None):
+        """
+        Takes the latest values from the given data and
+        writes a sample of all values if the interval has passed
+        :param dict of (str, object) data_dict:
+        :param float|None now: Current time in seconds (defaults to time())
+        """
+        for key, value in _flatten_data_dict(data_dict):
+            if key in self._keys:
+                if value is None or (type(value) is float and isnan(value)):
+                    self._values.pop(key, None)
+                else:
+                    self._values[key] = value
+
+        now = now if now is not None else time()
+        if now - self._last_recorded < self._interval or not self._values:
+            return
+
+        timestamp = int(now * 1000)
+        pipe = self._r.pipeline(transaction=False)
+        for key, value in self._values.iteritems():
+            history_key = HistoryRedisKeys.get_history_key(key)
+            pipe.execute_command('ZADD', history_key, timestamp,
+                                 '{}{}{}'.format(timestamp, HISTORY_SEPARATOR, value))
+            pipe.execute_command('ZREMRANGEBYRANK', history_key, 0, -self._max_samples - 1)
+        pipe.execute()
+        self._last_recorded = now
+
+    def reset(self):
+        """
+        Forgets all values, e.g. after the data source has been lost
+        """
+        self._values = {}
+
+
+def get_history_recorder(config, r, keys):
+    """
+    Returns a History Recorder for the given keys as configured
+    in the [History] section or None if the history is disabled
+    :param ConfigParser config:
+    :param Redis r:
+    :param list of str keys:
+    :return RedisHistoryRecorder|None:
+    """
+    if not config.has_section(HCONFIG_SECTION) \
+            or not config.getboolean(HCONFIG_SECTION, HCONFIG_KEY_ENABLED):
+        log("The history of values will not be recorded.")
+        return None
+
+    max_samples = config.getint(HCONFIG_SECTION, HCONFIG_KEY_MAX_SAMPLES) \
+        if config.has_option(HCONFIG_SECTION, HCONFIG_KEY_MAX_SAMPLES) else HISTORY_DEFAULT_MAX_SAMPLES
+    interval = config.getfloat(HCONFIG_SECTION, HCONFIG_KEY_INTERVAL) / 1000 \
+        if config.has_option(HCONFIG_SECTION, HCONFIG_KEY_INTERVAL) else HISTORY_DEFAULT_INTERVAL
+    log("Recording the last {} samples of {} values every {} seconds.".format(max_samples, len(keys), interval))
+    return RedisHistoryRecorder(r, keys, max_samples, interval)
+
+
+def get_histories_piped(r, keys, start=None, end=None):
+    """
+    Returns the recorded samples of all given keys within the given time range at once.
+    The values are converted to the types declared in RedisKeys.KEY_SCHEMA.
+    :param Redis r:
+    :param list of str keys:
+    :param float|None start: Start time in seconds (None for the oldest sample)
+    :param float|None end: End time in seconds (None for the latest sample)
+    :return dict of (str, list of (float, object)): Time in seconds and value of each sample by key, oldest first
+    """
+    min_score = int(start * 1000) if start is not None else '-inf'
+    max_score = int(end * 1000) if end is not None else '+inf'
+
+    pipe = r.pipeline(transaction=False)
+    for key in keys:
+        pipe.execute_command('ZRANGEBYSCORE', HistoryRedisKeys.get_history_key(key), min_score, max_score)
+
+    histories = {}
+    for key, members in zip(keys, pipe.execute()):
+        samples = []
+        for member in members:
+            timestamp, _, value = member.partition(HISTORY_SEPARATOR)
+            samples.append((int(timestamp) / 1000.0, decode_value(key, value)))
+        histories[key] = samples
+    return histories
+
+
+def get_history(r, key, start=None, end=None):
+    """
+    Returns the recorded samples of the given key within the given time range
+    :param Redis r:
+    :param str key:
+    :param float|None start: Start time in seconds (None for the oldest sample)
+    :param float|None end: End time in seconds (None for the latest sample)
+    :return list of (float, object): Time in seconds and value of each sample, oldest first
+    """
+    return get_histories_piped(r, [key], start, end)[key]
+
+
+def _is_same_value(a, b):
+    """
+    :param object a:
+    :param object b:
+    :return bool:
+    """
+    if type(a) is not type(b):
+        return False
+    if a == b:
+        return True
+    return type(a) is float and isnan(a) and isnan(b)
+
+
+class RedisDeltaPublisher(object):
+    """
+    Publishes values to Redis like set_piped, but remembers the last value
+    written to each key and only sends values which have changed.
+    Unchanged values are kept alive by refreshing their expiration once less
+    than half of it remains, or earlier if the values are published so rarely
+    that the next publish could come too late.
+    All values of the given keys have to be written through the same publisher,
+    otherwise it will not notice the change.
+    """
+
+    # Time in seconds the next publish may be late compared to the previous interval
+    REFRESH_MARGIN = 2
+
+    def __init__(self, r, expire=None):
+        """
+        :param Redis r:
+        :param int|None expire: Expiration in seconds, defaults to the configured expiration
+        """
+        self._r = r
+        self._expire = expire
+        self._last_values = {}  # type: dict of (str, object)
+        self._last_written = {}  # type: dict of (str, float)
+        self._last_published = {}  # type: dict of (str, float)
+
+    def _get_expire(self):
+        return self._expire if self._expire is not None else RCONFIG_VALUE_EXPIRE
+
+    def set_piped(self, data_dict):
+        """
+        Sends all changed items and refreshes the expiration of unchanged items if required.
+        Returns a dictionary with the key-value pairs containing the
+        result of each operation that has been sent.
+        :param dict of (str, object) data_dict:
+        :return dict of (str, str):
+        """
+        expire = self._get_expire()
+        now = time()
+
+        changed = []
+        refresh = []
+        published = set()
+        for key, value in _flatten_data_dict(data_dict):
+            targets = _get_write_targets(key)
+            published.update(targets)
+            if key not in self._last_values or not _is_same_value(self._last_values[key], value):
+                changed.append((key, value))
+                self._last_values[key] = value
+            elif value is not None and expire:
+                for target in targets:
+                    if target not in refresh and self._needs_refresh(target, now, expire):
+                        refresh.append(target)
+
+        for target in published:
+            self._last_published[target] = now
+
+        result_dict = {}
+        pipe = self._r.pipeline()
+        targets = _queue_items(pipe, changed, expire)
+
+        refresh_start = len(targets)
+        for target in refresh:
+            if target not in targets:
+                pipe.expire(target, expire)
+                targets.append(target)
+
+        if not targets:
+            return result_dict
+
+        data = pipe.execute()
+        for i, item in enumerate(data):
+            target = targets[i]
+            result_dict[target] = item
+            self._last_written[target] = now
+            if i >= refresh_start and not item:
+                # The key is gone (e.g. Redis has been restarted), write it again next time
+                self._forget(target)
+
+        return result_dict
+
+    def _needs_refresh(self, target, now, expire):
+        """
+        Returns True if the expiration of the target has to be refreshed now because
+        less than half of it remains or it could lapse before the next publish
+        (assuming the target is published at the same interval as last time)
+        :param str target: Key or hash name
+        :param float now:
+        :param int expire: Expiration in seconds
+        :return bool:
+        """
+        remaining = self._last_written.get(target, 0) + expire - now
+        interval = now - self._last_published.get(target, now)
+        return remaining <= max(expire / 2.0, interval + RedisDeltaPublisher.REFRESH_MARGIN)
+
+    def _forget(self, target):
+        """
+        :param str target: Key or hash name
+        """
+        for key in self._last_values.keys():
+            if target in _get_write_targets(key):
+                del self._last_values[key]
+
+    def reset(self):
+        """
+        Forgets all values written so far, so everything is sent again next time
+        """
+        self._last_values = {}
+        self._last_written = {}
+        self._last_published = {}
+
+
 def incr_piped(r, data_dict):
     """
     Same as set_piped, but uses INCRBY instead of SET.
@@ -174,75 +786,65 @@ def incr_piped(r, data_dict):
     return result_dict
 
 
-def get_command_param_key(command, param_name):
-    return command + '.Param:' + param_name
+def get_command_queue_key(command):
+    """
+    Returns the name of the list the requests of the given command are queued in
+    :param str command: Command Name
+    :return str:
+    """
+    return COMMAND_QUEUE_MAP.get(command, COMMAND_QUEUE_DEFAULT)
 
 
 def send_command_request(r, command, params=None):
     """
-    Creates a new Command Request and sends it to Redis for
-    a request processor to process
+    Creates a new Command Request and appends it to the command queue
+    for a request processor to process. Requests are processed in the
+    order they have been sent, so rapidly sent requests are not lost.
     :param Redis r: Redis instance
     :param str command: Command Name
     :param dict of str, object params: Optional Command params
     :return:
     """
-    pipe = r.pipeline()
-    pipe.set(command, True, ex=RCONFIG_VALUE_EXPIRE_COMMANDS)
+    request = {COMMAND_FIELD_NAME: command}
     if params:
-        for key, value in params.iteritems():
-            if value is not None:
-                param_key = get_command_param_key(command, key)
-                pipe.set(param_key, value, ex=RCONFIG_VALUE_EXPIRE_COMMANDS)
+        request[COMMAND_FIELD_PARAMS] = dict((key, str(value))
+                                             for key, value in params.iteritems()
+                                             if value is not None)
 
+    queue = get_command_queue_key(command)
+    pipe = r.pipeline()
+    pipe.rpush(queue, dumps(request))
+    pipe.expire(queue, RCONFIG_VALUE_EXPIRE_COMMANDS)
     pipe.execute()
 
 
-def set_command_as_handled(r, command):
+def _parse_command_request(entry):
     """
-    Removes a Command Request from Redis and thus marks it as handled
-    :param Redis r: Redis instance
-    :param str command: Command Name
+    :param str entry: Queue entry as created by send_command_request
+    :return tuple of (str, dict of (str, str))|None: Command Name and Params
     """
-    pipe = r.pipeline()
-    pipe.delete(command)
-    pipe.execute()
+    try:
+        request = loads(entry)
+        return request[COMMAND_FIELD_NAME], request.get(COMMAND_FIELD_PARAMS, {})
+    except (ValueError, TypeError, KeyError):
+        log("Dropping malformed Command Request {} ...".format(repr(entry)))
+        return None
 
 
-def get_command_params(r, command, params, delete_after_request=True):
+def wait_for_command_request(r, queues, timeout=1):
     """
-    Returns one or more parameters of a given command
+    Waits until a Command Request is available in one of the given queues,
+    removes it from its queue and returns it. Each request is a single entry
+    containing the command and its params, so this takes one round trip.
+    Further queued requests are returned by the next calls without waiting.
+    Returns None if no request has been sent within the given time.
     :param Redis r: Redis instance
-    :param str command: Command Name
-    :param str|list of str params: Paramter Name or list of Parameter Names to request
-    :param bool delete_after_request: If True, all requested parameters will be deleted after execution
-    :return str|dict of str, str:
+    :param list of str queues: Names of the command queues
+    :param int timeout: Max. time to wait in seconds (0 waits forever)
+    :return tuple of (str, dict of (str, str))|None: Command Name and Params
     """
-    if isinstance(params, list):
-        output = {}
-        keys = []
-        key_map = {}
-
-        for key in params:
-            output[key] = None
-            param_key = get_command_param_key(command, key)
-            keys.append(param_key)
-            key_map[param_key] = key
-
-        out = get_piped(r, keys)
-
-        for key, value in out.iteritems():
-            output[key_map[key]] = value
-
-        if delete_after_request:
-            pipe = r.pipeline()
-            for key in keys:
-                r.delete(key)
-            pipe.execute()
-
-        return output
-    else:
-        return r.get(get_command_param_key(command, params))
+    item = r.blpop(queues, timeout)
+    return _parse_command_request(item[1]) if item else None
 
 
 def load_synced_value(r, pr, key):
@@ -278,52 +880,203 @@ def save_synced_value(r, pr, key, value):
         pr.delete(key)
 
 
-def check_command_requests(r, commands):
+class DataSnapshot(object):
     """
-    Checks a list of commands for a pending request
-    :param Redis r: Redis instance
-    :param list of str commands: List of Commands
-    :return:
+    Data returned by one fetch of a Background Data Fetcher. A snapshot is
+    never modified after it has been published, every fetch returning
+    different data publishes a new snapshot with a higher version.
     """
-    return get_piped(r, commands)
+    __slots__ = ['version', 'data', 'changed_keys', '_key_versions']
+
+    def __init__(self, version, data, changed_keys, key_versions):
+        """
+        :param int version: Version of this snapshot
+        :param dict of (str, str) data: Fetched data
+        :param frozenset of str changed_keys: Keys which have changed since the previous version
+        :param dict of (str, int) key_versions: Version in which each key has changed last
+        """
+        self.version = version
+        self.data = data
+        self.changed_keys = changed_keys
+        self._key_versions = key_versions
+
+    def changed_since(self, version):
+        """
+        Returns all keys which have changed after the given version
+        (including keys which have been removed)
+        :param int version:
+        :return frozenset of str:
+        """
+        if version >= self.version:
+            return frozenset()
+        elif version == self.version - 1:
+            return self.changed_keys
+        return frozenset(key for key, key_version in self._key_versions.iteritems()
+                         if key_version > version)
+
+    def create_next(self, data):
+        """
+        Creates the snapshot following this one if the given data differs from the data of this one
+        :param dict of (str, str) data:
+        :return DataSnapshot: New snapshot or this snapshot if nothing has changed
+        """
+        changed_keys = frozenset(key for key in set(data) | set(self.data)
+                                 if key not in data or key not in self.data
+                                 or not _is_same_value(data[key], self.data[key]))
+        if not changed_keys:
+            return self
+
+        version = self.version + 1
+        key_versions = self._key_versions.copy()
+        for key in changed_keys:
+            key_versions[key] = version
+        return DataSnapshot(version, data, changed_keys, key_versions)
+
+
+EMPTY_SNAPSHOT = DataSnapshot(0, {}, frozenset(), {})
 
 
 class RedisBackgroundFetcher(CarPiThread):
     """
     Redis Background Data Fetcher
+    If a max. fetch interval is given, the fetcher adapts its interval:
+    while the fetched data stays the same, the interval is doubled up to
+    the max. interval, as soon as the data changes (or other keys are
+    requested) it falls back to the fetch interval.
+    The fetcher can be paused while its data is not displayed.
     """
 
     RETRIES = 5
     RETRY_INTERVAL = 0.5
+    BACKOFF_FACTOR = 2
+    PAUSE_CHECK_INTERVAL = 0.5
 
-    def __init__(self, r, keys_to_fetch, fetch_interval=0.1):
+    def __init__(self, r, keys_to_fetch, fetch_interval=0.1, max_fetch_interval=None, decode_values=False):
         """
         :param Redis r:
         :param list of str keys_to_fetch:
-        :param int fetch_interval:
+        :param int|float fetch_interval: Interval between two fetches in seconds
+        :param int|float|None max_fetch_interval: Max. interval in seconds, enables the adaptive interval
+        :param bool decode_values: If True, values are converted to the types declared in RedisKeys.KEY_SCHEMA
         """
-        CarPiThread.__init__(self, fetch_interval)
-        self.keys_to_fetch = keys_to_fetch
+        # The fetcher waits on its own so it can be woken up early
+        CarPiThread.__init__(self, None)
         self._r = r
         self._running = True
-        self._interval = fetch_interval
-        self._current_data = {}  # type: dict of (str, str)
+        self._min_interval = fetch_interval
+        self._max_interval = max(fetch_interval, max_fetch_interval) if max_fetch_interval else fetch_interval
+        self._current_interval = fetch_interval
+        self._snapshot = EMPTY_SNAPSHOT  # type: DataSnapshot
+        self._decode_values = decode_values
+        self._raw_data = {}  # type: dict of (str, str)
+        self._wakeup = Event()
+        self._resumed = Event()
+        self._resumed.set()
+        self.keys_to_fetch = keys_to_fetch
 
         self._retries = RedisBackgroundFetcher.RETRIES
 
+    @property
+    def keys_to_fetch(self):
+        """
+        :return list of str:
+        """
+        return self._keys_to_fetch
+
+    @keys_to_fetch.setter
+    def keys_to_fetch(self, keys):
+        """
+        Replaces the requested keys, they are fetched right away
+        :param list of str keys:
+        """
+        self._keys_to_fetch = keys
+        self._current_interval = self._min_interval
+        self._wakeup.set()
+
     def _fetch_data(self):
+        """
+        :return bool: True if the fetched data differs from the previous one
+        """
         # Creates a copy so a user interaction does not cause problems
         keys = self.keys_to_fetch[:]
-        new_data = get_piped(self._r, keys)
-        self._current_data = new_data
+        data = get_piped(self._r, keys)
+        if self._decode_values:
+            data = self._decode(data)
+
+        previous = self._snapshot
+        # Replacing the reference is atomic, readers always get a complete snapshot
+        self._snapshot = previous.create_next(data)
+        return self._snapshot is not previous
+
+    def _decode(self, raw_data):
+        """
+        Decodes the given values, values which have not changed
+        since the last fetch are taken from the current snapshot
+        :param dict of (str, str) raw_data:
+        :return dict of (str, object):
+        """
+        previous_raw_data = self._raw_data
+        previous_data = self._snapshot.data
+        data = {}
+        for key, value in raw_data.iteritems():
+            if key in previous_data and key in previous_raw_data and previous_raw_data[key] == value:
+                data[key] = previous_data[key]
+            else:
+                data[key] = decode_value(key, value)
+        self._raw_data = raw_data
+        return data
 
     def get_current_data(self):
-        return self._current_data
+        """
+        :return dict of (str, str): Data of the latest snapshot (must not be modified)
+        """
+        return self._snapshot.data
 
-    def _do(self):
+    def get_snapshot(self):
+        """
+        Returns the latest snapshot, its version only changes
+        if the fetched data has changed
+        :return DataSnapshot:
+        """
+        return self._snapshot
+
+    def pause(self):
+        """
+        Stops fetching data until resume() is called
+        """
+        self._resumed.clear()
+
+    def resume(self):
+        """
+        Continues fetching data, starting right away
+        """
+        self._current_interval = self._min_interval
+        self._resumed.set()
+        self._wakeup.set()
+
+    def is_paused(self):
+        """
+        :return bool:
+        """
+        return not self._resumed.is_set()
+
+    def _wait_while_paused(self):
+        """
+        :return bool: False if the fetcher has been stopped in the meantime
+        """
+        while self._running and not self._resumed.is_set():
+            self._resumed.wait(RedisBackgroundFetcher.PAUSE_CHECK_INTERVAL)
+        return self._running
+
+    def _fetch(self):
+        """
+        Fetches the data and handles connection problems
+        :return bool: True if the fetched data has changed
+        """
         try:
-            self._fetch_data()
+            changed = self._fetch_data()
             self._retries = RedisBackgroundFetcher.RETRIES
+            return changed
         except (exceptions.ConnectionError, exceptions.TimeoutError):
             if self._retries == 0:
                 log("Failed to reconnect to Redis after {} retries!".format(RedisBackgroundFetcher.RETRIES))
@@ -336,6 +1089,145 @@ class RedisBackgroundFetcher(CarPiThread):
         except SystemExit:
             log("SystemExit has been requested, stopping Fetcher Thread ...")
             self._running = False
+        return False
+
+    def _do(self):
+        if not self._wait_while_paused():
+            return
+
+        self._wakeup.clear()
+        if self._fetch():
+            self._current_interval = self._min_interval
+        else:
+            self._current_interval = min(self._current_interval * RedisBackgroundFetcher.BACKOFF_FACTOR,
+                                         self._max_interval)
+        self._wakeup.wait(self._current_interval)
+
+    def stop(self, timeout=5):
+        self._running = False
+        self._resumed.set()
+        self._wakeup.set()
+        CarPiThread.stop(self, timeout)
+
+
+class RedisSubscribingFetcher(RedisBackgroundFetcher):
+    """
+    Redis Background Data Fetcher which waits for change notifications
+    published by the daemons and only fetches data if one of the requested
+    keys has changed. If no notification arrives within the fallback interval
+    (e.g. because values have expired) or the subscription is lost,
+    data is fetched anyway.
+    """
+
+    def __init__(self, r, keys_to_fetch, fetch_interval=0.1, fallback_interval=1, decode_values=False):
+        """
+        :param Redis r:
+        :param list of str keys_to_fetch:
+        :param int|float fetch_interval: Polling interval while not subscribed
+        :param int|float fallback_interval: Max. time between two fetches in seconds
+        :param bool decode_values: If True, values are converted to the types declared in RedisKeys.KEY_SCHEMA
+        """
+        RedisBackgroundFetcher.__init__(self, r, keys_to_fetch, None, decode_values=decode_values)
+        self._fetch_interval = fetch_interval
+        self._fallback_interval = fallback_interval
+        self._pubsub = None
+        self._next_subscribe = 0
+        self._fetched_keys = None  # type: list of str
+
+    def _subscribe(self):
+        self._next_subscribe = time() + self._fallback_interval
+        try:
+            self._pubsub = self._r.pubsub(ignore_subscribe_messages=True)
+            self._pubsub.psubscribe(CHANGE_CHANNEL_PREFIX + '*')
+        except (exceptions.ConnectionError, exceptions.TimeoutError):
+            log("Failed to subscribe to change notifications, falling back to polling ...")
+            self._pubsub = None
+
+    def _unsubscribe(self):
+        if self._pubsub:
+            try:
+                self._pubsub.close()
+            except (exceptions.ConnectionError, exceptions.TimeoutError):
+                pass
+            finally:
+                self._pubsub = None
+
+    def _wait_for_change(self):
+        """
+        Waits until one of the requested keys has changed, the requested keys
+        have been replaced or the fallback interval has passed.
+        :return bool: True if a requested key has changed
+        """
+        deadline = time() + self._fallback_interval
+        while self._running and self._fetched_keys is self.keys_to_fetch:
+            remaining = deadline - time()
+            if remaining <= 0:
+                return False
+
+            changed = False
+            # Wake up regularly to notice replaced keys, this does not cause any Redis traffic
+            message = self._pubsub.get_message(timeout=min(remaining, self._fetch_interval))
+            while message:
+                if not changed and message['type'] == 'pmessage':
+                    keys = message['data'].split(CHANGE_SEPARATOR)
+                    changed = any([key in self.keys_to_fetch for key in keys])
+                # Collect all notifications which have piled up in the meantime
+                message = self._pubsub.get_message()
+
+            if changed:
+                return True
+        return False
+
+    def _fetch_data(self):
+        self._fetched_keys = self.keys_to_fetch
+        return RedisBackgroundFetcher._fetch_data(self)
+
+    def _do(self):
+        if self.is_paused():
+            # Notifications received while paused may be outdated, so fetch right away
+            if self._wait_while_paused():
+                self._fetch()
+            return
+
+        if not self._pubsub and time() >= self._next_subscribe:
+            self._subscribe()
+        if not self._pubsub:
+            self._fetch()
+            sleep(self._fetch_interval)
+            return
+
+        try:
+            self._wait_for_change()
+        except (exceptions.ConnectionError, exceptions.TimeoutError):
+            log("Subscription to change notifications lost, falling back to polling ...")
+            self._unsubscribe()
+
+        self._fetch()
+
+    def stop(self, timeout=5):
+        try:
+            RedisBackgroundFetcher.stop(self, timeout)
+        finally:
+            self._unsubscribe()
+
+
+def create_background_fetcher(r, keys_to_fetch, fetch_interval=0.1, max_fetch_interval=None, decode_values=False):
+    """
+    Creates a Background Data Fetcher for the given keys. If change notifications
+    are enabled, the fetcher waits for them instead of polling.
+    :param Redis r:
+    :param list of str keys_to_fetch:
+    :param int|float fetch_interval: Polling interval (or max. time between two fetches when using notifications)
+    :param int|float|None max_fetch_interval: Enables the adaptive polling interval (ignored when using notifications)
+    :param bool decode_values: If True, values are converted to the types declared in RedisKeys.KEY_SCHEMA
+    :return RedisBackgroundFetcher:
+    """
+    if RCONFIG_VALUE_NOTIFY:
+        return RedisSubscribingFetcher(r, keys_to_fetch, fetch_interval, max(fetch_interval, 1),
+                                       decode_values=decode_values)
+    else:
+        return RedisBackgroundFetcher(r, keys_to_fetch, fetch_interval, max_fetch_interval,
+                                      decode_values=decode_values)
 
 
 class CarPiControlThread(CarPiThread):
@@ -344,12 +1236,15 @@ class CarPiControlThread(CarPiThread):
         :param Redis redis: Redis instance
         :param list of str commands:
         :param dict of str, list of str parameters:
-        :param int|float interval:
+        :param int|float interval: Max. time to wait for a Command Request (rounded up to full seconds)
         """
-        CarPiThread.__init__(self, interval)
+        # The thread blocks on the command queues instead of sleeping
+        CarPiThread.__init__(self, None)
         self._redis = redis
         self._commands = commands  # type: list str
         self._parameters = parameters  # type: dict str, list str
+        self._queues = sorted(set(get_command_queue_key(c) for c in commands))  # type: list str
+        self._wait_timeout = max(1, int(ceil(interval)))  # type: int
 
         self._command_implementation = self._map_command_implementations(commands)  # type: dict str, function
 
@@ -361,30 +1256,21 @@ class CarPiControlThread(CarPiThread):
         raise NotImplementedError
 
     def _do(self):
-        commands_to_execute = {}
-
-        # Get all commands which are requested
-        requested_commands = check_command_requests(self._redis, self._commands)
-        for command, val in requested_commands.iteritems():
-            if not val:
-                continue
-            if command in self._parameters:
-                # Get Parameter Values
-                params = self._parameters[command]
-                commands_to_execute[command] = get_command_params(self._redis,
-                                                                  command,
-                                                                  params)
-            else:
-                # Execute without Parameters
-                commands_to_execute[command] = True
-
-        # Execute Commands
-        for command, params in commands_to_execute.iteritems():
-            if isinstance(params, dict):
-                self._execute_command(command, params)
-            else:
-                self._execute_command(command)
-            set_command_as_handled(self._redis, command)
+        request = wait_for_command_request(self._redis, self._queues, self._wait_timeout)
+        if not request:
+            return
+
+        command, params = request
+        if command not in self._commands:
+            log("Ignoring unknown Redis Command {}!".format(command))
+        elif command in self._parameters:
+            # Pass all known Parameters, unset ones as None
+            command_params = prepare_dict(self._parameters[command])
+            command_params.update(params)
+            self._execute_command(command, command_params)
+        else:
+            # Execute without Parameters
+            self._execute_command(command)
 
     def _execute_command(self, command, params=None):
         if command in self._command_implementation:
@@ -0,0 +1,284 @@
+#!/usr/bin/env python
+"""
+MIT License
+
+Copyright (c) 2017 Raphael "rGunti" Guntersweiler
+
+Permission is hereby granted, free of charge, to any person obtaining a copy
+of this software and associated documentation files (the "Software"), to deal
+in the Software without restriction, including without limitation the rights
+to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+copies of the Software, and to permit persons to whom the Software is
+furnished to do so, subject to the following conditions:
+
+The above copyright notice and this permission notice shall be included in all
+copies or substantial portions of the Software.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+SOFTWARE.
+
+Trip Log File Format
+====================
+A trip log is an append-only file made of a file header followed by chunks.
+
+File Header: Magic "CPTRIP", format version (uint8), column count (uint8),
+then per column its array typecode (1 char) and its name (NUL-terminated).
+
+Chunk: Magic "CHNK", row count (uint32), CRC32 of the payload (int32),
+then the payload: all values of the first column, all values of the second
+column, ... (little endian, size given by the typecode).
+
+Chunks are only written once they are complete, so a file cut off by a
+power loss can be read up to its last intact chunk.
+"""
+
+import os
+from array import array
+from struct import Struct
+from sys import byteorder
+from time import time
+from zlib import crc32
+
+from GeoDistance import get_path_distance, METHOD_ELLIPSOID
+
+TRIP_LOG_MAGIC = 'CPTRIP'
+TRIP_LOG_VERSION = 1
+TRIP_LOG_EXTENSION = '.trip'
+
+CHUNK_MAGIC = 'CHNK'
+
+FILE_HEADER = Struct('<6sBB')
+CHUNK_HEADER = Struct('<4sIi')
+
+# Columns of a trip log (name, array typecode)
+COLUMN_TIME = 'time'  # Seconds since epoch (UTC)
+COLUMN_LATITUDE = 'lat'
+COLUMN_LONGITUDE = 'lon'
+COLUMN_SPEED = 'speed'  # km/h (GPS)
+COLUMN_RPM = 'rpm'
+COLUMN_MAP = 'map'  # kPa
+
+TRIP_LOG_COLUMNS = [
+    (COLUMN_TIME, 'd'),
+    (COLUMN_LATITUDE, 'd'),
+    (COLUMN_LONGITUDE, 'd'),
+    (COLUMN_SPEED, 'f'),
+    (COLUMN_RPM, 'f'),
+    (COLUMN_MAP, 'f')
+]
+
+# Values are stored in little endian
+_SWAP_BYTES = byteorder != 'little'
+
+NAN = float('nan')
+
+
+class TripLogFormatError(Exception):
+    pass
+
+
+def get_trip_log_file_name(trip_id, started):
+    """
+    :param str trip_id:
+    :param datetime started: Start of the recording (UTC)
+    :return str:
+    """
+    return 'trip_{}_{}{}'.format(trip_id, started.strftime('%Y%m%d_%H%M%S'), TRIP_LOG_EXTENSION)
+
+
+class TripLogWriter(object):
+    """
+    Collects rows in memory and appends them to the log file as one chunk
+    once the chunk is full or its oldest row has reached the max. age.
+    Every chunk is written with a single write() followed by fsync(),
+    so the SD card sees few, large writes and at most one chunk is lost on power loss.
+    """
+
+    def __init__(self, path, columns=TRIP_LOG_COLUMNS, chunk_size=600, max_chunk_age=60):
+        """
+        :param str path: Path of the log file, an existing file is replaced
+        :param list of (str, str) columns: Name and array typecode of each column
+        :param int chunk_size: Max. number of rows kept in memory
+        :param int|float max_chunk_age: Max. time in seconds a row is kept in memory
+        """
+        self._path = path
+        self._columns = columns
+        self._chunk_size = chunk_size
+        self._max_chunk_age = max_chunk_age
+        self._chunk = [array(typecode) for _, typecode in columns]
+        self._chunk_started = None
+        self._rows_written = 0
+
+        self._file = open(path, 'wb')
+        self._write(self._build_header())
+
+    def _build_header(self):
+        header = FILE_HEADER.pack(TRIP_LOG_MAGIC, TRIP_LOG_VERSION, len(self._columns))
+        for name, typecode in self._columns:
+            header += typecode + name + '\0'
+        return header
+
+    def get_path(self):
+        return self._path
+
+    def get_rows_written(self):
+        """
+        :return int: Number of rows written to disk (excluding rows kept in memory)
+        """
+        return self._rows_written
+
+    def append(self, row, now=None):
+        """
+        Adds a row, None values are stored as NaN
+        :param list|tuple row: One value per column
+        :param float|None now: Current time in seconds (defaults to the current time)
+        """
+        now = now if now is not None else time()
+        if self._chunk_started is None:
+            self._chunk_started = now
+
+        for column, value in zip(self._chunk, row):
+            column.append(NAN if value is None else value)
+
+        if len(self._chunk[0]) >= self._chunk_size:
+            self.flush()
+        else:
+            self.flush_if_due(now)
+
+    def flush_if_due(self, now=None):
+        """
+        Writes all rows kept in memory to disk if the oldest one has reached the max. age.
+        Has to be called regularly if no rows are appended for a while.
+        :param float|None now: Current time in seconds (defaults to the current time)
+        """
+        if self._chunk_started is None:
+            return
+        now = now if now is not None else time()
+        if now - self._chunk_started >= self._max_chunk_age:
+            self.flush()
+
+    def flush(self):
+        """
+        Writes all rows kept in memory to disk
+        """
+        rows = len(self._chunk[0])
+        if rows == 0:
+            return
+
+        if _SWAP_BYTES:
+            for column in self._chunk:
+                column.byteswap()
+        payload = ''.join([column.tostring() for column in self._chunk])
+        self._write(CHUNK_HEADER.pack(CHUNK_MAGIC, rows, crc32(payload)) + payload)
+
+        self._chunk = [array(typecode) for _, typecode in self._columns]
+        self._chunk_started = None
+        self._rows_written += rows
+
+    def _write(self, data):
+        self._file.write(data)
+        self._file.flush()
+        os.fsync(self._file.fileno())
+
+    def close(self):
+        """
+        Writes all remaining rows and closes the file
+        """
+        if self._file:
+            try:
+                self.flush()
+            finally:
+                self._file.close()
+                self._file = None
+
+
+def _read_header(f):
+    """
+    :param file f:
+    :return list of (str, str): Name and array typecode of each column
+    """
+    header = f.read(FILE_HEADER.size)
+    if len(header) < FILE_HEADER.size:
+        raise TripLogFormatError('File header is incomplete')
+    magic, version, column_count = FILE_HEADER.unpack(header)
+    if magic != TRIP_LOG_MAGIC or version != TRIP_LOG_VERSION:
+        raise TripLogFormatError('Not a trip log or unsupported version')
+
+    columns = []
+    for i in range(column_count):
+        typecode = f.read(1)
+        name = ''
+        c = f.read(1)
+        while c and c != '\0':
+            name += c
+            c = f.read(1)
+        if not c:
+            raise TripLogFormatError('File header is incomplete')
+        columns.append((name, typecode))
+    return columns
+
+
+def read_trip_log(path):
+    """
+    Reads a trip log chunk by chunk. Reading stops at the first
+    incomplete or damaged chunk (e.g. after a power loss).
+    :param str path:
+    :return generator of dict of (str, array): Values of one chunk by column name
+    """
+    with open(path, 'rb') as f:
+        columns = _read_header(f)
+        while True:
+            header = f.read(CHUNK_HEADER.size)
+            if len(header) < CHUNK_HEADER.size:
+                break
+            magic, rows, checksum = CHUNK_HEADER.unpack(header)
+            if magic != CHUNK_MAGIC:
+                break
+
+            chunk = {}
+            payload = ''
+            for name, typecode in columns:
+                column = array(typecode)
+                data = f.read(column.itemsize * rows)
+                if len(data) < column.itemsize * rows:
+                    return
+                column.fromstring(data)
+                if _SWAP_BYTES:
+                    column.byteswap()
+                chunk[name] = column
+                payload += data
+
+            if crc32(payload) != checksum:
+                break
+            yield chunk
+
+
+def get_trip_log_distance(path, method=METHOD_ELLIPSOID):
+    """
+    Recomputes the distance traveled during a recorded trip
+    (see GeoDistance.get_path_distance)
+    :param str path:
+    :param str method: haversine, ellipsoid or vincenty
+    :return float: Distance in meters
+    """
+    distance = 0
+    last_point = None
+    for chunk in read_trip_log(path):
+        lats = chunk[COLUMN_LATITUDE]
+        lons = chunk[COLUMN_LONGITUDE]
+        if last_point:
+            # Connect the chunk to the last point of the previous one
+            lats.insert(0, last_point[0])
+            lons.insert(0, last_point[1])
+        distance += get_path_distance(lats, lons, method)
+        last_point = lats[-1], lons[-1]
+    return distance
+
+
+if __name__ == "__main__":
+    print("This script is not intended to be run standalone!")
@@ -23,23 +23,26 @@ OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
 SOFTWARE.
 """
 from datetime import datetime
-from time import sleep
+from threading import Condition, Event
+from time import time
 
 import pytz
 
 from CarPiLogging import log, boot_print, end_print, get_utc_now, print_unhandled_exception, EXIT_CODES
 from CarPiConfig import init_config_env
 from CarPiThreading import CarPiThread
-from RedisUtils import get_redis, set_piped, get_persistent_redis, incr_piped
-from RedisKeys import GpsRedisKeys, PersistentGpsRedisKeys
-from gps import gps, gpsfix, WATCH_ENABLE
-from math import isnan
-from geopy.distance import vincenty
+from RedisUtils import get_redis, set_piped, get_persistent_redis, incr_piped, RedisDeltaPublisher, \
+    get_history_recorder
+from RedisKeys import GpsRedisKeys, PersistentGpsRedisKeys, HistoryRedisKeys
+from GpsdClient import GpsdClient, GpsFix, GpsdConnectionClosedError, GPSD_DEFAULT_HOST, GPSD_DEFAULT_PORT, \
+    REPORT_TPV, EMPTY_FIX
+from math import isnan, sqrt
+from GeoDistance import get_distance_function, METHOD_ELLIPSOID
 from redis import exceptions as redis_exceptions
+from socket import error as socket_error, timeout as socket_timeout
 from sys import exit
 import os
-# Disabled due to incompatibility with RPI
-# import reverse_geocoder as rg
+from ReverseGeocoder import ReverseGeocoder, KEY_NAME, KEY_ADMIN1, KEY_ADMIN2, KEY_COUNTRY
 
 
 APP_NAME = os.path.basename(__file__)
@@ -47,64 +50,116 @@ GPS_POLLER = None
 
 GPS_STOP_TIMEOUT_SECS = 3
 
+# Max. time to wait for a new fix when the heartbeat is disabled (so the daemon can be stopped)
+FIX_WAIT_TIMEOUT = 1
+
 
 class GpsPoller(CarPiThread):
-    def __init__(self):
+    def __init__(self, host=GPSD_DEFAULT_HOST, port=GPSD_DEFAULT_PORT, retry_timeout=5):
         CarPiThread.__init__(self, None)
-        self._gps = gps(mode=WATCH_ENABLE)
+        # The connection is opened (and reopened) by the thread, so gpsd does not have to be up yet
+        self._gps = GpsdClient(host, port)
+        self._retry_timeout = retry_timeout
+        self._fix_version = 0
+        self._new_fix = Condition()
+        # Set by stop(), so a pending reconnect does not delay the shutdown
+        self._stopped = Event()
 
     def _do(self):
-        self._gps.next()
+        if not self._gps.is_open():
+            try:
+                self._gps.open()
+                log("Connected to gpsd")
+            except socket_error as e:
+                log("Failed to connect to gpsd ({}), retrying after {} sec".format(e, self._retry_timeout))
+                self._gps.close()
+                self._stopped.wait(self._retry_timeout)
+                return
+
+        try:
+            if self._gps.next() == REPORT_TPV:
+                self._notify_new_fix()
+        except socket_timeout:
+            # Nothing received, gives the thread a chance to stop
+            pass
+        except (socket_error, GpsdConnectionClosedError):
+            log("Connection to gpsd lost, reconnecting after {} sec".format(self._retry_timeout))
+            # Closing resets the fix, the empty fix is published so the old position is not used anymore
+            self._gps.close()
+            self._notify_new_fix()
+            self._stopped.wait(self._retry_timeout)
+
+    def _notify_new_fix(self):
+        with self._new_fix:
+            self._fix_version += 1
+            self._new_fix.notify_all()
+
+    def stop(self, timeout=5):
+        self._stopped.set()
+        CarPiThread.stop(self, timeout)
+        self._gps.close()
 
     def get_current_gps_data(self):
-        return GpsPoint(self._gps)
+        return GpsPoint(self._gps.fix)
+
+    def wait_for_fix(self, last_version, timeout):
+        """
+        Blocks until a fix newer than <last_version> has been received or the timeout has passed
+        :param int last_version: Version returned by the previous call
+        :param int|float timeout: Timeout in seconds
+        :return int: Version of the current fix, equal to <last_version> if the timeout has passed
+        """
+        with self._new_fix:
+            if self._fix_version == last_version:
+                self._new_fix.wait(timeout)
+            return self._fix_version
 
 
 class GpsPoint(object):
-    def __init__(self, gps):
+    def __init__(self, fix):
         """
-        :param gps gps:
+        :param GpsFix fix: Fix as received by the GpsPoller (immutable, so it cannot change while being read)
         """
-        self._fix = gps.fix
-        self._utc = gps.utc
+        self._fix = fix
 
     def get_fix(self):
         """
         Returns the GPS Fix data
-        :return gpsfix:
+        :return GpsFix:
         """
         return self._fix
 
     def get_utc_time(self):
         """
         Returns the GPS time in UTC
-        :return:
+        :return str:
         """
-        return self._utc
+        return self._fix.time
 
     def convert_to_redis(self):
         """
         Returns a Dictionary prepared for storage in Redis
         :return:
         """
+        fix = self._fix
         return {
-            GpsRedisKeys.KEY_FIX_MODE: self._fix.mode,
-            GpsRedisKeys.KEY_LATITUDE: self._fix.latitude,
-            GpsRedisKeys.KEY_LONGITUDE: self._fix.longitude,
-            GpsRedisKeys.KEY_ALTITUDE: self._fix.altitude,
-            GpsRedisKeys.KEY_EPX: self._fix.epx,
-            GpsRedisKeys.KEY_EPY: self._fix.epy,
-            GpsRedisKeys.KEY_EPV: self._fix.epv,
-            GpsRedisKeys.KEY_EPT: self._fix.ept,
-            GpsRedisKeys.KEY_EPD: self._fix.epd,
-            GpsRedisKeys.KEY_EPS: self._fix.eps,
-            GpsRedisKeys.KEY_EPC: self._fix.epc,
-            GpsRedisKeys.KEY_TIME: self._utc,
-            GpsRedisKeys.KEY_CLIMB: self._fix.climb,
-            GpsRedisKeys.KEY_TRACK: self._fix.track,
-            GpsRedisKeys.KEY_SPEED: self._fix.speed,
-            GpsRedisKeys.KEY_SPEED_KMH: (self._fix.speed * 3.6),
-            GpsRedisKeys.KEY_SPEED_MPH: (self._fix.speed * 2.23694),
+            GpsRedisKeys.KEY_FIX_MODE: fix.mode,
+            GpsRedisKeys.KEY_LATITUDE: fix.latitude,
+            GpsRedisKeys.KEY_LONGITUDE: fix.longitude,
+            GpsRedisKeys.KEY_ALTITUDE: fix.altitude,
+            GpsRedisKeys.KEY_EPX: fix.epx,
+            GpsRedisKeys.KEY_EPY: fix.epy,
+            GpsRedisKeys.KEY_EPV: fix.epv,
+            GpsRedisKeys.KEY_EPT: fix.ept,
+            GpsRedisKeys.KEY_EPD: fix.epd,
+            GpsRedisKeys.KEY_EPS: fix.eps,
+            GpsRedisKeys.KEY_EPC: fix.epc,
+            GpsRedisKeys.KEY_TIME: fix.time,
+            GpsRedisKeys.KEY_CLIMB: fix.climb,
+            GpsRedisKeys.KEY_TRACK: fix.track,
+            GpsRedisKeys.KEY_SPEED: fix.speed,
+            GpsRedisKeys.KEY_SPEED_KMH: (fix.speed * 3.6),
+            GpsRedisKeys.KEY_SPEED_MPH: (fix.speed * 2.23694),
             GpsRedisKeys.KEY_LAST_UPDATED: get_utc_now(),
             GpsRedisKeys.KEY_ALIVE: datetime.now(pytz.utc)
         }
@@ -117,24 +172,148 @@ class GpsPoint(object):
         return self._fix.latitude, self._fix.longitude
 
 
-# Disabled due to incompatibility with RPI
-# class GpsLocationPoller(CarPiThread):
-#    def __init__(self, gps_poller, redis, interval):
-#        CarPiThread.__init__(self, interval)
-#        self._gps_poller = gps_poller  # type: GpsPoller
-#        self._redis = redis
-#
-#    def _do(self):
-#        search_data = self._gps_poller.get_current_gps_data().get_lat_lon()
-#        result = rg.search(search_data)
-#        if result and len(result) == 1:
-#            # print('%s (%s); %s; %s' % (result[0]['name'], result[0]['cc'], result[0]['admin1'], result[0]['admin2']))
-#            set_piped(self._redis, {
-#                GpsRedisKeys.KEY_LOCATION_COUNTRY: result[0]['cc'],
-#                GpsRedisKeys.KEY_LOCATION_CITY: result[0]['name'],
-#                GpsRedisKeys.KEY_LOCATION_ADMIN1: result[0]['admin1'],
-#                GpsRedisKeys.KEY_LOCATION_ADMIN2: result[0]['admin2']
-#            })
+class OdoAccumulator(object):
+    """
+    Accumulates the distance traveled in memory and adds it to the ODO and trip meters
+    in the persistent Redis in batches. Samples with a poor fix are skipped and
+    GPS jitter is filtered out: While standing still, no distance is counted at all,
+    while moving, distance is only counted once the position has moved
+    further than the jitter threshold from the last counted position.
+    """
+
+    def __init__(self, r, get_distance,
+                 min_fix_mode=2, max_error=25, min_speed=0.5, min_distance=5,
+                 flush_distance=100, flush_interval=30):
+        """
+        :param Redis r: Persistent Redis instance
+        :param function get_distance: Distance function (see GeoDistance.get_distance_function)
+        :param int min_fix_mode: Min. fix mode (2 = 2D, 3 = 3D)
+        :param float max_error: Max. horizontal error (EPX / EPY) in meters
+        :param float min_speed: Min. speed in m/s, slower samples are treated as standing still
+        :param float min_distance: Jitter threshold in meters
+        :param float flush_distance: Distance in meters after which the pending distance is written
+        :param float flush_interval: Time in seconds after which the pending distance is written
+        """
+        self._r = r
+        self._get_distance = get_distance
+        self._min_fix_mode = min_fix_mode
+        self._max_error = max_error
+        self._min_speed = min_speed
+        self._min_distance = min_distance
+        self._flush_distance = flush_distance
+        self._flush_interval = flush_interval
+
+        self._anchor = None  # Position the next distance is measured from
+        self._pending = 0.0
+        self._last_flush = time()
+
+    def _is_usable(self, data):
+        """
+        :param dict of (str, object) data: Data as returned by GpsPoint.convert_to_redis()
+        :return bool:
+        """
+        if (data.get(GpsRedisKeys.KEY_FIX_MODE) or 0) < self._min_fix_mode:
+            return False
+
+        lat = data.get(GpsRedisKeys.KEY_LATITUDE)
+        lon = data.get(GpsRedisKeys.KEY_LONGITUDE)
+        if lat is None or lon is None or isnan(lat) or isnan(lon):
+            return False
+
+        # Errors are not reported by every receiver, unknown errors are accepted
+        epx = data.get(GpsRedisKeys.KEY_EPX)
+        epy = data.get(GpsRedisKeys.KEY_EPY)
+        if epx is not None and epy is not None and sqrt(epx * epx + epy * epy) > self._max_error:
+            return False
+        return True
+
+    def add(self, data, now=None):
+        """
+        Adds a GPS sample and writes the pending distance if necessary
+        :param dict of (str, object) data: Data as returned by GpsPoint.convert_to_redis()
+        :param float|None now: Current time in seconds (defaults to the current time)
+        """
+        now = now if now is not None else time()
+        if self._is_usable(data):
+            position = data[GpsRedisKeys.KEY_LATITUDE], data[GpsRedisKeys.KEY_LONGITUDE]
+            speed = data.get(GpsRedisKeys.KEY_SPEED)
+            if self._anchor is None:
+                self._anchor = position
+            elif speed is None or isnan(speed) or speed >= self._min_speed:
+                distance = self._get_distance(self._anchor[0], self._anchor[1], position[0], position[1])
+                if distance >= self._min_distance:
+                    self._pending += distance
+                    self._anchor = position
+
+        if self._pending >= self._flush_distance \
+                or (self._pending > 0 and now - self._last_flush >= self._flush_interval):
+            self.flush(now)
+
+    def get_pending_distance(self):
+        """
+        :return float: Distance in meters not yet written to Redis
+        """
+        return self._pending
+
+    def flush(self, now=None):
+        """
+        Writes the pending distance to Redis
+        :param float|None now: Current time in seconds (defaults to the current time)
+        """
+        if self._pending > 0:
+            incr_piped(self._r, {
+                PersistentGpsRedisKeys.KEY_ODO: self._pending,
+                PersistentGpsRedisKeys.KEY_TRIP_A: self._pending,
+                PersistentGpsRedisKeys.KEY_TRIP_B: self._pending
+            })
+            self._pending = 0.0
+        self._last_flush = now if now is not None else time()
+
+
+class GpsLocationPoller(CarPiThread):
+    """
+    Looks up the place nearest to the current position in regular intervals
+    and publishes it to the location keys
+    """
+
+    def __init__(self, gps_poller, redis, geocoder, interval):
+        """
+        :param GpsPoller gps_poller:
+        :param Redis redis:
+        :param ReverseGeocoder geocoder:
+        :param int|float interval: Time between two lookups in seconds
+        """
+        # Waits on an event instead of sleeping, so the thread stops immediately
+        CarPiThread.__init__(self, None)
+        self._gps_poller = gps_poller
+        self._publisher = RedisDeltaPublisher(redis)
+        self._geocoder = geocoder
+        self._lookup_interval = interval
+        self._stopped = Event()
+        self._last_position = None
+        self._place = None
+
+    def _do(self):
+        fix = self._gps_poller.get_current_gps_data().get_fix()
+        position = fix.latitude, fix.longitude
+        if fix.mode >= 2 and not isnan(position[0]) and not isnan(position[1]):
+            # The lookup is only repeated if the position has changed, but the place is published
+            # on every interval, so its keys do not expire while the vehicle is parked
+            if position != self._last_position:
+                self._last_position = position
+                self._place = self._geocoder.search(position[0], position[1])
+            place = self._place
+            self._publisher.set_piped({
+                GpsRedisKeys.KEY_LOCATION_COUNTRY: place[KEY_COUNTRY] if place else None,
+                GpsRedisKeys.KEY_LOCATION_CITY: place[KEY_NAME] if place else None,
+                GpsRedisKeys.KEY_LOCATION_ADMIN1: place[KEY_ADMIN1] if place else None,
+                GpsRedisKeys.KEY_LOCATION_ADMIN2: place[KEY_ADMIN2] if place else None
+            })
+        self._stopped.wait(self._lookup_interval)
+
+    def stop(self, timeout=5):
+        self._stopped.set()
+        CarPiThread.stop(self, timeout)
 
 
 if __name__ == "__main__":
@@ -143,57 +322,92 @@ if __name__ == "__main__":
     CONFIG = init_config_env('CARPI_GPSD_CONF', ['gps-daemon.conf', '/etc/carpi/gps-daemon.conf'])
     boot_print(APP_NAME)
 
-    CONFIG_DATAPOLLER_INTERVAL = CONFIG.getfloat('DataPoller', 'interval') / 1000
+    CONFIG_HEARTBEAT_INTERVAL = CONFIG.getfloat('DataPoller', 'heartbeat') / 1000 \
+        if CONFIG.has_option('DataPoller', 'heartbeat') else 1
+    CONFIG_FIX_TIMEOUT = CONFIG.getfloat('DataPoller', 'fix_timeout') / 1000 \
+        if CONFIG.has_option('DataPoller', 'fix_timeout') else 5
     CONFIG_RECORD_ODO = CONFIG.getboolean('ODO_Recording', 'enabled')
+    CONFIG_DISTANCE_METHOD = CONFIG.get('ODO_Recording', 'distance_method') \
+        if CONFIG.has_option('ODO_Recording', 'distance_method') else METHOD_ELLIPSOID
+    CONFIG_ODO_MIN_FIX_MODE = CONFIG.getint('ODO_Recording', 'min_fix_mode') \
+        if CONFIG.has_option('ODO_Recording', 'min_fix_mode') else 2
+    CONFIG_ODO_MAX_ERROR = CONFIG.getfloat('ODO_Recording', 'max_error') \
+        if CONFIG.has_option('ODO_Recording', 'max_error') else 25
+    CONFIG_ODO_MIN_SPEED = CONFIG.getfloat('ODO_Recording', 'min_speed') / 3.6 \
+        if CONFIG.has_option('ODO_Recording', 'min_speed') else 0.5
+    CONFIG_ODO_MIN_DISTANCE = CONFIG.getfloat('ODO_Recording', 'min_distance') \
+        if CONFIG.has_option('ODO_Recording', 'min_distance') else 5
+    CONFIG_ODO_FLUSH_DISTANCE = CONFIG.getfloat('ODO_Recording', 'flush_distance') \
+        if CONFIG.has_option('ODO_Recording', 'flush_distance') else 100
+    CONFIG_ODO_FLUSH_INTERVAL = CONFIG.getfloat('ODO_Recording', 'flush_interval') / 1000 \
+        if CONFIG.has_option('ODO_Recording', 'flush_interval') else 30
+    CONFIG_GPSD_HOST = CONFIG.get('Gpsd', 'host') \
+        if CONFIG.has_option('Gpsd', 'host') else GPSD_DEFAULT_HOST
+    CONFIG_GPSD_PORT = CONFIG.getint('Gpsd', 'port') \
+        if CONFIG.has_option('Gpsd', 'port') else GPSD_DEFAULT_PORT
     CONFIG_LOCATION_POLLER_INTERVAL = CONFIG.getfloat('DataPoller', 'location_polling') / 1000
+    CONFIG_LOCATION_PLACES = CONFIG.get('DataPoller', 'location_places') \
+        if CONFIG.has_option('DataPoller', 'location_places') else '/etc/carpi/places.bin'
 
     log("Initializing GPS ...")
-    GPS_POLLER = GpsPoller()
+    GPS_POLLER = GpsPoller(CONFIG_GPSD_HOST, CONFIG_GPSD_PORT)
     GPS_POLLER.start()
 
     log("Initializing Redis Connection ...")
     R = get_redis(CONFIG)
     RP = get_persistent_redis(CONFIG)
-
-    # Disabled due to incompatibility with RPI
-    # if CONFIG_LOCATION_POLLER_INTERVAL > 0:
-    #     log("Initializing GPS Location Poller ...")
-    #     GPS_LOC = GpsLocationPoller(GPS_POLLER, R, CONFIG_LOCATION_POLLER_INTERVAL)
-    #     GPS_LOC.start()
-    # else:
-    #     log("GPS Location Poller is disabled. To enable, set [DataPoller].location_polling in config file > 0")
+    PUBLISHER = RedisDeltaPublisher(R)
+    HISTORY = get_history_recorder(CONFIG, R, HistoryRedisKeys.GPS_KEYS)
+
+    ODO = None
+    if CONFIG_RECORD_ODO:
+        ODO = OdoAccumulator(RP, get_distance_function(CONFIG_DISTANCE_METHOD),
+                             min_fix_mode=CONFIG_ODO_MIN_FIX_MODE,
+                             max_error=CONFIG_ODO_MAX_ERROR,
+                             min_speed=CONFIG_ODO_MIN_SPEED,
+                             min_distance=CONFIG_ODO_MIN_DISTANCE,
+                             flush_distance=CONFIG_ODO_FLUSH_DISTANCE,
+                             flush_interval=CONFIG_ODO_FLUSH_INTERVAL)
+
+    GPS_LOC = None
+    if CONFIG_LOCATION_POLLER_INTERVAL <= 0:
+        log("GPS Location Poller is disabled. To enable, set [DataPoller].location_polling in config file > 0")
+    elif not os.path.isfile(CONFIG_LOCATION_PLACES):
+        log("GPS Location Poller is disabled, place table {} not found".format(CONFIG_LOCATION_PLACES))
+    else:
+        log("Initializing GPS Location Poller ...")
+        GPS_LOC = GpsLocationPoller(GPS_POLLER, R, ReverseGeocoder(CONFIG_LOCATION_PLACES),
+                                    CONFIG_LOCATION_POLLER_INTERVAL)
+        GPS_LOC.start()
 
     try:
         log("GPS Daemon is running ...")
-        last_data = None
+        fix_version = 0
+        last_fix = time()
+        fix_cleared = False
         while True:
-            data = GPS_POLLER.get_current_gps_data().convert_to_redis()
-
-            # Disabled in Code because we use the GPS Recorder service for this now
-            if False and CONFIG_RECORD_ODO and last_data:
-                # Compare Fix
-                old_fix = last_data.get(GpsRedisKeys.KEY_FIX_MODE, 0)
-                new_fix = data.get(GpsRedisKeys.KEY_FIX_MODE, 0)
-                if old_fix >= new_fix or (old_fix >= 2 and new_fix >= 2):
-                    # Calculate Distance traveled and write to persistence (if > 0m)
-                    old_xy = last_data.get(GpsRedisKeys.KEY_LATITUDE), last_data.get(GpsRedisKeys.KEY_LONGITUDE)
-                    new_xy = data.get(GpsRedisKeys.KEY_LATITUDE), data.get(GpsRedisKeys.KEY_LONGITUDE)
-                    if isnan(old_xy[0]) or isnan(new_xy[0]):
-                        pass
-                    else:
-                        distance_traveled = vincenty(old_xy, new_xy).meters
-                        if distance_traveled > 0:
-                            incr_piped(RP, {
-                                PersistentGpsRedisKeys.KEY_ODO: distance_traveled,
-                                PersistentGpsRedisKeys.KEY_TRIP_A: distance_traveled,
-                                PersistentGpsRedisKeys.KEY_TRIP_B: distance_traveled
-                            })
-                last_data = data
-            else:
-                last_data = data
-
-            set_piped(R, data)
-            sleep(CONFIG_DATAPOLLER_INTERVAL)
+            # Every fix is published exactly once
+            new_fix_version = GPS_POLLER.wait_for_fix(fix_version, CONFIG_HEARTBEAT_INTERVAL or FIX_WAIT_TIMEOUT)
+            if new_fix_version != fix_version:
+                fix_version = new_fix_version
+                last_fix = time()
+                fix_cleared = False
+                data = GPS_POLLER.get_current_gps_data().convert_to_redis()
+                if ODO:
+                    ODO.add(data)
+
+                PUBLISHER.set_piped(data)
+                if HISTORY:
+                    HISTORY.record(data)
+            elif CONFIG_FIX_TIMEOUT and not fix_cleared and time() - last_fix >= CONFIG_FIX_TIMEOUT:
+                # gpsd has stopped delivering fixes, the last one is outdated
+                log("No fix received for {} sec, clearing the last fix".format(CONFIG_FIX_TIMEOUT))
+                fix_cleared = True
+                PUBLISHER.set_piped(GpsPoint(EMPTY_FIX).convert_to_redis())
+            elif CONFIG_HEARTBEAT_INTERVAL:
+                # No fix received in time, only the alive key is updated,
+                # the values of the last fix expire unless a new fix arrives
+                PUBLISHER.set_piped({GpsRedisKeys.KEY_ALIVE: datetime.now(pytz.utc)})
     except (KeyboardInterrupt, SystemExit):
         log("Shutdown requested!")
     except redis_exceptions.ConnectionError:
@@ -203,7 +417,12 @@ if __name__ == "__main__":
         EXIT_CODE = EXIT_CODES['UnhandledException']
         print_unhandled_exception(APP_NAME)
     finally:
-        if not GPS_POLLER.stop_safe() and EXIT_CODE == EXIT_CODES['OK']:
+        if ODO:
+            try:
+                ODO.flush()
+            except redis_exceptions.ConnectionError:
+                log("Failed to save the last {:.1f} m traveled".format(ODO.get_pending_distance()))
+        if GPS_LOC and not GPS_LOC.stop_safe() and EXIT_CODE == EXIT_CODES['OK']:
             EXIT_CODE = EXIT_CODES['BackgroundThreadTimedOut']
         if not GPS_POLLER.stop_safe() and EXIT_CODE == EXIT_CODES['OK']:
             EXIT_CODE = EXIT_CODES['BackgroundThreadTimedOut']
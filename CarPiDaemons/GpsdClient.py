@@ -0,0 +1,228 @@
+#!/usr/bin/env python
+"""
+MIT License
+
+Copyright (c) 2017 Raphael "rGunti" Guntersweiler
+
+Permission is hereby granted, free of charge, to any person obtaining a copy
+of this software and associated documentation files (the "Software"), to deal
+in the Software without restriction, including without limitation the rights
+to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+copies of the Software, and to permit persons to whom the Software is
+furnished to do so, subject to the following conditions:
+
+The above copyright notice and this permission notice shall be included in all
+copies or substantial portions of the Software.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+SOFTWARE.
+"""
+from json import loads
+from socket import create_connection
+
+GPSD_DEFAULT_HOST = '127.0.0.1'
+GPSD_DEFAULT_PORT = 2947
+
+WATCH_COMMAND = '?WATCH={"enable":true,"json":true}\n'
+
+REPORT_TPV = 'TPV'
+REPORT_SKY = 'SKY'
+
+# gpsd starts every report with its class, so reports can be filtered without parsing them
+REPORT_PREFIX = '{"class":"'
+REPORT_CLASS_START = len(REPORT_PREFIX)
+REPORT_CLASS_END = REPORT_CLASS_START + 3
+
+NAN = float('nan')
+
+# TPV field -> GpsFix attribute
+TPV_FIELDS = [
+    ('lat', 'latitude'),
+    ('lon', 'longitude'),
+    ('alt', 'altitude'),
+    ('epx', 'epx'),
+    ('epy', 'epy'),
+    ('epv', 'epv'),
+    ('ept', 'ept'),
+    ('epd', 'epd'),
+    ('eps', 'eps'),
+    ('epc', 'epc'),
+    ('climb', 'climb'),
+    ('track', 'track'),
+    ('speed', 'speed')
+]
+
+
+class GpsdConnectionClosedError(Exception):
+    pass
+
+
+class GpsFix(object):
+    """
+    Values of one TPV report (same attribute names as gps.gpsfix).
+    Values not reported by gpsd are NaN.
+    A fix is immutable, so it can be handed to other threads as a whole.
+    """
+    __slots__ = ['mode', 'time'] + [attr for _, attr in TPV_FIELDS]
+
+    def __init__(self, report=None):
+        """
+        :param dict|None report: TPV report, None creates an empty fix
+        """
+        report = report or {}
+        init = object.__setattr__
+        init(self, 'mode', report.get('mode', 0))
+        init(self, 'time', report.get('time', ''))
+        for field, attr in TPV_FIELDS:
+            init(self, attr, report.get(field, NAN))
+
+    def __setattr__(self, name, value):
+        raise AttributeError('GpsFix is immutable')
+
+    def __delattr__(self, name):
+        raise AttributeError('GpsFix is immutable')
+
+
+EMPTY_FIX = GpsFix()
+
+
+class GpsdClient(object):
+    """
+    Minimal gpsd client which only handles TPV and SKY reports.
+    Reports are read line by line into a buffer which is reused for every read,
+    other report types are skipped without being parsed.
+    """
+
+    BUFFER_SIZE = 4096
+
+    def __init__(self, host=GPSD_DEFAULT_HOST, port=GPSD_DEFAULT_PORT, timeout=1):
+        """
+        :param str host:
+        :param int port:
+        :param int|float timeout: Timeout for connecting and for each read in seconds
+        """
+        self._host = host
+        self._port = port
+        self._timeout = timeout
+        self._sock = None
+        self._buffer = bytearray(GpsdClient.BUFFER_SIZE)
+        self._view = memoryview(self._buffer)
+        self._start = 0  # Start of the first unprocessed line
+        self._length = 0  # End of the received data
+
+        # Replaced (never modified) with every TPV report
+        self.fix = EMPTY_FIX
+        self.satellites_visible = 0
+        self.satellites_used = 0
+
+    @property
+    def utc(self):
+        """
+        :return str: Time of the latest fix (UTC, ISO 8601)
+        """
+        return self.fix.time
+
+    def open(self):
+        self._sock = create_connection((self._host, self._port), self._timeout)
+        self._start = 0
+        self._length = 0
+        self._sock.sendall(WATCH_COMMAND)
+
+    def is_open(self):
+        return self._sock is not None
+
+    def close(self):
+        """
+        Closes the connection, the fix is reset as it is no longer valid
+        """
+        self.fix = EMPTY_FIX
+        self.satellites_visible = 0
+        self.satellites_used = 0
+        if self._sock:
+            try:
+                self._sock.close()
+            finally:
+                self._sock = None
+
+    def next(self):
+        """
+        Blocks until the next TPV or SKY report has been received and processed.
+        Raises a socket timeout if nothing has been received in time
+        and a GpsdConnectionClosedError if the client is not connected.
+        :return str: Class of the processed report
+        """
+        if self._sock is None:
+            raise GpsdConnectionClosedError('Not connected to gpsd')
+
+        while True:
+            end = self._buffer.find('\n', self._start, self._length)
+            if end < 0:
+                self._receive()
+                continue
+
+            line_start = self._start
+            self._start = end + 1
+            report_class = self._get_report_class(line_start, end)
+            if report_class == REPORT_TPV:
+                self._update_fix(loads(str(self._buffer[line_start:end])))
+                return report_class
+            elif report_class == REPORT_SKY:
+                self._update_sky(loads(str(self._buffer[line_start:end])))
+                return report_class
+
+    def _get_report_class(self, start, end):
+        """
+        :param int start: Start of the line in the buffer
+        :param int end: End of the line in the buffer
+        :return str|None:
+        """
+        if end - start < REPORT_CLASS_END \
+                or self._buffer[start:start + REPORT_CLASS_START] != REPORT_PREFIX:
+            return None
+        return str(self._buffer[start + REPORT_CLASS_START:start + REPORT_CLASS_END])
+
+    def _receive(self):
+        # Move the incomplete line to the start of the buffer
+        if self._start > 0:
+            remaining = self._length - self._start
+            self._buffer[:remaining] = self._buffer[self._start:self._length]
+            self._start = 0
+            self._length = remaining
+
+        if self._length == len(self._buffer):
+            self._grow_buffer()
+
+        received = self._sock.recv_into(self._view[self._length:])
+        if received == 0:
+            raise GpsdConnectionClosedError()
+        self._length += received
+
+    def _grow_buffer(self):
+        # A buffer with an exported memoryview cannot be resized in place
+        self._buffer = self._buffer + bytearray(len(self._buffer))
+        self._view = memoryview(self._buffer)
+
+    def _update_fix(self, report):
+        """
+        :param dict report: TPV report
+        """
+        # Assigning the reference is atomic, readers either get the previous or the new fix
+        self.fix = GpsFix(report)
+
+    def _update_sky(self, report):
+        """
+        :param dict report: SKY report
+        """
+        satellites = report.get('satellites')
+        if satellites is not None:
+            self.satellites_visible = len(satellites)
+            self.satellites_used = len([s for s in satellites if s.get('used')])
+
+
+if __name__ == "__main__":
+    print("This script is not intended to be run standalone!")
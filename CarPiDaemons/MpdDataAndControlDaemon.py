@@ -35,7 +35,7 @@ from CarPiLogging import EXIT_CODES, boot_print, end_print, log, print_unhandled
 from CarPiThreading import CarPiThread
 from CarPiUtils import format_mpd_status_time
 from RedisKeys import MpdDataRedisKeys, MpdCommandRedisKeys
-from RedisUtils import get_redis, set_piped, CarPiControlThread
+from RedisUtils import get_redis, CarPiControlThread, RedisDeltaPublisher
 from redis import exceptions as redis_exceptions
 
 APP_NAME = path.basename(__file__)
@@ -170,6 +170,7 @@ if __name__ == "__main__":
 
     log("Initializing Redis Connection ...")
     R = get_redis(CONFIG)
+    PUBLISHER = RedisDeltaPublisher(R)
 
     log("Initializing Control Thread ...")
     MPD_CONTROL = MpdControlThread(CONFIG, R, CONFIG_CONTROLLER_INTERVAL)
@@ -182,7 +183,7 @@ if __name__ == "__main__":
                 raise ConnectionError()
             current_data = MPD_DATA_THREAD.get_current_data()
             if current_data:
-                set_piped(R, current_data)
+                PUBLISHER.set_piped(current_data)
             sleep(CONFIG_DATAPOLLER_INTERVAL)
     except (KeyboardInterrupt, SystemExit):
         log("Shutdown requested!")
@@ -25,7 +25,7 @@ SOFTWARE.
 from CarPiThreading import CarPiThread
 from CarPiConfig import init_config_env
 from CarPiLogging import log, boot_print, end_print, EXIT_CODES, print_unhandled_exception
-from RedisUtils import get_redis, set_piped
+from RedisUtils import get_redis, RedisDeltaPublisher
 from RedisKeys import NetworkInfoRedisKeys, prepare_dict
 from redis import exceptions as redis_exceptions
 from sys import exit
@@ -150,6 +150,7 @@ if __name__ == "__main__":
 
     log("Initialize Redis Connection ...")
     R = get_redis(CONFIG)
+    PUBLISHER = RedisDeltaPublisher(R)
 
     try:
         log("Network Info Daemon is running ...")
@@ -181,7 +182,7 @@ if __name__ == "__main__":
                         r_data[NetworkInfoRedisKeys.KEY_WLAN1_SSID] = wifi_data['ssid']
 
                 r_data[NetworkInfoRedisKeys.KEY_ALIVE] = datetime.now(pytz.utc)
-                set_piped(R, r_data)
+                PUBLISHER.set_piped(r_data)
             sleep(CONFIG_DATAPOLLER_INTERVAL)
     except (KeyboardInterrupt, SystemExit):
         log("Shutdown requested!")
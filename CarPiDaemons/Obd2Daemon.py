@@ -23,62 +23,199 @@ OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
 SOFTWARE.
 """
 from _socket import timeout
-from telnetlib import Telnet
-from time import sleep
+from select import select
+from socket import create_connection
+from time import sleep, time
 
 from os import path
 
 from CarPiConfig import init_config_env
 from CarPiLogging import EXIT_CODES, boot_print, end_print, print_unhandled_exception, log
-from CarPiThreading import CarPiThread
-from Obd2DataParser import transform_obj, parse_obj
-from RedisKeys import ObdRedisKeys
-from RedisUtils import get_redis, set_piped
+from Obd2DataParser import decode_obj, is_batchable, is_can_protocol, split_batched_response, parse_supported_pids, \
+    parse_vin, set_debug_log
+from RedisKeys import ObdRedisKeys, PersistentObdRedisKeys, HistoryRedisKeys
+from RedisUtils import get_redis, get_persistent_redis, RCONFIG_PERSISTENT_SECTION, RedisDeltaPublisher, \
+    get_history_recorder
 from redis import exceptions as redis_exceptions
 
 
 APP_NAME = path.basename(__file__)
 
 
-class ObdTelnetPoller(CarPiThread):
-    def __init__(self, host='192.168.0.10', port=35000, init_sequence=[], poll_sequence=[]):
-        CarPiThread.__init__(self, 0.01)
-        self._data = None
-        self._t = Telnet()
+class ObdEnvConfigError(Exception):
+    def __init__(self, sent_cmd, received_response):
+        self.sent_cmd = sent_cmd
+        self.received_response = received_response
 
-    def _do(self):
-        new_data = {}
 
-        self._data = new_data
+class ObdConnectionClosedError(Exception):
+    pass
 
-    def get_current_data(self):
-        return self._data
 
+class ElmSocketTransport(object):
+    """
+    Socket based transport for ELM327 adapters.
+    Instead of spinning on the socket until the prompt arrives,
+    the transport sleeps in select() until either data has been received
+    or the deadline has passed. Received bytes are collected in a
+    buffer which is reused for every request.
+    """
 
-class ObdEnvConfigError(Exception):
-    def __init__(self, sent_cmd, received_response):
-        self.sent_cmd = sent_cmd
-        self.received_response = received_response
+    PROMPT = '>'
+    BUFFER_SIZE = 1024
+
+    def __init__(self, host, port, timeout):
+        """
+        :param str host:
+        :param int port:
+        :param int|float timeout: Timeout for connecting and for each response in seconds
+        """
+        self._host = host
+        self._port = port
+        self._timeout = timeout
+        self._sock = None
+        self._buffer = bytearray(ElmSocketTransport.BUFFER_SIZE)
+        self._view = memoryview(self._buffer)
+
+    def open(self):
+        self._sock = create_connection((self._host, self._port), self._timeout)
+
+    def close(self):
+        if self._sock:
+            try:
+                self._sock.close()
+            finally:
+                self._sock = None
+
+    def write(self, data):
+        """
+        :param str data:
+        """
+        self._sock.sendall(data)
+
+    def read_until_prompt(self, response_timeout=None):
+        """
+        Blocks until the adapter has sent its prompt (">") and
+        returns everything received up to and including the prompt.
+        Raises a socket timeout if the prompt did not arrive in time.
+        :param int|float response_timeout: (optional) Timeout in seconds, defaults to the connection timeout
+        :return str:
+        """
+        deadline = time() + (response_timeout if response_timeout is not None else self._timeout)
+        length = 0
+        while True:
+            remaining = deadline - time()
+            if remaining <= 0:
+                raise timeout('Timed out waiting for OBD Adapter')
+
+            readable, _, _ = select([self._sock], [], [], remaining)
+            if not readable:
+                raise timeout('Timed out waiting for OBD Adapter')
+
+            if length == len(self._buffer):
+                self._grow_buffer()
+
+            received = self._sock.recv_into(self._view[length:])
+            if received == 0:
+                raise ObdConnectionClosedError()
+
+            if self._buffer.find(ElmSocketTransport.PROMPT, length, length + received) >= 0:
+                return bytes(self._buffer[:length + received])
+            length += received
+
+    def _grow_buffer(self):
+        # A buffer with an exported memoryview cannot be resized in place
+        self._buffer = self._buffer + bytearray(len(self._buffer))
+        self._view = memoryview(self._buffer)
+
+
+class ObdPollScheduler(object):
+    """
+    Decides which PIDs are polled next. Each PID has its own target rate,
+    every slot is filled with the most overdue PID. Mode 01 PIDs which are due
+    at the same time are grouped into one slot so they can be batched.
+    """
+
+    def __init__(self, cmds, rates, default_rate=0):
+        """
+        :param list of str cmds: PIDs to poll
+        :param dict of (str, float) rates: Target rate per PID in [Hz]
+        :param float default_rate: Rate in [Hz] for PIDs without a configured rate, 0 polls them in every slot
+        """
+        self._cmds = cmds
+        self._intervals = {}  # type: dict of (str, float)
+        self._due = {}  # type: dict of (str, float)
+        for cmd in cmds:
+            rate = rates.get(cmd, default_rate)
+            self._intervals[cmd] = 1.0 / rate if rate > 0 else 0
+            self._due[cmd] = 0
+
+    def get_next_slot(self, now, batch_size=1):
+        """
+        Returns the PIDs to poll in the next slot, starting with the most overdue one.
+        Returns an empty list if no PID is due yet.
+        :param float now: Current time in seconds
+        :param int batch_size: Max. number of Mode 01 PIDs in one slot
+        :return list of str:
+        """
+        due = [cmd for cmd in self._cmds if self._due[cmd] <= now]
+        if not due:
+            return []
+
+        due.sort(key=lambda c: self._due[c])
+        first = due[0]
+        if not is_batchable(first):
+            return [first]
+        return [cmd for cmd in due if is_batchable(cmd)][:batch_size]
+
+    def get_next_due_time(self):
+        """
+        Returns the time at which the next PID is due
+        :return float:
+        """
+        return min(self._due.values())
+
+    def mark_polled(self, cmds, now):
+        """
+        :param list of str cmds: PIDs which have been polled
+        :param float now: Current time in seconds
+        """
+        for cmd in cmds:
+            next_due = self._due[cmd] + self._intervals[cmd]
+            # Do not try to catch up on missed slots, just stay due
+            self._due[cmd] = next_due if next_due > now else now
+
+
+def get_poll_rates(config, section='PollRates'):
+    """
+    Reads the target poll rates in [Hz] per PID from the given config section
+    :param ConfigParser config:
+    :param str section:
+    :return dict of (str, float):
+    """
+    rates = {}
+    if config.has_section(section):
+        for option in config.options(section):
+            rates[option.upper()] = config.getfloat(section, option)
+    return rates
 
 
 def send(t, cmd):
     """
-    :param Telnet t:
+    :param ElmSocketTransport t:
     :param str cmd:
     :return str:
     """
     log('Sending {}'.format(cmd))
     t.write('{}\r'.format(cmd))
-    data = ''
-    while '>' not in data:
-        data = data + t.read_eager()
+    data = t.read_until_prompt()
     log('{}: Received {} bytes'.format(cmd, len(data)))
     return data.replace('\r', '|').strip()
 
 
 def get_arr(t, cmds):
     """
-    :param Telnet t:
+    :param ElmSocketTransport t:
     :param list of str cmds:
     :return list of str:
     """
@@ -91,6 +228,118 @@ def get_arr(t, cmds):
     return o
 
 
+def get_batched_arr(t, cmds, batch_size):
+    """
+    Same as get_arr, but requests up to <batch_size> Mode 01 PIDs
+    in a single request (e.g. "01050B0C"). Commands which cannot be batched
+    are requested one by one. PIDs missing from a batched response are requested
+    one by one as well, so are all PIDs of a response which cannot be split.
+    Once a response could not be split, the remaining PIDs are no longer batched.
+    :param ElmSocketTransport t:
+    :param list of str cmds:
+    :param int batch_size: Max. number of PIDs per request (ELM327 supports up to 6)
+    :return (dict of (str, str), bool): Responses and False if a batched response could not be split
+    """
+    batchable = [cmd for cmd in cmds if is_batchable(cmd)]
+    o = get_arr(t, [cmd for cmd in cmds if not is_batchable(cmd)])
+
+    i = 0
+    while i < len(batchable):
+        batch = batchable[i:i + batch_size]
+        i += len(batch)
+        if len(batch) == 1:
+            o.update(get_arr(t, batch))
+            continue
+
+        request = '01' + ''.join([cmd[2:] for cmd in batch])
+        response = send(t, request)
+        if CONFIG_VERBOSE:
+            log('VERBOSE: {} ; {}'.format(request, response))
+
+        split = split_batched_response(batch, response)
+        if split is None:
+            log('Failed to split response to {}, requesting PIDs one by one'.format(request))
+            o.update(get_arr(t, batchable[i - len(batch):]))
+            return o, False
+
+        o.update(split)
+        missing = [cmd for cmd in batch if cmd not in split]
+        if missing:
+            if CONFIG_VERBOSE:
+                log('VERBOSE: {} missing in response to {}, requesting them one by one'.format(
+                    ','.join(missing), request))
+            o.update(get_arr(t, missing))
+    return o, True
+
+
+def discover_supported_pids(t):
+    """
+    Requests the "PIDs supported" bitmaps (0100, 0120, ...) from the vehicle
+    and returns all supported Mode 01 PIDs. Every bitmap tells if the next
+    one is supported, so only as many requests as necessary are sent.
+    :param ElmSocketTransport t:
+    :return set of str:
+    """
+    supported = set()
+    cmd = '0100'
+    while cmd:
+        pids = parse_supported_pids(cmd, send(t, cmd))
+        supported.update(pids)
+
+        next_cmd = '01{:02X}'.format(int(cmd[2:], 16) + 0x20)
+        cmd = next_cmd if next_cmd in pids else None
+    return supported
+
+
+def get_supported_pids(t, pr, identity):
+    """
+    Returns the supported Mode 01 PIDs of the connected vehicle.
+    The result is cached per vehicle / adapter in the persistent Redis (if available)
+    so reconnects do not have to probe the vehicle again.
+    Returns None if the supported PIDs could not be determined.
+    :param ElmSocketTransport t:
+    :param Redis|None pr: Persistent Redis instance
+    :param str identity: VIN or adapter address
+    :return set of str|None:
+    """
+    key = PersistentObdRedisKeys.get_supported_pids_key(identity)
+    if pr:
+        cached = pr.get(key)
+        if cached:
+            log("Using cached list of supported PIDs for {}".format(identity))
+            return set(cached.split('|'))
+
+    log("Probing supported PIDs of {} ...".format(identity))
+    supported = discover_supported_pids(t)
+    if not supported:
+        log("Failed to determine supported PIDs, all PIDs will be polled")
+        return None
+
+    if pr:
+        pr.set(key, '|'.join(sorted(supported)))
+    return supported
+
+
+def filter_supported(cmds, supported):
+    """
+    Removes all Mode 01 PIDs from the given list which are not supported.
+    Other commands (e.g. ATRV or 03) are always kept.
+    :param list of str cmds:
+    :param set of str|None supported:
+    :return list of str:
+    """
+    if not supported:
+        return cmds
+
+    o = []
+    for cmd in cmds:
+        if len(cmd) == 4 and cmd[:2] == '01' and cmd not in supported:
+            log("PID {} is not supported by the vehicle and will not be polled".format(cmd))
+        else:
+            o.append(cmd)
+    return o
+
+
 if __name__ == "__main__":
     EXIT_CODE = EXIT_CODES['OK']
 
@@ -105,26 +354,38 @@ if __name__ == "__main__":
     CONFIG_INIT_SEQ = CONFIG.get('DataPoller', 'init_sequence').split(',')
     CONFIG_POLL_SEQ = CONFIG.get('DataPoller', 'poll_sequence').split(',')
     CONFIG_VERBOSE = CONFIG.get('DataPoller', 'verbose_log') == '1'
+    set_debug_log(CONFIG.getboolean('DataPoller', 'debug_log')
+                  if CONFIG.has_option('DataPoller', 'debug_log') else False)
+    CONFIG_BATCH_SIZE = CONFIG.getint('DataPoller', 'batch_size') \
+        if CONFIG.has_option('DataPoller', 'batch_size') else 1
+    CONFIG_DEFAULT_POLL_RATE = CONFIG.getfloat('DataPoller', 'default_poll_rate') \
+        if CONFIG.has_option('DataPoller', 'default_poll_rate') else 0
+    CONFIG_POLL_RATES = get_poll_rates(CONFIG)
+    CONFIG_DISCOVER_PIDS = CONFIG.getboolean('DataPoller', 'discover_pids') \
+        if CONFIG.has_option('DataPoller', 'discover_pids') else False
 
     log("Initialize Redis Connection ...")
     R = get_redis(CONFIG)
+    PUBLISHER = RedisDeltaPublisher(R)
+    HISTORY = get_history_recorder(CONFIG, R, HistoryRedisKeys.OBD_KEYS)
+    RP = get_persistent_redis(CONFIG) if CONFIG.has_section(RCONFIG_PERSISTENT_SECTION) else None
 
-    T = None  # type: Telnet
+    T = None  # type: ElmSocketTransport
 
     try:
         log("OBD Daemons is running ...")
         while True:
-            T = Telnet()
+            T = ElmSocketTransport(host=CONFIG_OBD_HOST,
+                                   port=CONFIG_OBD_PORT,
+                                   timeout=CONFIG_OBD_TIMEOUT)
 
             try:
                 log("Connecting to OBD Adapter ...")
-                T.open(host=CONFIG_OBD_HOST,
-                       port=CONFIG_OBD_PORT,
-                       timeout=CONFIG_OBD_TIMEOUT)
+                T.open()
 
                 log("Awaiting response ...")
                 T.write('\r')
-                T.read_until('>', timeout=CONFIG_OBD_TIMEOUT)
+                T.read_until_prompt()
 
                 log("Configuring Environment ...")
                 for cmd in CONFIG_INIT_SEQ:
@@ -132,24 +393,58 @@ if __name__ == "__main__":
                     if 'ERROR' in r:
                         raise ObdEnvConfigError(cmd, r)
 
+                poll_seq = CONFIG_POLL_SEQ
+                if CONFIG_DISCOVER_PIDS:
+                    log("Determining supported PIDs ...")
+                    vin = parse_vin(send(T, '0902'))
+                    identity = vin if vin else '{}:{}'.format(CONFIG_OBD_HOST, CONFIG_OBD_PORT)
+                    poll_seq = filter_supported(CONFIG_POLL_SEQ, get_supported_pids(T, RP, identity))
+
+                batch_size = CONFIG_BATCH_SIZE
+                if batch_size > 1 and not is_can_protocol(send(T, 'ATDPN')):
+                    log("Vehicle does not use CAN, requesting PIDs one by one")
+                    batch_size = 1
+
                 log("Configuration completed, starting recording loop ...")
+                if HISTORY:
+                    # Values of a previous connection are outdated
+                    HISTORY.reset()
+                scheduler = ObdPollScheduler(poll_seq, CONFIG_POLL_RATES, CONFIG_DEFAULT_POLL_RATE)
                 while True:
-                    data = transform_obj(parse_obj(get_arr(T, CONFIG_POLL_SEQ)))
+                    now = time()
+                    cmds = scheduler.get_next_slot(now, batch_size)
+                    if not cmds:
+                        sleep(max(scheduler.get_next_due_time() - now, 0))
+                        continue
+
+                    responses, batched = get_batched_arr(T, cmds, batch_size)
+                    if not batched:
+                        log("Vehicle does not answer batched requests, requesting PIDs one by one until reconnect")
+                        batch_size = 1
+                    data = decode_obj(responses)
+                    scheduler.mark_polled(cmds, now)
                     data[ObdRedisKeys.KEY_ALIVE] = 1
-                    set_piped(R, data)
+                    PUBLISHER.set_piped(data)
+                    if HISTORY:
+                        HISTORY.record(data, now)
             except timeout:
                 log("Connection to OBD Adapter timed out after {} sec, retrying after {} sec".format(
                     CONFIG_OBD_TIMEOUT, CONFIG_OBD_RETRY_TIMEOUT))
-                set_piped(R, {ObdRedisKeys.KEY_ALIVE: 0})
+                PUBLISHER.set_piped({ObdRedisKeys.KEY_ALIVE: 0})
+                sleep(CONFIG_OBD_RETRY_TIMEOUT)
+            except ObdConnectionClosedError:
+                log("Connection to OBD Adapter has been closed, retrying after {} sec".format(
+                    CONFIG_OBD_RETRY_TIMEOUT))
+                PUBLISHER.set_piped({ObdRedisKeys.KEY_ALIVE: 0})
                 sleep(CONFIG_OBD_RETRY_TIMEOUT)
             except ObdEnvConfigError as e:
                 log("Failed to configure environment (Sent={}, Received={})".format(e.sent_cmd,
                                                                                     e.received_response))
-                set_piped(R, {ObdRedisKeys.KEY_ALIVE: 0})
+                PUBLISHER.set_piped({ObdRedisKeys.KEY_ALIVE: 0})
                 sleep(CONFIG_OBD_RETRY_TIMEOUT)
             finally:
                 try:
-                    log("Trying to close Telnet connection ...")
+                    log("Trying to close connection to OBD Adapter ...")
                     T.close()
                 except (KeyboardInterrupt, SystemExit, redis_exceptions.ConnectionError) as e:
                     # Rethrow the important ones for good measure
@@ -168,7 +463,7 @@ if __name__ == "__main__":
         print_unhandled_exception()
     finally:
         if T:
-            log("Trying to close Telnet connection ...")
+            log("Trying to close connection to OBD Adapter ...")
             try:
                 T.close()
             except:
@@ -25,6 +25,18 @@ SOFTWARE.
 from CarPiLogging import log
 from RedisKeys import ObdRedisKeys
 
+# If True, every parsed value is logged (expensive, only meant for debugging)
+DEBUG_LOG = False
+
+
+def set_debug_log(enabled):
+    """
+    Enables or disables logging of every parsed value
+    :param bool enabled:
+    """
+    global DEBUG_LOG
+    DEBUG_LOG = enabled
+
 
 class ObdPidParserUnknownError(Exception):
     def __init__(self, type, val=None):
@@ -37,324 +49,310 @@ class ObdPidParserUnknownError(Exception):
         self.val = val
 
 
-def trim_obd_value(v):
+def is_batchable(cmd):
     """
-    Trims unneeded data from an OBD response
-    :param str v:
-    :return str:
+    Returns True if the given command is a Mode 01 PID which can be
+    requested together with other Mode 01 PIDs in one request
+    :param str cmd: e.g. "010C"
+    :return bool:
     """
-    if not v or len(v) < 4:
-        return ''
-    else:
-        return v[4:]
+    return len(cmd) == 4 and cmd[:2] == '01' and cmd in PID_DATA_BYTES
 
 
-def prepare_value(v):
+def _get_response_segments(lines):
     """
-    :param str v:
-    :return str:
+    Joins the lines of a (multi-frame) response into segments each starting
+    with the response mode (e.g. "41"). Multi-frame CAN responses
+    ("00C", "0:41...", "1:...") are joined into one segment and truncated to the
+    announced byte count, every other line is treated as its own segment.
+    :param list of str lines:
+    :return list of str:
     """
-    log('Preparing value {}'.format(v))
-    a = v.split('|')
-    if len(a) >= 2 and a[1] != '>':
-        log('Returning {} for {}'.format(a[1], v))
-        return a[1]
-    else:
-        log('Returning NONE for {}'.format(v))
-        return None
+    byte_count = None
+    frames = []
+    segments = []
+    for line in lines:
+        if len(line) == 3 and ':' not in line:
+            byte_count = int(line, 16)
+        elif len(line) > 2 and line[1] == ':':
+            frames.append(line[2:])
+        elif len(line) > 3 and line[2] == ':':
+            frames.append(line[3:])
+        else:
+            segments.append(line)
 
+    if frames:
+        segment = ''.join(frames)
+        if byte_count:
+            segment = segment[:byte_count * 2]
+        segments.append(segment)
+    return segments
 
-def parse_value(type, val):
-    """
-    Parses a given OBD value of a given type (PID)
-    and returns the parsed value.
-    If the PID is unknown / not implemented a PIDParserUnknownError
-    will be raised including the type which was unknown
-    :param type:
-    :param val:
-    :return:
-    """
-    if type in PARSER_MAP:
-        prep_val = prepare_value(val)
-        out = PARSER_MAP[type](prep_val)
-        log('For {} entered {}, got {} out'.format(type, prep_val, out))
-        return out
-    else:
-        raise ObdPidParserUnknownError(type, val)
 
-
-def parse_obj(o):
+def split_batched_response(cmds, response):
     """
-    Parses a given dictionary with the key being the OBD PID and the value its
-    returned value by the OBD interface
-    :param dict o:
-    :return:
+    Splits the response to a batched Mode 01 request (e.g. "010C0D0F") into
+    one response per PID, formatted as if every PID had been requested on its own
+    so they can be parsed with parse_obj. PIDs missing from the response are left out.
+    Returns None if the response could not be parsed.
+    :param list of str cmds: requested PIDs (e.g. ['010C', '010D', '010F'])
+    :param str response: Response as returned by the OBD daemon (lines separated by "|")
+    :return dict of (str, str)|None:
     """
-    r = {}
-    for k, v in o.items():
-        r[k] = parse_value(k, v)
-    return r
-
-
-def transform_obj(o):
-    r = {}
-    for k, v in o.items():
-        if v is tuple:
-            keys = OBD_REDIS_MAP[k]
-            r[keys[0]] = v[0]
-            r[keys[1]] = v[1]
-        else:
-            r[OBD_REDIS_MAP[k]] = v
-    r[ObdRedisKeys.KEY_ALIVE] = 1
-    return r
+    lines = [line for line in response.split('|') if line and line != '>']
+    # The first line is the echo of the request itself
+    segments = _get_response_segments(lines[1:])
+
+    values = {}
+    for segment in segments:
+        if segment[:2] != '41':
+            continue
+        i = 2
+        while i + 2 <= len(segment):
+            cmd = '01' + segment[i:i + 2]
+            if cmd not in PID_DATA_BYTES:
+                break
+            data_end = i + 2 + PID_DATA_BYTES[cmd] * 2
+            if data_end > len(segment):
+                break
+            if cmd not in values:
+                values[cmd] = '{}|41{}|>'.format(cmd, segment[i:data_end])
+            i = data_end
+
+    if not values:
+        return None
+    return dict([(cmd, values[cmd]) for cmd in cmds if cmd in values])
 
 
-def parse_atrv(v):
+def is_can_protocol(v):
     """
-    Parses the battery voltage and returns it in [Volt] as float with 1 decimal place
-    :param str v: e.g. "12.3V"
-    :return float:
+    Returns True if the response to ATDPN names one of the CAN protocols,
+    the only ones which allow requesting several Mode 01 PIDs at once
+    :param str v: e.g. "ATDPN|A6|>" ("A" = protocol chosen automatically)
+    :return bool:
     """
-    try:
-        return float(v.replace('V', ''))
-    except ValueError:
-        return float('nan')
-
-
-def parse_0101(v):
+    lines = [line.strip().upper() for line in v.split('|') if line and line != '>']
+    # The echo of the request is only present if echo has not been disabled (ATE0)
+    lines = [line for line in lines if line != 'ATDPN']
+    if not lines:
+        return False
+    protocol = lines[-1]
+    if protocol[:1] == 'A':
+        protocol = protocol[1:]
+    # 6 - 9: ISO 15765-4 CAN, A - C: SAE J1939 and user defined CAN
+    return len(protocol) == 1 and protocol in '6789ABC'
+
+
+def parse_supported_pids(cmd, v):
     """
-    Parses the DTC status and returns two elements.
-    https://en.wikipedia.org/wiki/OBD-II_PIDs#Mode_1_PID_01
-    :param v:
-    :return bool, int:
+    Parses a "PIDs supported" bitmap (0100, 0120, 0140, ...) and returns
+    the supported PIDs of the range it covers.
+    https://en.wikipedia.org/wiki/OBD-II_PIDs#Mode_1_PID_00
+    :param str cmd: e.g. "0100"
+    :param str v: e.g. "0100|4100BE3EB811|>"
+    :return list of str: e.g. ['0101', '0103', ...]
     """
-    tv = trim_obd_value(v)
-    mil_status = None  # type: bool
-    num_dtc = None  # type: int
+    supported = []
+    prep_val = prepare_value(v)
+    if not prep_val or prep_val[:4] != '41' + cmd[2:]:
+        return supported
 
     try:
-        byte_a = int(v[:2], 16)
-        mil_status = byte_a / 0xF >= 1
-        num_dtc = mil_status % 0xF
+        bitmap = int(trim_obd_value(prep_val)[:8], 16)
     except ValueError:
-        mil_status = None
-        num_dtc = None
+        return supported
 
-    return mil_status, num_dtc
+    base = int(cmd[2:], 16)
+    for i in range(32):
+        if bitmap & (1 << (31 - i)):
+            supported.append('01{:02X}'.format(base + i + 1))
+    return supported
 
 
-def parse_0103(v):
+def parse_vin(v):
     """
-    Parses the fuel system status and returns an array with two elements (one for
-    each fuel system).
-    The returned values are converted to decimal integers and returned as is.
-    The fuel system values are described here:
-    https://en.wikipedia.org/wiki/OBD-II_PIDs#Mode_1_PID_03
-    :param str v: e.g. "41030100"
-    :return int, int:
+    Parses the response to a VIN request (0902) and returns the VIN
+    or None if the response did not contain one
+    :param str v: e.g. "0902|014|0:490201314731|1:4A433534343452|2:37323532333637|>"
+    :return str|None:
     """
-    tv = trim_obd_value(v)  # trimmed value
-    status_1, status_2 = None, None
-    try:
-        status_1 = int(v[:2], 16)
-    except ValueError:
-        status_1 = None
+    lines = [line for line in v.split('|') if line and line != '>']
+    data = ''
+    for segment in _get_response_segments(lines[1:]):
+        if segment[:4] == '4902':
+            # Skip the mode, PID and the number of data items / sequence number
+            data += segment[6:]
 
     try:
-        status_2 = int(v[2:4], 16)
+        vin = ''.join([c for c in bytearray.fromhex(data).decode('ascii', 'ignore') if c.isalnum()])
     except ValueError:
-        status_2 = None
-
-    return status_1, status_2
+        return None
+    return vin[-17:] if len(vin) >= 17 else None
 
 
-def parse_0104(v):
-    """
-    Parses the calculated engine load and returns it as an integer from 0 - 100
-    :param str v: e.g. "410405"
-    :return int: e.g. 2
-    """
-    try:
-        val = int(trim_obd_value(v), 16)
-        return val / 2.55
-    except ValueError:
-        return float('nan')
+# First character of a DTC by its source: Powertrain, Chassis, Body, Network
+DTC_SOURCES = 'PCBU'
 
 
-def parse_010B(v):
-    """
-    Parses Intake MAP and returns it in [kPa] as an integer from 0 - 255
-    :param str v:
-    :return int:
-    """
-    try:
-        return int(trim_obd_value(v), 16)
-    except ValueError:
-        return float('nan')
+# Table driven decoder
+# ====================
+# The decoder works directly on the response string returned by the daemon
+# (e.g. "010C|410C1AF8|>"). Each PID definition knows its response header and
+# the number of data bytes, so the data is located with a single str.find and
+# converted with a single int() call. The formulas then extract the bytes
+# with shifts and masks.
 
 
-def parse_010C(v):
-    """
-    Parses Engine RPM and returns it in [RPM] as a float from 0 - 16383.75
-    :param str v:
-    :return float:
-    """
+def _decode_atrv(v):
     try:
-        val = int(trim_obd_value(v), 16)
-        return val / 4
+        return float(v.rstrip('V'))
     except ValueError:
         return float('nan')
 
 
-def parse_010D(v):
-    """
-    Parses Vehicle Speed and returns it in [km/h] as an integer from 0 - 255
-    :param str v:
-    :return int:
-    """
-    try:
-        return int(trim_obd_value(v), 16)
-    except ValueError:
-        return float('nan')
+def _decode_dtcs(v):
+    # The data starts with the number of DTCs, followed by two bytes per DTC:
+    # A7-A6: source (P, C, B, U), A5-B0: code (e.g. 0x0103 => P0103)
+    dtcs = []
+    for i in range(2, len(v) - 3, 4):
+        try:
+            d = int(v[i:i + 4], 16)
+        except ValueError:
+            continue
+        if d:
+            dtcs.append('{}{:04X}'.format(DTC_SOURCES[d >> 14], d & 0x3FFF))
+    return dtcs
 
 
-def parse_010F(v):
+class ObdPidDefinition(object):
     """
-    Parses Intake Air Temperature and returns it in [degrees C] as an integer from -40 - 215
-    :param str v:
-    :return int:
+    Describes how a PID is requested, decoded and stored
     """
-    try:
-        val = int(trim_obd_value(v), 16)
-        return val - 40
-    except ValueError:
-        return float('nan')
-
 
-def parse_0134_013B(v):
-    """
-    Parses the O2 Sensor Value (0134 - 013B) and returns two values parsed from it:
-    1. Fuel-Air Equivalence [Ratio] as a float from 0 - 2
-    2. Current in [mA] as a float from -128 - 128
-    :param str v:
-    :return tuple of float, float:
+    def __init__(self, pid, byte_count, formula, unit, redis_key, header=None, invalid_value=None):
+        """
+        :param str pid: Command sent to the adapter (e.g. "010C")
+        :param int|None byte_count: Number of data bytes, None if the length is variable
+        :param function formula: Function returning the value (or a tuple of values). Receives the data bytes
+        as one integer (e.g. 0x1AF8 for "410C1AF8") or the data as text if byte_count is None
+        :param str|None unit: Unit of the decoded value(s)
+        :param str|tuple of str redis_key: Redis key(s) the value(s) are stored in
+        :param str|None header: Response prefix preceding the data, defaults to the positive
+        response of the given PID (e.g. "410C")
+        :param object invalid_value: Value returned for invalid responses, defaults to NaN (one per value)
+        """
+        self.pid = pid
+        self.byte_count = byte_count
+        self.formula = formula
+        self.unit = unit
+        self.redis_key = redis_key
+        if header is None:
+            header = '{:02X}'.format(int(pid[:2], 16) + 0x40) + pid[2:]
+        self.header = header
+        self.value_count = len(redis_key) if isinstance(redis_key, tuple) else 1
+        if invalid_value is None:
+            invalid_value = tuple([float('nan')] * self.value_count) if self.value_count > 1 else float('nan')
+        self.invalid_value = invalid_value
+
+        # Precomputed offsets
+        self._header_length = len(header)
+        self._data_length = byte_count * 2 if byte_count else None
+
+    def decode(self, v):
+        """
+        Decodes the response to this PID.
+        Returns NaN (or a tuple of NaN) if the response does not contain valid data.
+        :param str v: e.g. "010C|410C1AF8|>"
+        :return object:
+        """
+        if not v:
+            return self.invalid_value
+
+        # Skip the echo of the request, the response header cannot be part of it
+        if self._header_length:
+            start = v.find(self.header, len(self.pid))
+            if start < 0:
+                return self.invalid_value
+            start += self._header_length
+        else:
+            start = v.find('|') + 1
+
+        try:
+            if self._data_length:
+                # Incomplete data will contain the line separator and fail to convert
+                return self.formula(int(v[start:start + self._data_length], 16))
+            else:
+                end = v.find('|', start)
+                return self.formula(v[start:end] if end >= 0 else v[start:])
+        except ValueError:
+            return self.invalid_value
+
+
+PID_DEFINITIONS = [
+    ObdPidDefinition('ATRV', None, _decode_atrv, 'V', ObdRedisKeys.KEY_BATTERY_VOLTAGE, header=''),
+    # A7: MIL on, A6-A0: number of DTCs
+    ObdPidDefinition('0101', 4,
+                     lambda d: (d & 0x80000000 != 0, (d >> 24) & 0x7F),
+                     None,
+                     (ObdRedisKeys.KEY_MIL_STATUS, ObdRedisKeys.KEY_DTC_COUNT)),
+    ObdPidDefinition('0103', 2,
+                     lambda d: (d >> 8, d & 0xFF),
+                     None,
+                     (ObdRedisKeys.KEY_FUELSYS_1_STATUS, ObdRedisKeys.KEY_FUELSYS_2_STATUS)),
+    ObdPidDefinition('0104', 1, lambda d: d / 2.55, '%', ObdRedisKeys.KEY_ENGINE_LOAD),
+    ObdPidDefinition('0105', 1, lambda d: d - 40, 'degC', ObdRedisKeys.KEY_COOLANT_TEMP),
+    ObdPidDefinition('010B', 1, lambda d: d, 'kPa', ObdRedisKeys.KEY_INTAKE_MAP),
+    ObdPidDefinition('010C', 2, lambda d: d / 4.0, 'rpm', ObdRedisKeys.KEY_ENGINE_RPM),
+    ObdPidDefinition('010D', 1, lambda d: d, 'km/h', ObdRedisKeys.KEY_VEHICLE_SPEED),
+    ObdPidDefinition('010F', 1, lambda d: d - 40, 'degC', ObdRedisKeys.KEY_INTAKE_TEMP),
+    ObdPidDefinition('03', None, _decode_dtcs, None, ObdRedisKeys.KEY_CURRENT_DTCS, invalid_value=[]),
+    ObdPidDefinition('07', None, _decode_dtcs, None, ObdRedisKeys.KEY_PENDING_DTCS, invalid_value=[])
+]
+
+# O2 Sensors 1 - 8
+# AB: Fuel-Air equivalence ratio, CD: Current in [mA]
+for _pid in ['0134', '0135', '0136', '0137', '0138', '0139', '013A', '013B']:
+    PID_DEFINITIONS.append(ObdPidDefinition(
+        _pid, 4,
+        lambda d: ((d >> 16) * 2.0 / 65536, (d & 0xFFFF) / 256.0 - 128),
+        None,
+        (ObdRedisKeys.KEY_O2_SENSOR_FAEQV, ObdRedisKeys.KEY_O2_SENSOR_CURRENT)))
+
+PID_TABLE = dict([(d.pid, d) for d in PID_DEFINITIONS])  # type: dict of (str, ObdPidDefinition)
+
+# Number of data bytes returned for each Mode 01 PID,
+# required to split batched responses
+PID_DATA_BYTES = dict([(d.pid, d.byte_count) for d in PID_DEFINITIONS if d.pid[:2] == '01' and d.byte_count])
+
+
+def decode_obj(o):
     """
-    try:
-        trim_val = trim_obd_value(v)
-        val_ab = int(trim_val[0:2], 16)
-        val_cd = int(trim_val[2:4], 16)
-        return (2 / 65536) * val_ab, val_cd - 128
-    except ValueError:
-        return float('nan'), float('nan')
-
-
-DTC_SOURCES = {
-    0: 'P',
-    1: 'C',
-    2: 'B',
-    3: 'U'
-}
-NO_DTC = 'P0000'
-
-
-def parse_03(v):
+    Decodes a given dictionary with the key being the OBD PID and the value its
+    returned value by the OBD interface and returns a dictionary prepared
+    for storage in Redis.
+    If a PID is unknown, a ObdPidParserUnknownError will be raised.
+    :param dict of (str, str) o:
+    :return dict of (str, object):
     """
-    Parses stored DTC codes and returns them as a list.
-
-    01,01,0001|0001,0001 => U1111
-
-    A7,6: Error Source
-        0 P Powertrain
-        1 C Chassis
-        2 B Body
-        3 U Network
-
-    A5,4: 2nd DTC Char => as number (0-3)
-    A3,0: 3rd DTC Char => as number (0-F)
-    B7,4: 4th DTC Char => as number (0-F)
-    B3,0: 5th DTC Char => as number (0-F)
-
-    :param str v:
-    :return list:
-    """
-    dtcs = []
-
-    trim_v = trim_obd_value(v)
-    if trim_v:
-        # print('input: {}'.format(trim_v))
-        for i in range(0, len(trim_v), 4):
-            try:
-                byte_a = int(trim_v[i:i + 2], 16)
-                byte_b = int(trim_v[i + 2:i + 4], 16)
-
-                # print(' - bytes: {},{}'.format(byte_a, byte_b))
-
-                err_src = byte_a / 64
-                err_src_code = DTC_SOURCES[err_src]
-
-                # print('   Err Src: {} ({})'.format(err_src, err_src_code))
-
-                dtc_c2 = byte_a % 64 / 16
-                dtc_c3 = byte_a % 16
-                dtc_c4 = byte_b / 16
-                dtc_c5 = byte_b % 16
-
-                # print('   {}, {}, {}, {}'.format(dtc_c2, dtc_c3, dtc_c4, dtc_c5))
-
-                dtc = '{}{}{}{}{}'.format(err_src_code, dtc_c2, dtc_c3, dtc_c4, dtc_c5)
-                # print('=> {}'.format(dtc))
-
-                if dtc != NO_DTC:
-                    dtcs.append(dtc)
-            except ValueError:
-                pass
-
-    return dtcs
-
+    r = {}
+    for k, v in o.items():
+        definition = PID_TABLE.get(k)
+        if not definition:
+            raise ObdPidParserUnknownError(k, v)
+
+        value = definition.decode(v)
+        if DEBUG_LOG:
+            log('For {} entered {}, got {} out'.format(k, v, value))
+
+        if definition.value_count > 1:
+            keys = definition.redis_key
+            for i in range(definition.value_count):
+                r[keys[i]] = value[i]
+        else:
+            r[definition.redis_key] = value
+    r[ObdRedisKeys.KEY_ALIVE] = 1
+    return r
 
-PARSER_MAP = {
-    'ATRV': parse_atrv,
-    '0101': parse_0101,
-    '0103': parse_0103,
-    '0104': parse_0104,
-    '0105': parse_010F,
-    '010B': parse_010B,
-    '010C': parse_010C,
-    '010D': parse_010D,
-    '010F': parse_010F,
-    '0134': parse_0134_013B,
-    '0135': parse_0134_013B,
-    '0136': parse_0134_013B,
-    '0137': parse_0134_013B,
-    '0138': parse_0134_013B,
-    '0139': parse_0134_013B,
-    '013A': parse_0134_013B,
-    '013B': parse_0134_013B,
-    '03': parse_03,
-    '07': parse_03
-}
-
-OBD_REDIS_MAP = {
-    'ATRV': ObdRedisKeys.KEY_BATTERY_VOLTAGE,
-    '0101': (ObdRedisKeys.KEY_MIL_STATUS, ObdRedisKeys.KEY_DTC_COUNT),
-    '0103': (ObdRedisKeys.KEY_FUELSYS_1_STATUS, ObdRedisKeys.KEY_FUELSYS_2_STATUS),
-    '0104': ObdRedisKeys.KEY_ENGINE_LOAD,
-    '0105': ObdRedisKeys.KEY_COOLANT_TEMP,
-    '010B': ObdRedisKeys.KEY_INTAKE_MAP,
-    '010C': ObdRedisKeys.KEY_ENGINE_RPM,
-    '010D': ObdRedisKeys.KEY_VEHICLE_SPEED,
-    '010F': ObdRedisKeys.KEY_INTAKE_TEMP,
-    '0134': (ObdRedisKeys.KEY_O2_SENSOR_FAEQV, ObdRedisKeys.KEY_O2_SENSOR_CURRENT),
-    '0135': (ObdRedisKeys.KEY_O2_SENSOR_FAEQV, ObdRedisKeys.KEY_O2_SENSOR_CURRENT),
-    '0136': (ObdRedisKeys.KEY_O2_SENSOR_FAEQV, ObdRedisKeys.KEY_O2_SENSOR_CURRENT),
-    '0137': (ObdRedisKeys.KEY_O2_SENSOR_FAEQV, ObdRedisKeys.KEY_O2_SENSOR_CURRENT),
-    '0138': (ObdRedisKeys.KEY_O2_SENSOR_FAEQV, ObdRedisKeys.KEY_O2_SENSOR_CURRENT),
-    '0139': (ObdRedisKeys.KEY_O2_SENSOR_FAEQV, ObdRedisKeys.KEY_O2_SENSOR_CURRENT),
-    '013A': (ObdRedisKeys.KEY_O2_SENSOR_FAEQV, ObdRedisKeys.KEY_O2_SENSOR_CURRENT),
-    '013B': (ObdRedisKeys.KEY_O2_SENSOR_FAEQV, ObdRedisKeys.KEY_O2_SENSOR_CURRENT),
-    '03': ObdRedisKeys.KEY_CURRENT_DTCS,
-    '07': ObdRedisKeys.KEY_PENDING_DTCS
-}
 
 if __name__ == "__main__":
     print("This script is not intended to be run standalone!")
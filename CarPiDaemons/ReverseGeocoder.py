@@ -0,0 +1,267 @@
+#!/usr/bin/env python
+"""
+MIT License
+
+Copyright (c) 2017 Raphael "rGunti" Guntersweiler
+
+Permission is hereby granted, free of charge, to any person obtaining a copy
+of this software and associated documentation files (the "Software"), to deal
+in the Software without restriction, including without limitation the rights
+to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+copies of the Software, and to permit persons to whom the Software is
+furnished to do so, subject to the following conditions:
+
+The above copyright notice and this permission notice shall be included in all
+copies or substantial portions of the Software.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+SOFTWARE.
+
+Place Table File Format
+=======================
+Header: Magic "CPGEO", format version (uint8), cell size in degrees (float32),
+grid rows (uint16), grid columns (uint16), place count (uint32).
+
+Cell Table: (rows * columns + 1) uint32, the index of the first place of each cell
+(cells are numbered row by row, starting at 90 deg South / 180 deg West).
+The places of a cell end where the places of the next cell start.
+
+Places (sorted by cell, stored column by column): The latitudes (float32) of all places,
+then their longitudes (float32), then the offsets of their names (uint32).
+
+Names: Length (uint16) followed by "name<TAB>admin1<TAB>admin2<TAB>country code" (UTF-8).
+
+All values are little endian. The file is memory-mapped, so only the pages
+touched by a search are ever loaded.
+"""
+from array import array
+from math import ceil, cos, radians, floor
+from mmap import mmap, ACCESS_READ
+from struct import Struct
+from sys import byteorder
+
+PLACE_TABLE_MAGIC = 'CPGEO'
+PLACE_TABLE_VERSION = 1
+
+HEADER = Struct('<5sBfHHI')
+CELL = Struct('<I')
+CELL_RANGE = Struct('<II')
+COORDINATE = Struct('<f')
+NAME_OFFSET = Struct('<I')
+NAME_LENGTH = Struct('<H')
+
+NAME_SEPARATOR = '\t'
+
+# Values are stored in little endian
+_SWAP_BYTES = byteorder != 'little'
+
+DEFAULT_CELL_SIZE = 0.25  # degrees
+DEFAULT_MAX_DISTANCE = 2.0  # degrees
+
+# Limits the number of columns searched near the poles
+MIN_COS_LAT = 0.01
+
+KEY_NAME = 'name'
+KEY_ADMIN1 = 'admin1'
+KEY_ADMIN2 = 'admin2'
+KEY_COUNTRY = 'cc'
+
+
+class PlaceTableFormatError(Exception):
+    pass
+
+
+def _get_cell(lat, lon, cell_size, rows, cols):
+    """
+    :return (int, int): Row and column of the cell containing the given position
+    """
+    row = min(max(int(floor((lat + 90) / cell_size)), 0), rows - 1)
+    col = int(floor((lon + 180) / cell_size)) % cols
+    return row, col
+
+
+def build_place_table(places, path, cell_size=DEFAULT_CELL_SIZE):
+    """
+    Writes a place table
+    :param list of (float, float, unicode, unicode, unicode, unicode) places:
+    Latitude, longitude, name, admin1, admin2 and country code of each place
+    :param str path:
+    :param float cell_size: Size of a grid cell in degrees (has to divide 180 without remainder)
+    :return int: Number of places written
+    """
+    rows = int(round(180 / cell_size))
+    cols = int(round(360 / cell_size))
+
+    cells = [[] for _ in range(rows * cols)]
+    for place in places:
+        row, col = _get_cell(place[0], place[1], cell_size, rows, cols)
+        cells[row * cols + col].append(place)
+
+    cell_table = []
+    lats = []
+    lons = []
+    name_offsets = []
+    names = []
+    names_length = 0
+    for cell in cells:
+        cell_table.append(len(lats))
+        for lat, lon, name, admin1, admin2, cc in cell:
+            lats.append(COORDINATE.pack(lat))
+            lons.append(COORDINATE.pack(lon))
+            name_offsets.append(NAME_OFFSET.pack(names_length))
+            text = NAME_SEPARATOR.join([name, admin1, admin2, cc]).encode('utf-8')
+            names.append(NAME_LENGTH.pack(len(text)) + text)
+            names_length += NAME_LENGTH.size + len(text)
+    cell_table.append(len(lats))
+
+    with open(path, 'wb') as f:
+        f.write(HEADER.pack(PLACE_TABLE_MAGIC, PLACE_TABLE_VERSION, cell_size, rows, cols, len(lats)))
+        f.write(''.join([CELL.pack(i) for i in cell_table]))
+        f.write(''.join(lats))
+        f.write(''.join(lons))
+        f.write(''.join(name_offsets))
+        f.write(''.join(names))
+    return len(lats)
+
+
+class ReverseGeocoder(object):
+    """
+    Finds the nearest place to a position in a place table (see build_place_table).
+    The cell containing the position is searched first, then the rings of cells
+    around it until no unsearched cell can contain a nearer place.
+    """
+
+    def __init__(self, path, max_distance=DEFAULT_MAX_DISTANCE):
+        """
+        :param str path: Path of the place table
+        :param float max_distance: Max. distance of a place in degrees
+        """
+        self._file = open(path, 'rb')
+        self._map = mmap(self._file.fileno(), 0, access=ACCESS_READ)
+
+        magic, version, self._cell_size, self._rows, self._cols, self._count = HEADER.unpack_from(self._map, 0)
+        if magic != PLACE_TABLE_MAGIC or version != PLACE_TABLE_VERSION:
+            raise PlaceTableFormatError('{} is not a place table or has an unsupported version'.format(path))
+
+        self._cells_offset = HEADER.size
+        self._lats_offset = self._cells_offset + (self._rows * self._cols + 1) * CELL.size
+        self._lons_offset = self._lats_offset + self._count * COORDINATE.size
+        self._name_offsets_offset = self._lons_offset + self._count * COORDINATE.size
+        self._names_offset = self._name_offsets_offset + self._count * NAME_OFFSET.size
+        self._max_distance = max_distance
+        # Max. number of rows between the cell of the position and the cell of a place
+        self._max_row_rings = int(ceil(max_distance / self._cell_size))
+
+    def get_place_count(self):
+        return self._count
+
+    def _get_ring(self, row, col, ring):
+        """
+        Returns the cells at a distance of exactly <ring> cells,
+        except the rows more than the max. distance away
+        :return list of int: Cell indices
+        """
+        if ring == 0:
+            return [row * self._cols + col]
+
+        cells = []
+        for r in range(max(row - ring, row - self._max_row_rings), min(row + ring, row + self._max_row_rings) + 1):
+            if r < 0 or r >= self._rows:
+                continue
+            if r == row - ring or r == row + ring:
+                cols = range(col - ring, col + ring + 1)
+            else:
+                cols = [col - ring, col + ring]
+            for c in cols:
+                cells.append(r * self._cols + c % self._cols)
+        return cells
+
+    def _get_coordinates(self, offset, start, end):
+        """
+        :return array: Coordinates [start:end] of the column at the given offset
+        """
+        coordinates = array('f', self._map[offset + start * COORDINATE.size:offset + end * COORDINATE.size])
+        if _SWAP_BYTES:
+            coordinates.byteswap()
+        return coordinates
+
+    def search(self, lat, lon):
+        """
+        Returns the nearest place or None if there is no place within the max. distance
+        :param float lat: Latitude in degrees
+        :param float lon: Longitude in degrees
+        :return dict of (str, unicode)|None: name, admin1, admin2 and cc (country code) of the place
+        """
+        row, col = _get_cell(lat, lon, self._cell_size, self._rows, self._cols)
+        cos_lat = max(cos(radians(lat)), MIN_COS_LAT)
+        max_distance_sq = self._max_distance ** 2
+
+        # Longitude differences are scaled by cos(lat), so towards the poles
+        # more columns than rows are within the max. distance
+        max_rings = min(max(int(ceil(self._max_distance / (self._cell_size * cos_lat))), self._max_row_rings),
+                        self._cols // 2)
+
+        # Only positions near the date line have to handle the wrap-around of the longitude
+        wraps = abs(lon) + (max_rings + 1) * self._cell_size >= 180
+
+        best_index = None
+        best_distance = None
+        for ring in range(max_rings + 1):
+            for cell in self._get_ring(row, col, ring):
+                start, end = CELL_RANGE.unpack_from(self._map, self._cells_offset + cell * CELL.size)
+                if start == end:
+                    continue
+
+                lats = self._get_coordinates(self._lats_offset, start, end)
+                lons = self._get_coordinates(self._lons_offset, start, end)
+                # Equirectangular approximation, good enough to compare distances
+                if wraps:
+                    distances = [(a - lat) ** 2 + (min(abs(b - lon), 360 - abs(b - lon)) * cos_lat) ** 2
+                                 for a, b in zip(lats, lons)]
+                else:
+                    distances = [(a - lat) ** 2 + ((b - lon) * cos_lat) ** 2 for a, b in zip(lats, lons)]
+
+                distance = min(distances)
+                if best_distance is None or distance < best_distance:
+                    best_index = start + distances.index(distance)
+                    best_distance = distance
+
+            if best_index is not None:
+                # Places in unsearched cells are at least <ring> rows or columns away
+                min_distance = ring * self._cell_size * cos_lat
+                if best_distance <= min_distance ** 2:
+                    break
+
+        if best_index is None or best_distance > max_distance_sq:
+            return None
+        return self._get_place(best_index)
+
+    def _get_place(self, index):
+        """
+        :param int index:
+        :return dict of (str, unicode):
+        """
+        name_offset, = NAME_OFFSET.unpack_from(self._map, self._name_offsets_offset + index * NAME_OFFSET.size)
+        offset = self._names_offset + name_offset
+        length, = NAME_LENGTH.unpack_from(self._map, offset)
+        offset += NAME_LENGTH.size
+        name, admin1, admin2, cc = self._map[offset:offset + length].decode('utf-8').split(NAME_SEPARATOR)
+        return {
+            KEY_NAME: name,
+            KEY_ADMIN1: admin1,
+            KEY_ADMIN2: admin2,
+            KEY_COUNTRY: cc
+        }
+
+    def close(self):
+        self._map.close()
+        self._file.close()
+
+
+if __name__ == "__main__":
+    print("This script is not intended to be run standalone!")
@@ -0,0 +1,551 @@
+#!/usr/bin/env python
+"""
+MIT License
+
+Copyright (c) 2017 Raphael "rGunti" Guntersweiler
+
+Permission is hereby granted, free of charge, to any person obtaining a copy
+of this software and associated documentation files (the "Software"), to deal
+in the Software without restriction, including without limitation the rights
+to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+copies of the Software, and to permit persons to whom the Software is
+furnished to do so, subject to the following conditions:
+
+The above copyright notice and this permission notice shall be included in all
+copies or substantial portions of the Software.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+SOFTWARE.
+"""
+from datetime import datetime
+from math import radians, degrees, sin, cos, sqrt, atan2
+from time import sleep, time
+
+import pytz
+
+from CarPiConfig import init_config_env
+from CarPiLogging import EXIT_CODES, boot_print, end_print, print_unhandled_exception, log
+from GeoDistance import WGS84_A, WGS84_E2
+from RedisKeys import GpsRedisKeys, ObdRedisKeys, FusionRedisKeys
+from RedisUtils import get_redis, create_background_fetcher, RedisDeltaPublisher
+from redis import exceptions as redis_exceptions
+from sys import exit
+import os
+
+
+APP_NAME = os.path.basename(__file__)
+
+INPUT_KEYS = [
+    GpsRedisKeys.KEY_FIX_MODE,
+    GpsRedisKeys.KEY_TIME,
+    GpsRedisKeys.KEY_LATITUDE,
+    GpsRedisKeys.KEY_LONGITUDE,
+    GpsRedisKeys.KEY_EPX,
+    GpsRedisKeys.KEY_EPY,
+    GpsRedisKeys.KEY_SPEED,
+    GpsRedisKeys.KEY_EPS,
+    GpsRedisKeys.KEY_TRACK,
+    GpsRedisKeys.KEY_EPD,
+    ObdRedisKeys.KEY_ALIVE,
+    ObdRedisKeys.KEY_VEHICLE_SPEED
+]
+
+# Defaults of the filter parameters (see fusion-daemon.conf)
+DEFAULT_ACCEL_NOISE = 3.0  # [m/s^2]
+DEFAULT_GPS_POSITION_ERROR = 10.0  # [m], used if the fix has no EPX/EPY
+DEFAULT_GPS_SPEED_ERROR = 0.5  # [m/s], used if the fix has no EPS
+DEFAULT_GPS_TRACK_ERROR = 5.0  # [deg], used if the fix has no EPD
+DEFAULT_OBD_SPEED_ERROR = 0.5  # [m/s]
+
+# Below this speed the direction of travel is considered unknown
+MIN_HEADING_SPEED = 1.0  # [m/s]
+
+# The reference point of the local coordinates is moved once the position is this far away
+# (keeps the error of the flat earth approximation small)
+MAX_REFERENCE_DISTANCE = 10000.0  # [m]
+
+UNKNOWN_VARIANCE = 1e6
+
+
+class SpeedFusionFilter(object):
+    """
+    Kalman filter fusing the GPS fixes with the vehicle speed reported by OBD.
+    The state is the position (East, North in meters relative to a reference point)
+    and the velocity (East, North in m/s), the vehicle is assumed to move at a
+    constant velocity with random accelerations in between.
+
+    GPS fixes update the position and the velocity (speed and track), the OBD speed
+    only updates the magnitude of the velocity, so the direction is left to GPS.
+    Between two GPS fixes the position is dead-reckoned from the velocity.
+
+    The GPS measurements observe two components of the state directly and the OBD
+    speed is a single value, so the filter needs no more than 2x2 inversions and
+    the 4x4 matrices are handled element by element.
+    """
+
+    def __init__(self,
+                 accel_noise=DEFAULT_ACCEL_NOISE,
+                 gps_position_error=DEFAULT_GPS_POSITION_ERROR,
+                 gps_speed_error=DEFAULT_GPS_SPEED_ERROR,
+                 gps_track_error=DEFAULT_GPS_TRACK_ERROR,
+                 obd_speed_error=DEFAULT_OBD_SPEED_ERROR,
+                 obd_speed_scale=1.0):
+        """
+        :param float accel_noise: Std. deviation of the acceleration in m/s^2
+        :param float gps_position_error: Position error in m if the fix reports none
+        :param float gps_speed_error: Speed error in m/s if the fix reports none
+        :param float gps_track_error: Track error in degrees if the fix reports none
+        :param float obd_speed_error: Std. deviation of the OBD speed in m/s
+        :param float obd_speed_scale: Correction factor applied to the OBD speed
+        """
+        self._accel_variance = accel_noise * accel_noise
+        self._gps_position_error = gps_position_error
+        self._gps_speed_error = gps_speed_error
+        self._gps_track_error = radians(gps_track_error)
+        self._obd_speed_error = obd_speed_error
+        self._obd_speed_scale = obd_speed_scale
+        self.reset()
+
+    def reset(self):
+        """
+        Forgets the current state
+        """
+        self._x = [0.0, 0.0, 0.0, 0.0]
+        self._p = [[UNKNOWN_VARIANCE, 0.0, 0.0, 0.0],
+                   [0.0, UNKNOWN_VARIANCE, 0.0, 0.0],
+                   [0.0, 0.0, UNKNOWN_VARIANCE, 0.0],
+                   [0.0, 0.0, 0.0, UNKNOWN_VARIANCE]]
+        self._time = None
+        self._reference = None  # (lat, lon, m per deg. lat, m per deg. lon)
+        self._heading = None  # Last known direction of travel in radians
+        self._has_velocity = False
+
+    def drop_position(self):
+        """
+        Forgets the position but keeps the velocity (e.g. if dead reckoning has been going on for too long)
+        """
+        self._reference = None
+
+    def has_position(self):
+        return self._reference is not None
+
+    def has_velocity(self):
+        return self._has_velocity
+
+    def predict(self, now):
+        """
+        Advances the state to the given time
+        :param float now: Time in seconds
+        """
+        dt = now - self._time if self._time is not None else 0
+        self._time = now
+        if dt <= 0:
+            return
+
+        x = self._x
+        p = self._p
+        x[0] += x[2] * dt
+        x[1] += x[3] * dt
+
+        # P = F P F^T + Q
+        for j in range(4):
+            p[0][j] += dt * p[2][j]
+            p[1][j] += dt * p[3][j]
+        for row in p:
+            row[0] += dt * row[2]
+            row[1] += dt * row[3]
+
+        q = self._accel_variance
+        q_pos = q * dt ** 4 / 4
+        q_cross = q * dt ** 3 / 2
+        q_vel = q * dt * dt
+        p[0][0] += q_pos
+        p[1][1] += q_pos
+        p[0][2] += q_cross
+        p[2][0] += q_cross
+        p[1][3] += q_cross
+        p[3][1] += q_cross
+        p[2][2] += q_vel
+        p[3][3] += q_vel
+
+        if self._reference and max(abs(x[0]), abs(x[1])) > MAX_REFERENCE_DISTANCE:
+            lat, lon = self.get_position()
+            self._set_reference(lat, lon)
+            x[0] = 0.0
+            x[1] = 0.0
+
+    def _update(self, i, z0, z1, r00, r01, r11):
+        """
+        Measurement update of the state components i and i + 1
+        :param int i: 0 for the position, 2 for the velocity
+        :param float z0: Measured East component
+        :param float z1: Measured North component
+        :param float r00: Measurement covariance
+        :param float r01: Measurement covariance
+        :param float r11: Measurement covariance
+        """
+        x = self._x
+        p = self._p
+        s00 = p[i][i] + r00
+        s01 = p[i][i + 1] + r01
+        s11 = p[i + 1][i + 1] + r11
+        det = s00 * s11 - s01 * s01
+        if det <= 0:
+            return
+        a = s11 / det
+        b = -s01 / det
+        d = s00 / det
+
+        y0 = z0 - x[i]
+        y1 = z1 - x[i + 1]
+        row0 = list(p[i])
+        row1 = list(p[i + 1])
+        for k in range(4):
+            k0 = p[k][i] * a + p[k][i + 1] * b
+            k1 = p[k][i] * b + p[k][i + 1] * d
+            x[k] += k0 * y0 + k1 * y1
+            for j in range(4):
+                p[k][j] -= k0 * row0[j] + k1 * row1[j]
+
+        # Keep P symmetric despite rounding errors
+        for k in range(4):
+            for j in range(k + 1, 4):
+                p[k][j] = p[j][k] = (p[k][j] + p[j][k]) / 2
+
+    def _update_velocity(self, speed, heading, along_error, cross_error):
+        """
+        Updates the velocity with a measurement of the speed in the given direction
+        :param float speed: In m/s
+        :param float heading: Direction of travel in radians (clockwise from North)
+        :param float along_error: Std. deviation along the direction of travel in m/s
+        :param float cross_error: Std. deviation across the direction of travel in m/s
+        """
+        sin_h = sin(heading)
+        cos_h = cos(heading)
+        along = along_error * along_error
+        cross = cross_error * cross_error
+        self._update(2, speed * sin_h, speed * cos_h,
+                     along * sin_h * sin_h + cross * cos_h * cos_h,
+                     (along - cross) * sin_h * cos_h,
+                     along * cos_h * cos_h + cross * sin_h * sin_h)
+        self._has_velocity = True
+
+    def _set_reference(self, lat, lon):
+        """
+        :param float lat: Latitude in degrees
+        :param float lon: Longitude in degrees
+        """
+        cos_phi = cos(radians(lat))
+        w2 = 1 - WGS84_E2 * (1 - cos_phi * cos_phi)
+        n = WGS84_A / sqrt(w2)
+        m = n * (1 - WGS84_E2) / w2
+        self._reference = (lat, lon, radians(m), radians(n * cos_phi))
+
+    def update_gps(self, lat, lon, epx=None, epy=None, speed=None, eps=None, track=None, epd=None):
+        """
+        Updates the state with a GPS fix, missing values are skipped
+        (errors reported by gpsd are 95% confidence values and used as std. deviation)
+        :param float lat: Latitude in degrees
+        :param float lon: Longitude in degrees
+        :param float|None epx: Longitude error in m
+        :param float|None epy: Latitude error in m
+        :param float|None speed: Speed in m/s
+        :param float|None eps: Speed error in m/s
+        :param float|None track: Track in degrees
+        :param float|None epd: Track error in degrees
+        """
+        epx = epx or self._gps_position_error
+        epy = epy or self._gps_position_error
+        if self._reference is None:
+            self._set_reference(lat, lon)
+            x = self._x
+            p = self._p
+            x[0] = 0.0
+            x[1] = 0.0
+            for k in range(4):
+                p[0][k] = p[k][0] = 0.0
+                p[1][k] = p[k][1] = 0.0
+            p[0][0] = epx * epx
+            p[1][1] = epy * epy
+        else:
+            ref_lat, ref_lon, m_lat, m_lon = self._reference
+            d_lon = lon - ref_lon
+            if d_lon > 180:
+                d_lon -= 360
+            elif d_lon < -180:
+                d_lon += 360
+            self._update(0, d_lon * m_lon, (lat - ref_lat) * m_lat, epx * epx, 0.0, epy * epy)
+
+        if speed is None:
+            return
+        eps = eps or self._gps_speed_error
+        if track is None:
+            if speed > eps:
+                return
+            # Standing still, the direction does not matter
+            track = 0.0
+        heading = radians(track)
+        if speed >= MIN_HEADING_SPEED and self._heading is None:
+            # The direction of a velocity built up from the OBD speed alone is made up
+            self._forget_velocity()
+        track_error = radians(epd) if epd else self._gps_track_error
+        self._update_velocity(speed, heading, eps, max(speed * track_error, eps))
+        if speed >= MIN_HEADING_SPEED:
+            self._heading = heading
+
+    def _forget_velocity(self):
+        p = self._p
+        for k in range(4):
+            p[2][k] = p[k][2] = 0.0
+            p[3][k] = p[k][3] = 0.0
+        p[2][2] = UNKNOWN_VARIANCE
+        p[3][3] = UNKNOWN_VARIANCE
+
+    def update_obd(self, speed_kmh):
+        """
+        Updates the velocity with the vehicle speed reported by OBD.
+        OBD only measures the magnitude of the velocity, the direction is left to GPS
+        (extended Kalman filter update with the speed linearized along the current velocity).
+        :param float speed_kmh: In km/h
+        """
+        speed = speed_kmh / 3.6 * self._obd_speed_scale
+        x = self._x
+        p = self._p
+        estimate = sqrt(x[2] * x[2] + x[3] * x[3])
+        if estimate >= MIN_HEADING_SPEED:
+            u0 = x[2] / estimate
+            u1 = x[3] / estimate
+        else:
+            # Too slow for a reliable direction, the speed is measured along the last known
+            # heading (or an arbitrary one, GPS will correct it)
+            heading = self._heading or 0.0
+            u0 = sin(heading)
+            u1 = cos(heading)
+            estimate = x[2] * u0 + x[3] * u1
+
+        # P H^T, H = [0, 0, u0, u1]
+        ph = [row[2] * u0 + row[3] * u1 for row in p]
+        s = ph[2] * u0 + ph[3] * u1 + self._obd_speed_error * self._obd_speed_error
+        y = speed - estimate
+        for k in range(4):
+            gain = ph[k] / s
+            x[k] += gain * y
+            for j in range(4):
+                p[k][j] -= gain * ph[j]
+        self._has_velocity = True
+
+    def get_speed(self):
+        """
+        :return float: Speed in m/s
+        """
+        return sqrt(self._x[2] * self._x[2] + self._x[3] * self._x[3])
+
+    def get_track(self):
+        """
+        :return float|None: Direction of travel in degrees, None if unknown
+        """
+        if self._heading is None:
+            return None
+        if self.get_speed() >= MIN_HEADING_SPEED:
+            return degrees(atan2(self._x[2], self._x[3])) % 360
+        return degrees(self._heading) % 360
+
+    def get_position(self):
+        """
+        :return (float, float)|(None, None): Latitude and longitude in degrees
+        """
+        if self._reference is None:
+            return None, None
+        ref_lat, ref_lon, m_lat, m_lon = self._reference
+        lon = ref_lon + self._x[0] / m_lon
+        if lon > 180:
+            lon -= 360
+        elif lon < -180:
+            lon += 360
+        return ref_lat + self._x[1] / m_lat, lon
+
+    def get_position_error(self):
+        """
+        :return (float, float)|(None, None): Std. deviation of the position (East, North) in m
+        """
+        if self._reference is None:
+            return None, None
+        return sqrt(self._p[0][0]), sqrt(self._p[1][1])
+
+
+class SpeedFusion(object):
+    """
+    Feeds the values fetched from Redis into a SpeedFusionFilter
+    and returns the fused values to be published.
+    """
+
+    def __init__(self, speed_filter, obd_update_interval, max_dead_reckoning, timeout):
+        """
+        :param SpeedFusionFilter speed_filter:
+        :param float obd_update_interval: Max. time in seconds before an unchanged OBD speed is applied again
+        :param float max_dead_reckoning: Max. time in seconds the position is dead-reckoned without a GPS fix
+        :param float timeout: Time in seconds without any measurement before the filter is reset
+        """
+        self._filter = speed_filter
+        self._obd_update_interval = obd_update_interval
+        self._max_dead_reckoning = max_dead_reckoning
+        self._timeout = timeout
+        self._last_version = 0
+        self._last_gps = None
+        self._last_obd = None
+
+    def update(self, snapshot, now):
+        """
+        :param DataSnapshot snapshot: Decoded values of INPUT_KEYS
+        :param float now: Current time in seconds
+        :return dict of (str, object): Values to publish
+        """
+        data = snapshot.data
+        changed = snapshot.changed_since(self._last_version)
+        self._last_version = snapshot.version
+
+        f = self._filter
+        f.predict(now)
+
+        # The GPS Daemon publishes every fix exactly once, so a new time means a new fix
+        lat = data.get(GpsRedisKeys.KEY_LATITUDE)
+        lon = data.get(GpsRedisKeys.KEY_LONGITUDE)
+        if GpsRedisKeys.KEY_TIME in changed and data.get(GpsRedisKeys.KEY_FIX_MODE) >= 2 \
+                and lat is not None and lon is not None:
+            f.update_gps(lat, lon,
+                         data.get(GpsRedisKeys.KEY_EPX), data.get(GpsRedisKeys.KEY_EPY),
+                         data.get(GpsRedisKeys.KEY_SPEED), data.get(GpsRedisKeys.KEY_EPS),
+                         data.get(GpsRedisKeys.KEY_TRACK), data.get(GpsRedisKeys.KEY_EPD))
+            self._last_gps = now
+
+        # An unchanged OBD speed is not fetched again, so it is reapplied from time to time
+        obd_speed = data.get(ObdRedisKeys.KEY_VEHICLE_SPEED)
+        if data.get(ObdRedisKeys.KEY_ALIVE) == 1 and obd_speed is not None \
+                and (ObdRedisKeys.KEY_VEHICLE_SPEED in changed
+                     or self._last_obd is None or now - self._last_obd >= self._obd_update_interval):
+            f.update_obd(obd_speed)
+            self._last_obd = now
+
+        measurements = [t for t in [self._last_gps, self._last_obd] if t is not None]
+        if not measurements or now - max(measurements) > self._timeout:
+            if measurements:
+                last_measurement = max(measurements)
+                log("No measurements received for {:.1f} s, resetting filter".format(now - last_measurement))
+                f.reset()
+                self._last_gps = None
+                self._last_obd = None
+            return SpeedFusion.get_empty_data()
+
+        if f.has_position() and now - self._last_gps > self._max_dead_reckoning:
+            log("No GPS fix received for {:.1f} s, dropping position".format(now - self._last_gps))
+            f.drop_position()
+
+        speed = f.get_speed() if f.has_velocity() else None
+        track = f.get_track() if f.has_velocity() else None
+        lat, lon = f.get_position()
+        epx, epy = f.get_position_error()
+        return {
+            FusionRedisKeys.KEY_SPEED: round(speed, 2) if speed is not None else None,
+            FusionRedisKeys.KEY_SPEED_KMH: round(speed * 3.6, 1) if speed is not None else None,
+            FusionRedisKeys.KEY_TRACK: round(track, 1) if track is not None else None,
+            FusionRedisKeys.KEY_LATITUDE: round(lat, 7) if lat is not None else None,
+            FusionRedisKeys.KEY_LONGITUDE: round(lon, 7) if lon is not None else None,
+            FusionRedisKeys.KEY_EPX: round(epx, 1) if epx is not None else None,
+            FusionRedisKeys.KEY_EPY: round(epy, 1) if epy is not None else None
+        }
+
+    @staticmethod
+    def get_empty_data():
+        """
+        :return dict of (str, object):
+        """
+        return {
+            FusionRedisKeys.KEY_SPEED: None,
+            FusionRedisKeys.KEY_SPEED_KMH: None,
+            FusionRedisKeys.KEY_TRACK: None,
+            FusionRedisKeys.KEY_LATITUDE: None,
+            FusionRedisKeys.KEY_LONGITUDE: None,
+            FusionRedisKeys.KEY_EPX: None,
+            FusionRedisKeys.KEY_EPY: None
+        }
+
+
+if __name__ == "__main__":
+    EXIT_CODE = EXIT_CODES['OK']
+
+    CONFIG = init_config_env('CARPI_FUSION_CONF', ['fusion-daemon.conf', '/etc/carpi/fusion-daemon.conf'])
+    boot_print(APP_NAME)
+
+    CONFIG_INTERVAL = CONFIG.getfloat('SpeedFusion', 'interval') / 1000
+    CONFIG_ALIVE_INTERVAL = CONFIG.getfloat('SpeedFusion', 'alive_interval') / 1000 \
+        if CONFIG.has_option('SpeedFusion', 'alive_interval') else 1
+    CONFIG_ACCEL_NOISE = CONFIG.getfloat('SpeedFusion', 'accel_noise') \
+        if CONFIG.has_option('SpeedFusion', 'accel_noise') else DEFAULT_ACCEL_NOISE
+    CONFIG_GPS_POSITION_ERROR = CONFIG.getfloat('SpeedFusion', 'gps_position_error') \
+        if CONFIG.has_option('SpeedFusion', 'gps_position_error') else DEFAULT_GPS_POSITION_ERROR
+    CONFIG_GPS_SPEED_ERROR = CONFIG.getfloat('SpeedFusion', 'gps_speed_error') \
+        if CONFIG.has_option('SpeedFusion', 'gps_speed_error') else DEFAULT_GPS_SPEED_ERROR
+    CONFIG_GPS_TRACK_ERROR = CONFIG.getfloat('SpeedFusion', 'gps_track_error') \
+        if CONFIG.has_option('SpeedFusion', 'gps_track_error') else DEFAULT_GPS_TRACK_ERROR
+    CONFIG_OBD_SPEED_ERROR = CONFIG.getfloat('SpeedFusion', 'obd_speed_error') \
+        if CONFIG.has_option('SpeedFusion', 'obd_speed_error') else DEFAULT_OBD_SPEED_ERROR
+    CONFIG_OBD_SPEED_SCALE = CONFIG.getfloat('SpeedFusion', 'obd_speed_scale') \
+        if CONFIG.has_option('SpeedFusion', 'obd_speed_scale') else 1.0
+    CONFIG_OBD_UPDATE_INTERVAL = CONFIG.getfloat('SpeedFusion', 'obd_update_interval') / 1000 \
+        if CONFIG.has_option('SpeedFusion', 'obd_update_interval') else 0.5
+    CONFIG_MAX_DEAD_RECKONING = CONFIG.getfloat('SpeedFusion', 'max_dead_reckoning') / 1000 \
+        if CONFIG.has_option('SpeedFusion', 'max_dead_reckoning') else 60
+    CONFIG_TIMEOUT = CONFIG.getfloat('SpeedFusion', 'timeout') / 1000 \
+        if CONFIG.has_option('SpeedFusion', 'timeout') else 5
+
+    log("Initialize Redis Connection ...")
+    R = get_redis(CONFIG)
+    PUBLISHER = RedisDeltaPublisher(R)
+
+    FETCHER = create_background_fetcher(R, INPUT_KEYS, CONFIG_INTERVAL, decode_values=True)
+    FUSION = SpeedFusion(SpeedFusionFilter(accel_noise=CONFIG_ACCEL_NOISE,
+                                           gps_position_error=CONFIG_GPS_POSITION_ERROR,
+                                           gps_speed_error=CONFIG_GPS_SPEED_ERROR,
+                                           gps_track_error=CONFIG_GPS_TRACK_ERROR,
+                                           obd_speed_error=CONFIG_OBD_SPEED_ERROR,
+                                           obd_speed_scale=CONFIG_OBD_SPEED_SCALE),
+                         obd_update_interval=CONFIG_OBD_UPDATE_INTERVAL,
+                         max_dead_reckoning=CONFIG_MAX_DEAD_RECKONING,
+                         timeout=CONFIG_TIMEOUT)
+
+    try:
+        log("Speed Fusion Daemon is running ...")
+        FETCHER.start()
+        alive = None
+        next_alive = 0
+        while True:
+            now = time()
+            data = FUSION.update(FETCHER.get_snapshot(), now)
+
+            # The alive key is only updated once in a while, so it is not written with every step
+            if now >= next_alive:
+                alive = datetime.now(pytz.utc)
+                next_alive = now + CONFIG_ALIVE_INTERVAL
+            data[FusionRedisKeys.KEY_ALIVE] = alive
+            PUBLISHER.set_piped(data)
+
+            sleep(max(CONFIG_INTERVAL - (time() - now), 0))
+    except (KeyboardInterrupt, SystemExit):
+        log("Shutdown requested!")
+    except redis_exceptions.ConnectionError:
+        EXIT_CODE = EXIT_CODES['DataSourceLost']
+        log("Connection to Redis Server lost! Daemon is quitting and waiting for relaunch")
+    except:
+        EXIT_CODE = EXIT_CODES['UnhandledException']
+        print_unhandled_exception(APP_NAME)
+    finally:
+        if not FETCHER.stop_safe() and EXIT_CODE == EXIT_CODES['OK']:
+            EXIT_CODE = EXIT_CODES['BackgroundThreadTimedOut']
+
+    end_print()
+    exit(EXIT_CODE)
@@ -0,0 +1,166 @@
+#!/usr/bin/env python
+"""
+MIT License
+
+Copyright (c) 2017 Raphael "rGunti" Guntersweiler
+
+Permission is hereby granted, free of charge, to any person obtaining a copy
+of this software and associated documentation files (the "Software"), to deal
+in the Software without restriction, including without limitation the rights
+to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+copies of the Software, and to permit persons to whom the Software is
+furnished to do so, subject to the following conditions:
+
+The above copyright notice and this permission notice shall be included in all
+copies or substantial portions of the Software.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+SOFTWARE.
+"""
+from datetime import datetime
+from time import sleep, time
+
+from CarPiConfig import init_config_env
+from CarPiLogging import EXIT_CODES, boot_print, end_print, print_unhandled_exception, log
+from RedisKeys import GpsRedisKeys, ObdRedisKeys, PersistentGpsRedisKeys
+from RedisUtils import get_redis, get_persistent_redis, get_piped, create_background_fetcher
+from TripLog import TripLogWriter, get_trip_log_file_name
+from redis import exceptions as redis_exceptions
+from sys import exit
+import os
+
+
+APP_NAME = os.path.basename(__file__)
+
+# Keys recorded in the trip log (in the order of TripLog.TRIP_LOG_COLUMNS, without the time)
+RECORDED_KEYS = [
+    GpsRedisKeys.KEY_LATITUDE,
+    GpsRedisKeys.KEY_LONGITUDE,
+    GpsRedisKeys.KEY_SPEED_KMH,
+    ObdRedisKeys.KEY_ENGINE_RPM,
+    ObdRedisKeys.KEY_INTAKE_MAP
+]
+
+
+class TripRecorder(object):
+    """
+    Writes the samples of the currently recorded trip (see PersistentGpsRedisKeys.KEY_TRIP_A_RECORDING)
+    to a trip log. Every recording gets its own file.
+    """
+
+    def __init__(self, directory, chunk_size, max_chunk_age):
+        """
+        :param str directory: Directory the trip logs are stored in
+        :param int chunk_size: Max. number of rows kept in memory
+        :param int|float max_chunk_age: Max. time in seconds a row is kept in memory
+        """
+        self._directory = directory
+        self._chunk_size = chunk_size
+        self._max_chunk_age = max_chunk_age
+        self._trip_id = None
+        self._writer = None  # type: TripLogWriter
+
+    def set_trip(self, trip_id):
+        """
+        Starts a new recording if the trip has changed, stops recording if the trip is None
+        :param str|None trip_id:
+        """
+        if trip_id == self._trip_id:
+            return
+
+        self.close()
+        self._trip_id = trip_id
+        if trip_id:
+            path = os.path.join(self._directory, get_trip_log_file_name(trip_id, datetime.utcnow()))
+            log("Recording trip {} to {} ...".format(trip_id, path))
+            self._writer = TripLogWriter(path, chunk_size=self._chunk_size, max_chunk_age=self._max_chunk_age)
+
+    def record(self, data, now):
+        """
+        :param dict of (str, object) data: Decoded values of RECORDED_KEYS
+        :param float now: Current time in seconds
+        """
+        if self._writer:
+            self._writer.append([now] + [data.get(key) for key in RECORDED_KEYS], now)
+
+    def flush_if_due(self, now):
+        """
+        Writes the buffered samples to disk once they have reached the max. age,
+        even if no new samples are recorded (e.g. while parked)
+        :param float now: Current time in seconds
+        """
+        if self._writer:
+            self._writer.flush_if_due(now)
+
+    def close(self):
+        if self._writer:
+            self._writer.close()
+            log("Stopped recording trip {} ({} samples recorded)".format(self._trip_id,
+                                                                          self._writer.get_rows_written()))
+            self._writer = None
+
+
+if __name__ == "__main__":
+    EXIT_CODE = EXIT_CODES['OK']
+
+    CONFIG = init_config_env('CARPI_RECORDER_CONF', ['recorder-daemon.conf', '/etc/carpi/recorder-daemon.conf'])
+    boot_print(APP_NAME)
+
+    CONFIG_PATH = CONFIG.get('TripRecorder', 'path')
+    CONFIG_INTERVAL = CONFIG.getfloat('TripRecorder', 'interval') / 1000
+    CONFIG_TRIP_CHECK_INTERVAL = CONFIG.getfloat('TripRecorder', 'trip_check_interval') / 1000
+    CONFIG_CHUNK_SIZE = CONFIG.getint('TripRecorder', 'chunk_size')
+    CONFIG_MAX_CHUNK_AGE = CONFIG.getfloat('TripRecorder', 'max_chunk_age') / 1000
+
+    if not os.path.isdir(CONFIG_PATH):
+        log("Creating trip log directory {} ...".format(CONFIG_PATH))
+        os.makedirs(CONFIG_PATH)
+
+    log("Initialize Redis Connection ...")
+    R = get_redis(CONFIG)
+    RP = get_persistent_redis(CONFIG)
+
+    FETCHER = create_background_fetcher(R, RECORDED_KEYS, CONFIG_INTERVAL, decode_values=True)
+    RECORDER = TripRecorder(CONFIG_PATH, CONFIG_CHUNK_SIZE, CONFIG_MAX_CHUNK_AGE)
+
+    try:
+        log("Trip Recorder Daemon is running ...")
+        FETCHER.start()
+        last_version = None
+        next_trip_check = 0
+        while True:
+            now = time()
+            if now >= next_trip_check:
+                RECORDER.set_trip(get_piped(RP, [PersistentGpsRedisKeys.KEY_TRIP_A_RECORDING])
+                                  .get(PersistentGpsRedisKeys.KEY_TRIP_A_RECORDING))
+                next_trip_check = now + CONFIG_TRIP_CHECK_INTERVAL
+
+            # Only record a sample if any value has changed since the last one
+            snapshot = FETCHER.get_snapshot()
+            if snapshot.version != last_version:
+                RECORDER.record(snapshot.data, now)
+                last_version = snapshot.version
+            else:
+                RECORDER.flush_if_due(now)
+
+            sleep(CONFIG_INTERVAL)
+    except (KeyboardInterrupt, SystemExit):
+        log("Shutdown requested!")
+    except redis_exceptions.ConnectionError:
+        EXIT_CODE = EXIT_CODES['DataSourceLost']
+        log("Connection to Redis Server lost! Daemon is quitting and waiting for relaunch")
+    except:
+        EXIT_CODE = EXIT_CODES['UnhandledException']
+        print_unhandled_exception(APP_NAME)
+    finally:
+        RECORDER.close()
+        if not FETCHER.stop_safe() and EXIT_CODE == EXIT_CODES['OK']:
+            EXIT_CODE = EXIT_CODES['BackgroundThreadTimedOut']
+
+    end_print()
+    exit(EXIT_CODE)
@@ -23,6 +23,7 @@ OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
 SOFTWARE.
 """
 import threading
+from datetime import datetime
 from math import floor
 from os import system
 from threading import Thread
@@ -30,7 +31,7 @@ from threading import Thread
 from CarPiLogging import log
 from CarPiStyles import PATH_FONT_VCR, PATH_FONT_DEFAULT
 from RedisKeys import NetworkInfoRedisKeys, PersistentGpsRedisKeys
-from RedisUtils import RedisBackgroundFetcher, set_piped, save_synced_value, get_piped
+from RedisUtils import set_piped, save_synced_value, get_piped, create_background_fetcher
 from pqGUI import Window, Text, Button, TEXT_FONT, DEFAULT_STYLE, DECO_NONE, BG_COLOR
 
 
@@ -126,11 +127,11 @@ class GpsTripSettingsWindow(CarPiBaseSettingsWindow):
         self._temp_redis = temp_redis
         self._persist_redis = persist_redis
 
-        self._fetcher = RedisBackgroundFetcher(persist_redis, [
+        self._fetcher = create_background_fetcher(persist_redis, [
             PersistentGpsRedisKeys.KEY_TRIP_A,
             PersistentGpsRedisKeys.KEY_TRIP_B,
             PersistentGpsRedisKeys.KEY_ODO
-        ], fetch_interval=1)
+        ], fetch_interval=1, decode_values=True)
 
         self._trip_a_text = None  # type: Text
         self._trip_b_text = None  # type: Text
@@ -173,12 +174,16 @@ class GpsTripSettingsWindow(CarPiBaseSettingsWindow):
     def update(self):
         new_data = self._fetcher.get_current_data()
 
-        self._set_distance(self._trip_a_text, float(new_data.get(PersistentGpsRedisKeys.KEY_TRIP_A, '0')))
-        self._set_distance(self._trip_b_text, float(new_data.get(PersistentGpsRedisKeys.KEY_TRIP_B, '0')))
-        self._set_distance(self._odo_text, float(new_data.get(PersistentGpsRedisKeys.KEY_ODO, '0')))
+        self._set_distance(self._trip_a_text, new_data.get(PersistentGpsRedisKeys.KEY_TRIP_A))
+        self._set_distance(self._trip_b_text, new_data.get(PersistentGpsRedisKeys.KEY_TRIP_B))
+        self._set_distance(self._odo_text, new_data.get(PersistentGpsRedisKeys.KEY_ODO))
 
     def _set_distance(self, label, value):
-        label.settext('{:>9.2f} km'.format(value / 1000))
+        """
+        :param Text label:
+        :param float|None value: Distance in meters
+        """
+        label.settext('{:>9.2f} km'.format((value or 0) / 1000))
 
     def destroy(self):
         self._fetcher.stop_safe()
@@ -194,7 +199,9 @@ class GpsTripSettingsWindow(CarPiBaseSettingsWindow):
         OdoCorrectionWindow(self, self._persist_redis).show()
 
     def _new_trip_callback(self, e):
-        save_synced_value(self._temp_redis, self._persist_redis, PersistentGpsRedisKeys.KEY_TRIP_A_RECORDING, '999999')
+        # Every recording needs its own ID, the Trip Recorder starts a new trip log when it changes
+        trip_id = datetime.utcnow().strftime('%Y%m%d%H%M%S')
+        save_synced_value(self._temp_redis, self._persist_redis, PersistentGpsRedisKeys.KEY_TRIP_A_RECORDING, trip_id)
         self._reset_trip_a_callback(e)
 
     def _stop_recording_callback(self, e):
@@ -204,7 +211,7 @@ class GpsTripSettingsWindow(CarPiBaseSettingsWindow):
 class NetworkSettingsWindow(CarPiBaseSettingsWindow):
     def __init__(self, parent, redis):
         self._redis = redis
-        self._fetcher = RedisBackgroundFetcher(redis, [
+        self._fetcher = create_background_fetcher(redis, [
             NetworkInfoRedisKeys.KEY_ETH0_IP,
             NetworkInfoRedisKeys.KEY_WLAN0_STRENGTH,
             NetworkInfoRedisKeys.KEY_WLAN0_SSID,
@@ -23,19 +23,19 @@ OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
 SOFTWARE.
 """
 from math import isnan, floor
-from redis import Redis
-from time import strftime
+from redis import Redis, exceptions as redis_exceptions
+from time import strftime, time
 
 from CarPiLogging import log
 from CarPiSettingsWindows import MainSettingsWindow
 from CarPiUtils import get_mpd_status_time
 from CarPiStyles import PATH_FONT_7SEGM, PATH_FONT_VCR, PATH_FONT_NORA_MEDIUM, PATH_FONT_DEFAULT
 from RedisKeys import GpsRedisKeys, NetworkInfoRedisKeys, MpdDataRedisKeys, MpdCommandRedisKeys, PersistentGpsRedisKeys, \
-    ObdRedisKeys
+    ObdRedisKeys, FusionRedisKeys
 from pqGUI import pqApp, Text, Graph, Image, TEXT_FONT, TEXT_COLOR, Button, TRANS, BG_COLOR, TEXT_DISABLED, Widget, \
     ProgressBar
 from PygameUtils import load_image
-from RedisUtils import RedisBackgroundFetcher, send_command_request
+from RedisUtils import RedisBackgroundFetcher, send_command_request, create_background_fetcher, get_histories_piped
 from os import path
 
 STYLE_TAB_BUTTON = {
@@ -61,6 +61,13 @@ IMG_OBD_OFF = path.join('res', 'img', 'car-off.png')
 IMG_OBD_ON = path.join('res', 'img', 'car-ok.png')
 IMG_OBD_ERROR = path.join('res', 'img', 'car-error.png')
 
+# The fetchers poll every 100ms while values change and slow down to these intervals (in seconds) while they don't
+MAX_FETCH_INTERVAL = 1
+MAX_PERSISTENT_FETCH_INTERVAL = 2
+
+# Time between two data points of the graph (matches the interval of the recorded history)
+GRAPH_DATA_GAP_MS = 500
+
 
 class CarPiUIApp(pqApp):
     PAGE_GPS = 'GPS'
@@ -85,6 +92,9 @@ class CarPiUIApp(pqApp):
         self._redis_pages = {}
         self._predis_pages = {}
         self._current_page = None  # type: str
+        self._data_version = -1  # type: int
+        self._pers_data_version = -1  # type: int
+        self._graph_data_point = None  # type: float
         self._fetcher = None  # type: RedisBackgroundFetcher
         self._predis_fetcher = None  # type: RedisBackgroundFetcher
         self._redis = redis  # type: Redis
@@ -180,6 +190,7 @@ class CarPiUIApp(pqApp):
 
             GpsRedisKeys.KEY_SPEED,
             GpsRedisKeys.KEY_SPEED_KMH,
+            FusionRedisKeys.KEY_SPEED_KMH,
             MpdDataRedisKeys.KEY_STATE,
 
             # OBD & Fuel Consumption
@@ -208,6 +219,7 @@ class CarPiUIApp(pqApp):
 
             GpsRedisKeys.KEY_SPEED,
             GpsRedisKeys.KEY_SPEED_KMH,
+            FusionRedisKeys.KEY_SPEED_KMH,
             MpdDataRedisKeys.KEY_STATE,
 
             # OBD & Fuel Consumption
@@ -238,6 +250,7 @@ class CarPiUIApp(pqApp):
             NetworkInfoRedisKeys.KEY_WLAN1_SSID,
 
             GpsRedisKeys.KEY_SPEED_KMH,
+            FusionRedisKeys.KEY_SPEED_KMH,
             MpdDataRedisKeys.KEY_STATE,
 
             # OBD & Fuel Consumption
@@ -254,6 +267,38 @@ class CarPiUIApp(pqApp):
         self._redis_pages[CarPiUIApp.PAGE_MUSIC] = music_r_page
         self._redis_pages[CarPiUIApp.PAGE_SETTINGS] = settings_r_page
 
+        # Parts of the UI and the keys they depend on,
+        # a part is only updated if one of its keys has changed
+        self._data_updaters = [
+            (self._update_status_and_speed, frozenset([
+                GpsRedisKeys.KEY_ALIVE,
+                GpsRedisKeys.KEY_SPEED,
+                GpsRedisKeys.KEY_SPEED_KMH,
+                FusionRedisKeys.KEY_SPEED_KMH,
+                GpsRedisKeys.KEY_EPX,
+                GpsRedisKeys.KEY_EPY,
+                ObdRedisKeys.KEY_ALIVE,
+                ObdRedisKeys.KEY_ENGINE_RPM,
+                ObdRedisKeys.KEY_INTAKE_TEMP,
+                ObdRedisKeys.KEY_INTAKE_MAP,
+                ObdRedisKeys.KEY_VEHICLE_SPEED
+            ])),
+            (self._set_networking_data, frozenset([  # Networking is kept alive all the time
+                NetworkInfoRedisKeys.KEY_ETH0_IP,
+                NetworkInfoRedisKeys.KEY_WLAN0_STRENGTH,
+                NetworkInfoRedisKeys.KEY_WLAN0_SSID
+            ])),
+            (self._set_music_player_info, frozenset([
+                MpdDataRedisKeys.KEY_ALIVE,
+                MpdDataRedisKeys.KEY_STATE,
+                MpdDataRedisKeys.KEY_SONG_TITLE,
+                MpdDataRedisKeys.KEY_SONG_ARTIST,
+                MpdDataRedisKeys.KEY_SONG_ALBUM,
+                MpdDataRedisKeys.KEY_CURRENT_TIME,
+                MpdDataRedisKeys.KEY_CURRENT_TIME_FORMATTED
+            ]))
+        ]  # type: list of (function, frozenset of str)
+
         # Define Persistent Redis Pages
         self._predis_pages[CarPiUIApp.PAGE_GPS] = PersistentGpsRedisKeys.KEYS
         self._predis_pages[CarPiUIApp.PAGE_MUSIC] = []
@@ -275,8 +320,12 @@ class CarPiUIApp(pqApp):
         self.load_image(IMG_OBD_ON)
         self.load_image(IMG_OBD_ERROR)
 
-        self._fetcher = RedisBackgroundFetcher(self._redis, [])
-        self._predis_fetcher = RedisBackgroundFetcher(self._pers_redis, [])
+        self._fetcher = create_background_fetcher(self._redis, [],
+                                                  max_fetch_interval=MAX_FETCH_INTERVAL,
+                                                  decode_values=True)
+        self._predis_fetcher = RedisBackgroundFetcher(self._pers_redis, [],
+                                                      max_fetch_interval=MAX_PERSISTENT_FETCH_INTERVAL,
+                                                      decode_values=True)
 
     def load_image(self, image_path):
         if image_path not in self.image_store:
@@ -307,7 +356,7 @@ class CarPiUIApp(pqApp):
                                 }).pack()
         self._speed_graph = Graph(self,
                                   ((5, 130), (200, 52)),
-                                  data_gap_ms=500,
+                                  data_gap_ms=GRAPH_DATA_GAP_MS,
                                   style={
                                       TEXT_COLOR: (150, 150, 150)
                                   }).pack()
@@ -440,6 +489,7 @@ class CarPiUIApp(pqApp):
         Runs at startup
         """
         self.show_page(CarPiUIApp.PAGE_GPS)
+        self._backfill_graph()
         self._fetcher.start()
         self._predis_fetcher.start()
         # self._settings_tab_button_command(None)
@@ -449,16 +499,66 @@ class CarPiUIApp(pqApp):
         Runs every frame
         """
         self._time_label.settext(strftime('%H:%M'))  # Time is the most important thing!
+        self._update_fetcher_state()
+
+        snapshot = self._fetcher.get_snapshot()
+        if snapshot.version != self._data_version:
+            changed_keys = snapshot.changed_since(self._data_version)
+            for updater, keys in self._data_updaters:
+                if self._data_version < 0 or not changed_keys.isdisjoint(keys):
+                    updater(snapshot.data)
+            self._data_version = snapshot.version
+
+        # The graph moves on every frame, even if the data has not changed
+        if self._graph_data_point is not None:
+            self._speed_graph.add_data_point(self._graph_data_point)
+
+        pers_snapshot = self._predis_fetcher.get_snapshot()
+        if pers_snapshot.version != self._pers_data_version:
+            self._set_trip_odo(pers_snapshot.data)
+            self._pers_data_version = pers_snapshot.version
+
+    def _backfill_graph(self):
+        """
+        Fills the graph with the fuel consumption recorded by the OBD Daemon
+        """
+        history_length = self._speed_graph.get_max_data_points() * GRAPH_DATA_GAP_MS / 1000.0
+        try:
+            histories = get_histories_piped(self._redis,
+                                            [ObdRedisKeys.KEY_INTAKE_TEMP,
+                                             ObdRedisKeys.KEY_ENGINE_RPM,
+                                             ObdRedisKeys.KEY_INTAKE_MAP],
+                                            start=time() - history_length)
+        except (redis_exceptions.ConnectionError, redis_exceptions.TimeoutError):
+            # The background fetchers keep retrying until Redis is available
+            log("Redis is not available, the graph starts empty")
+            return
 
-        new_data = self._fetcher.get_current_data()
-        new_pers_data = self._predis_fetcher.get_current_data()
-
-        self._update_status(new_data)
-        self._set_speed_metrical(new_data)  # We keep the speed updated at all times so the graph does not lag behind
-        self._set_networking_data(new_data)  # Networking is kept alive all the time
-        self._set_music_player_info(new_data)
-
-        self._set_trip_odo(new_pers_data)
+        # All values of one sample have been recorded at the same time
+        samples = {}
+        for key, history in histories.iteritems():
+            for timestamp, value in history:
+                samples.setdefault(timestamp, {})[key] = value
+
+        data_points = []
+        for timestamp in sorted(samples):
+            sample = samples[timestamp]
+            if len(sample) == len(histories) and None not in sample.values():
+                fuel_cons = CarPiUIApp._calc_fuel_consumption(sample[ObdRedisKeys.KEY_INTAKE_TEMP],
+                                                              sample[ObdRedisKeys.KEY_ENGINE_RPM],
+                                                              sample[ObdRedisKeys.KEY_INTAKE_MAP])
+                data_points.append(fuel_cons[0])
+
+        if data_points:
+            log("Restoring {} data points of the graph ...".format(len(data_points)))
+            self._speed_graph.backfill_data(data_points)
+
+    def _update_status_and_speed(self, data):
+        """
+        :param dict of str, str data:
+        """
+        self._update_status(data)
+        self._set_speed_metrical(data)  # We keep the speed updated at all times so the graph does not lag behind
 
     def shutdown(self):
         try:
@@ -475,6 +575,15 @@ class CarPiUIApp(pqApp):
         finally:
             return
 
+    def _update_fetcher_state(self):
+        # Settings windows cover the trip data, so there is no need to fetch it while one is open
+        # (the status bar and the speed graph are kept updated all the time)
+        covered = len(self.windows) > 0
+        if covered and not self._predis_fetcher.is_paused():
+            self._predis_fetcher.pause()
+        elif not covered and self._predis_fetcher.is_paused():
+            self._predis_fetcher.resume()
+
     def show_page(self, page_name):
         for name, page in self._pages.iteritems():
             for control in page:  # type: Widget
@@ -526,78 +635,55 @@ class CarPiUIApp(pqApp):
 
     def _update_status(self, data):
         """
-        :param dict of str, str data:
+        :param dict of str, object data: Decoded data
         """
         if GpsRedisKeys.KEY_ALIVE in data:
-            if GpsRedisKeys.KEY_SPEED in data and data[GpsRedisKeys.KEY_SPEED]:
+            if data.get(GpsRedisKeys.KEY_SPEED) is not None:
                 self._set_gps_status(IMG_GPS_ON)
             else:
                 self._set_gps_status(IMG_GPS_ERROR)
         else:
             self._set_gps_status(IMG_GPS_OFF)
 
-        if ObdRedisKeys.KEY_ALIVE in data:
-            alive_state = data[ObdRedisKeys.KEY_ALIVE]
-            if alive_state and alive_state == '1':
-                self._set_obd_status(IMG_OBD_ON)
-            elif alive_state and alive_state == '0':
-                self._set_obd_status(IMG_OBD_ERROR)
-            else:
-                self._set_obd_status(IMG_OBD_OFF)
+        alive_state = data.get(ObdRedisKeys.KEY_ALIVE)
+        if alive_state == 1:
+            self._set_obd_status(IMG_OBD_ON)
+        elif alive_state == 0:
+            self._set_obd_status(IMG_OBD_ERROR)
         else:
             self._set_obd_status(IMG_OBD_OFF)
 
     def _set_speed_metrical(self, data):
         """
-        :param dict of str, str data:
+        :param dict of str, object data: Decoded data
         """
-        speed_str = ''
-        if GpsRedisKeys.KEY_SPEED in data and GpsRedisKeys.KEY_SPEED_KMH in data \
-                and data[GpsRedisKeys.KEY_SPEED_KMH]:
-            speed_str = data[GpsRedisKeys.KEY_SPEED_KMH]
-        elif ObdRedisKeys.KEY_VEHICLE_SPEED in data and data[ObdRedisKeys.KEY_VEHICLE_SPEED]:
-            speed_str = data[ObdRedisKeys.KEY_VEHICLE_SPEED]
+        self._graph_data_point = None
+        if data.get(FusionRedisKeys.KEY_SPEED_KMH) is not None:
+            speed = data[FusionRedisKeys.KEY_SPEED_KMH]
+        elif data.get(GpsRedisKeys.KEY_SPEED) is not None and data.get(GpsRedisKeys.KEY_SPEED_KMH) is not None:
+            speed = data[GpsRedisKeys.KEY_SPEED_KMH]
+        elif data.get(ObdRedisKeys.KEY_VEHICLE_SPEED) is not None:
+            speed = data[ObdRedisKeys.KEY_VEHICLE_SPEED]
         else:
-            speed_str = '-1'
-
-        speed = -1
-        try:
-            speed = float(speed_str)
-        except TypeError:
             speed = -1
         self._set_speed(speed)
 
-        if ObdRedisKeys.KEY_ALIVE in data \
-                and data[ObdRedisKeys.KEY_ALIVE] == '1' \
-                and (ObdRedisKeys.KEY_ENGINE_RPM in data and data[ObdRedisKeys.KEY_ENGINE_RPM]) \
-                and (ObdRedisKeys.KEY_INTAKE_MAP in data and data[ObdRedisKeys.KEY_INTAKE_MAP]) \
-                and (ObdRedisKeys.KEY_INTAKE_TEMP in data and data[ObdRedisKeys.KEY_INTAKE_TEMP]):
-            try:
-                fuel_cons = CarPiUIApp._calc_fuel_consumption(
-                    float(data[ObdRedisKeys.KEY_INTAKE_TEMP]),
-                    float(data[ObdRedisKeys.KEY_ENGINE_RPM]),
-                    float(data[ObdRedisKeys.KEY_INTAKE_MAP]),
-                    speed
-                )
-                if fuel_cons[0] and isnan(fuel_cons[0]):
-                    self._set_fuel_consumption(None)
-                elif not speed or speed < 20:
-                    self._set_fuel_consumption(fuel_cons[0])
-                else:
-                    self._set_fuel_consumption(fuel_cons[1], True)
-
-                if fuel_cons[0]:
-                    self._speed_graph.add_data_point(fuel_cons[0])
-            except TypeError:
-                self._set_obd_status(IMG_OBD_ERROR)
+        intake_temp = data.get(ObdRedisKeys.KEY_INTAKE_TEMP)
+        rpm = data.get(ObdRedisKeys.KEY_ENGINE_RPM)
+        intake_map = data.get(ObdRedisKeys.KEY_INTAKE_MAP)
+        if data.get(ObdRedisKeys.KEY_ALIVE) == 1 \
+                and rpm is not None and intake_map is not None and intake_temp is not None:
+            fuel_cons = CarPiUIApp._calc_fuel_consumption(intake_temp, rpm, intake_map, speed)
+            if fuel_cons[0] and isnan(fuel_cons[0]):
                 self._set_fuel_consumption(None)
-                self._speed_graph.add_data_point(0)
-        elif GpsRedisKeys.KEY_EPX in data and GpsRedisKeys.KEY_EPY in data\
-                and data[GpsRedisKeys.KEY_EPX] and data[GpsRedisKeys.KEY_EPY]:
-            self._set_accuracy(
-                float(data.get(GpsRedisKeys.KEY_EPX, '0')),
-                float(data.get(GpsRedisKeys.KEY_EPY, '0'))
-            )
+            elif not speed or speed < 20:
+                self._set_fuel_consumption(fuel_cons[0])
+            else:
+                self._set_fuel_consumption(fuel_cons[1], True)
+
+            self._graph_data_point = fuel_cons[0] if fuel_cons[0] else None
+        elif data.get(GpsRedisKeys.KEY_EPX) and data.get(GpsRedisKeys.KEY_EPY):
+            self._set_accuracy(data[GpsRedisKeys.KEY_EPX], data[GpsRedisKeys.KEY_EPY])
         else:
             self._set_accuracy(None, None)
 
@@ -628,7 +714,7 @@ class CarPiUIApp(pqApp):
 
     def _set_networking_data(self, data):
         """
-        :param dict of str, str data:
+        :param dict of str, object data: Decoded data
         """
         if NetworkInfoRedisKeys.KEY_ETH0_IP in data:
             eth_ip = data[NetworkInfoRedisKeys.KEY_ETH0_IP]
@@ -638,12 +724,8 @@ class CarPiUIApp(pqApp):
 
         if NetworkInfoRedisKeys.KEY_WLAN0_STRENGTH in data \
                 and NetworkInfoRedisKeys.KEY_WLAN0_SSID in data:
-            strength_str = data[NetworkInfoRedisKeys.KEY_WLAN0_STRENGTH]
             ssid = data[NetworkInfoRedisKeys.KEY_WLAN0_SSID]
-
-            strength = -2
-            if ssid is not None:
-                strength = int(strength_str) if strength_str else 0
+            strength = data[NetworkInfoRedisKeys.KEY_WLAN0_STRENGTH] if ssid is not None else -2
 
             self._set_wlan_data(self._wlan0_status_icon, strength)
         else:
@@ -675,12 +757,12 @@ class CarPiUIApp(pqApp):
 
     def _set_music_player_info(self, data):
         """
-        :param dict data:
+        :param dict data: Decoded data
         """
         if data.get(MpdDataRedisKeys.KEY_ALIVE, None):
-            self._set_current_song_tags(unicode(data.get(MpdDataRedisKeys.KEY_SONG_TITLE, ''), 'utf-8'),
-                                        unicode(data.get(MpdDataRedisKeys.KEY_SONG_ARTIST, ''), 'utf-8'),
-                                        unicode(data.get(MpdDataRedisKeys.KEY_SONG_ALBUM, ''), 'utf-8'))
+            self._set_current_song_tags(data.get(MpdDataRedisKeys.KEY_SONG_TITLE, u''),
+                                        data.get(MpdDataRedisKeys.KEY_SONG_ARTIST, u''),
+                                        data.get(MpdDataRedisKeys.KEY_SONG_ALBUM, u''))
             self._set_current_song_time(data.get(MpdDataRedisKeys.KEY_CURRENT_TIME, '0:0'),
                                         data.get(MpdDataRedisKeys.KEY_CURRENT_TIME_FORMATTED, '--:--/--:--'))
         else:
@@ -713,19 +795,13 @@ class CarPiUIApp(pqApp):
 
     def _set_trip_odo(self, data):
         """
-        :param dict data:
+        :param dict data: Decoded data
         """
-        trip_a_str = data.get(PersistentGpsRedisKeys.KEY_TRIP_A, -1)
-        try:
-            self._set_trip(float(trip_a_str))
-        except TypeError:
-            self._set_trip(float(-1))
+        trip_a = data.get(PersistentGpsRedisKeys.KEY_TRIP_A)
+        self._set_trip(trip_a if trip_a is not None else -1)
 
-        odo_str = data.get(PersistentGpsRedisKeys.KEY_ODO, -1)
-        try:
-            self._set_odo(float(odo_str))
-        except TypeError:
-            self._set_odo(float(-1))
+        odo = data.get(PersistentGpsRedisKeys.KEY_ODO)
+        self._set_odo(odo if odo is not None else -1)
 
     def _set_trip(self, value):
         if isnan(value) or value < 0:
@@ -27,9 +27,8 @@ from pqGUI import *
 from PygameUtils import load_image, init_pygame
 from CarPiLogging import log, boot_print, end_print, print_unhandled_exception, EXIT_CODES
 from CarPiConfig import init_config_env
-from RedisUtils import get_redis, RedisBackgroundFetcher
+from RedisUtils import get_redis, RedisBackgroundFetcher, create_background_fetcher
 from RedisKeys import GpsRedisKeys, NetworkInfoRedisKeys
-from math import isnan
 from redis import exceptions as redis_exceptions
 from datetime import datetime
 import os
@@ -241,20 +240,20 @@ class GpsApp(pqApp):
         else:
             self._ethernetStatusIcon.image = IMAGES[IMAGE_ETHERNET_OFF]
 
-        wlan0_state = current_data.get(NetworkInfoRedisKeys.KEY_WLAN0_STRENGTH, '0')
-        wlan1_state = current_data.get(NetworkInfoRedisKeys.KEY_WLAN1_STRENGTH, '0')
+        wlan0_state = current_data.get(NetworkInfoRedisKeys.KEY_WLAN0_STRENGTH, 0)
+        wlan1_state = current_data.get(NetworkInfoRedisKeys.KEY_WLAN1_STRENGTH, 0)
 
         if wlan0_state:
             self._set_wifi(self._wifi0StatusIcon,
                            self._check_key(current_data, NetworkInfoRedisKeys.KEY_WLAN0_IP),
-                           int(wlan0_state))
+                           wlan0_state)
         else:
             self._set_wifi(self._wifi0StatusIcon, False, 0)
 
         if wlan1_state:
             self._set_wifi(self._wifi1StatusIcon,
                            self._check_key(current_data, NetworkInfoRedisKeys.KEY_WLAN1_IP),
-                           int(wlan1_state))
+                           wlan1_state)
         else:
             self._set_wifi(self._wifi1StatusIcon, False, 0)
 
@@ -263,73 +262,61 @@ class GpsApp(pqApp):
         return key in data and data[key] is not None
 
     def _set_speed(self, val, imperial=False):
-        try:
-            f_val = float(val)
-            if isnan(f_val) or (val == -1):
-                self._speedLabel.settext('  0')
-                self._speedGraph.add_data_point(0)
-            else:
-                self._speedLabel.settext('{:>3.0f}'.format(f_val))
-                self._speedGraph.add_data_point(f_val)
-        except (ValueError, TypeError):
-            log('Speed given could not be converted to float: {}'.format(val))
+        """
+        :param float val: Decoded speed, -1 if unknown
+        :param bool imperial:
+        """
+        if val == -1:
             self._speedLabel.settext('  0')
             self._speedGraph.add_data_point(0)
+        else:
+            self._speedLabel.settext('{:>3.0f}'.format(val))
+            self._speedGraph.add_data_point(val)
 
         # self._speedGraph.add_data_point(datetime.now().second)
         self._speedUnitLabel.settext(' mph' if imperial else 'km/h')
 
     def _set_latitude(self, val):
-        try:
-            f_val = float(val)
-            if isnan(f_val) or (f_val == -360):
-                self._latitudeLabel.settext('---.--------- -')
-            else:
-                self._latitudeLabel.settext('{:>13.9f} {}'.format(abs(f_val), 'S' if val < 0 else 'N'))
-        except (ValueError, TypeError):
-            log('Latitude given could not be converted to float: {}'.format(val))
+        """
+        :param float val: Decoded latitude, -360 if unknown
+        """
+        if val == -360:
             self._latitudeLabel.settext('---.--------- -')
+        else:
+            self._latitudeLabel.settext('{:>13.9f} {}'.format(abs(val), 'S' if val < 0 else 'N'))
 
     def _set_longitude(self, val):
-        try:
-            f_val = float(val)
-            if isnan(f_val) or (f_val == -360):
-                self._longitudeLabel.settext('---.--------- -')
-            else:
-                self._longitudeLabel.settext('{:>13.9f} {}'.format(abs(f_val), 'W' if val < 0 else 'E'))
-        except (ValueError, TypeError):
-            log('Longitude given could not be converted to float: {}'.format(val))
+        """
+        :param float val: Decoded longitude, -360 if unknown
+        """
+        if val == -360:
             self._longitudeLabel.settext('---.--------- -')
+        else:
+            self._longitudeLabel.settext('{:>13.9f} {}'.format(abs(val), 'W' if val < 0 else 'E'))
 
     def _set_accuracy(self, val_x, val_y, mode):
-        try:
-            f_val_x = float(val_x)
-            f_val_y = float(val_y)
-            i_val_m = int(float(mode))
-
-            if f_val_x < 0 or f_val_y < 0:
-                # No Data
-                self._gpsStatusIcon.image = IMAGES[IMAGE_GPSSAT_OFF]
-                self._accuracyLabel.settext('---')
-            else:
-                if i_val_m <= 1 or i_val_m > 3:
-                    # No Fix / Invalid Data
-                    self._gpsStatusIcon.image = IMAGES[IMAGE_GPSSAT_ERROR]
-                    self._accuracyLabel.settext('FIX')
-                else:
-                    fix_accuracy = (f_val_x + f_val_y) / 2
-                    if i_val_m == 2:
-                        # 2D FIX
-                        self._gpsStatusIcon.image = IMAGES[IMAGE_GPSSAT_WARN]
-                    elif i_val_m == 3:
-                        # 3D Fix
-                        self._gpsStatusIcon.image = IMAGES[IMAGE_GPSSAT_OK]
-                    self._accuracyLabel.settext('{:>3.0f}'.format(min(fix_accuracy, 999)))
-
-        except (ValueError, TypeError):
-            log('Failed to parse EPX, EPY or MODE: {} / {} / {}'.format(val_x, val_y, mode))
+        """
+        :param float val_x: Decoded EPX, -1 if unknown
+        :param float val_y: Decoded EPY, -1 if unknown
+        :param int mode: Decoded fix mode
+        """
+        if val_x < 0 or val_y < 0:
+            # No Data
             self._gpsStatusIcon.image = IMAGES[IMAGE_GPSSAT_OFF]
-            self._accuracyLabel.settext('ERR')
+            self._accuracyLabel.settext('---')
+        elif mode <= 1 or mode > 3:
+            # No Fix / Invalid Data
+            self._gpsStatusIcon.image = IMAGES[IMAGE_GPSSAT_ERROR]
+            self._accuracyLabel.settext('FIX')
+        else:
+            fix_accuracy = (val_x + val_y) / 2
+            if mode == 2:
+                # 2D FIX
+                self._gpsStatusIcon.image = IMAGES[IMAGE_GPSSAT_WARN]
+            elif mode == 3:
+                # 3D Fix
+                self._gpsStatusIcon.image = IMAGES[IMAGE_GPSSAT_OK]
+            self._accuracyLabel.settext('{:>3.0f}'.format(min(fix_accuracy, 999)))
 
     def _set_ethernet(self, connected):
         self._ethernetStatusIcon.image = IMAGES[IMAGE_ETHERNET if connected else IMAGE_ETHERNET_OFF]
@@ -375,7 +362,7 @@ if __name__ == '__main__':
     R = get_redis(CONFIG)
 
     log("Starting Background Data Fetcher ...")
-    R_FETCH = RedisBackgroundFetcher(R, RNAME_FETCH_KEYS)
+    R_FETCH = create_background_fetcher(R, RNAME_FETCH_KEYS, decode_values=True)
     R_FETCH.start()
 
     init_pygame()
@@ -1092,6 +1092,14 @@ class Graph(Widget):
         for i in range(0, self.get_max_data_points()):
             self._data.append(default_value)
 
+    def backfill_data(self, values):
+        """
+        Adds previously recorded values as if they had been added one after another
+        :param list of float values: Values, oldest first
+        """
+        self._data.extend([0 if isnan(val) else val for val in values])
+        self._data = self._data[-self.get_max_data_points():]
+
     @staticmethod
     def round_up_to_10(v):
         return int(ceil(v / 10.0)) * 10
@@ -54,6 +54,7 @@ SCRIPT_LOCATION="$( cd "$( dirname "${BASH_SOURCE[0]}" )" && pwd )"
 INSTALL_SOURCE="$SCRIPT_LOCATION/../../"
 INSTALL_DESTINATION="/usr/bin/carpi/"
 CONFIG_DESTINATION="/etc/carpi/"
+TRIP_LOG_DIRECTORY="/var/lib/carpi/trips/"
 
 DIR_COMMONS="$INSTALL_SOURCE/CarPiCommons"
 DIR_DAEMONS="$INSTALL_SOURCE/CarPiDaemons"
@@ -63,26 +64,40 @@ RES_FILES=(
     "$DIR_COMMONS/CarPiLogging.py"
     "$DIR_COMMONS/CarPiThreading.py"
     "$DIR_COMMONS/CarPiUtils.py"
+    "$DIR_COMMONS/GeoDistance.py"
     "$DIR_COMMONS/RedisKeys.py"
     "$DIR_COMMONS/RedisUtils.py"
+    "$DIR_COMMONS/TripLog.py"
 )
 DAEMON_FILES=(
     "$DIR_DAEMONS/GpsDaemon.py"
+    "$DIR_DAEMONS/GpsdClient.py"
+    "$DIR_DAEMONS/ReverseGeocoder.py"
     "$DIR_DAEMONS/Obd2Daemon.py"
     "$DIR_DAEMONS/Obd2DataParser.py"
     "$DIR_DAEMONS/MpdDataAndControlDaemon.py"
     "$DIR_DAEMONS/NetworkInfoDaemon.py"
+    "$DIR_DAEMONS/TripRecorderDaemon.py"
+    "$DIR_DAEMONS/SpeedFusionDaemon.py"
 )
 CONFIG_FILES=(
     "$DIR_DAEMONS/gps-daemon.conf"
     "$DIR_DAEMONS/obd-daemon.conf"
     "$DIR_DAEMONS/mpd-daemon.conf"
     "$DIR_DAEMONS/net-daemon.conf"
+    "$DIR_DAEMONS/recorder-daemon.conf"
+    "$DIR_DAEMONS/fusion-daemon.conf"
 )
 
+PLACES_SOURCE="https://raw.githubusercontent.com/thampiman/reverse-geocoder/master/reverse_geocoder/rg_cities1000.csv"
+PLACES_TABLE="$CONFIG_DESTINATION/places.bin"
+
+REDIS_CONFIG="/etc/redis/redis.conf"
+REDIS_SOCKET="/var/run/redis/redis-server.sock"
+
 # ## Step 1: Install Dependencies
 setStatus "Step 1: Installing dependencies..." 0
-pip install geopy >> "/var/log/carpi/install.daemons.log"
+apt-get install -y python-numpy >> "/var/log/carpi/install.daemons.log"
 
 # ## Step 2: Installing Resources
 setStatus "Step 2: Installing resources..." 0
@@ -101,7 +116,7 @@ done
 # ## Step 5: Registering daemons
 # Step 5.1: GPS
 if [ ! -f "/etc/systemd/system/carpi-gps-daemon.service" ]; then
-    setStatus "Step 5: Registering daemons in OS...\n1/4: GPS Daemon" 0
+    setStatus "Step 5: Registering daemons in OS...\n1/6: GPS Daemon" 0
     cat << EOF > /etc/systemd/system/carpi-gps-daemon.service
 [Unit]
 Description=CarPi GPS Daemon
@@ -120,7 +135,7 @@ fi
 
 # Step 5.2: OBD
 if [ ! -f "/etc/systemd/system/carpi-obd-daemon.service" ]; then
-    setStatus "Step 5: Registering daemons in OS...\n2/4: OBD Daemon" 25
+    setStatus "Step 5: Registering daemons in OS...\n2/6: OBD Daemon" 20
     cat << EOF > /etc/systemd/system/carpi-obd-daemon.service
 [Unit]
 Description=CarPi OBD2 Daemon
@@ -139,7 +154,7 @@ fi
 
 # Step 5.3: MPD
 if [ ! -f "/etc/systemd/system/carpi-mpd-daemon.service" ]; then
-    setStatus "Step 5: Registering daemons in OS...\n3/4: MPD Daemon" 50
+    setStatus "Step 5: Registering daemons in OS...\n3/6: MPD Daemon" 40
     cat << EOF > /etc/systemd/system/carpi-mpd-daemon.service
 [Unit]
 Description=CarPi MPD Data & Control Daemon
@@ -158,7 +173,7 @@ fi
 
 # Step 5.4: MPD
 if [ ! -f "/etc/systemd/system/carpi-net-daemon.service" ]; then
-    setStatus "Step 5: Registering daemons in OS...\n4/4: Networking Daemon" 75
+    setStatus "Step 5: Registering daemons in OS...\n4/6: Networking Daemon" 60
     cat << EOF > /etc/systemd/system/carpi-net-daemon.service
 [Unit]
 Description=CarPi Network Info Daemon
@@ -175,6 +190,47 @@ EOF
     systemctl disable carpi-gps-daemon
 fi
 
+# Step 5.5: Trip Recorder
+if [ ! -f "/etc/systemd/system/carpi-recorder-daemon.service" ]; then
+    setStatus "Step 5: Registering daemons in OS...\n5/6: Trip Recorder Daemon" 80
+    cat << EOF > /etc/systemd/system/carpi-recorder-daemon.service
+[Unit]
+Description=CarPi Trip Recorder Daemon
+
+[Service]
+Type=simple
+ExecStart=$INSTALL_DESTINATION/TripRecorderDaemon.py
+
+[Install]
+WantedBy=multi-user.target
+
+EOF
+    systemctl daemon-reload
+    systemctl disable carpi-recorder-daemon
+fi
+if [ ! -d "$TRIP_LOG_DIRECTORY" ]; then
+    mkdir -p "$TRIP_LOG_DIRECTORY"
+fi
+
+# Step 5.6: Speed Fusion
+if [ ! -f "/etc/systemd/system/carpi-fusion-daemon.service" ]; then
+    setStatus "Step 5: Registering daemons in OS...\n6/6: Speed Fusion Daemon" 90
+    cat << EOF > /etc/systemd/system/carpi-fusion-daemon.service
+[Unit]
+Description=CarPi Speed Fusion Daemon
+
+[Service]
+Type=simple
+ExecStart=$INSTALL_DESTINATION/SpeedFusionDaemon.py
+
+[Install]
+WantedBy=multi-user.target
+
+EOF
+    systemctl daemon-reload
+    systemctl disable carpi-fusion-daemon
+fi
+
 # ## Step 6: Copying Configuration Files
 setStatus "Step 6: Copying Configuration Files..." 0
 if [ ! -d "$CONFIG_DESTINATION" ]; then
@@ -189,6 +245,31 @@ for i in ${CONFIG_FILES[@]}; do
     fi
 done
 
+# ## Step 7: Configuring Redis Unix Domain Socket
+setStatus "Step 7: Configuring Redis Unix Domain Socket..." 0
+if [ -f "$REDIS_CONFIG" ]; then
+    if ! grep -q "^unixsocket " "$REDIS_CONFIG"; then
+        echo "unixsocket $REDIS_SOCKET" >> "$REDIS_CONFIG"
+        echo "unixsocketperm 777" >> "$REDIS_CONFIG"
+        systemctl restart redis-server
+    fi
+    REDIS_SOCKET=$(grep "^unixsocket " "$REDIS_CONFIG" | awk '{print $2}')
+    for i in ${CONFIG_FILES[@]}; do
+        configBaseName=$(basename "${i}")
+        sed -i "s|^socket =\s*$|socket = $REDIS_SOCKET|" "$CONFIG_DESTINATION/$configBaseName"
+    done
+fi
+
+# ## Step 8: Building the place table for the location lookup
+setStatus "Step 8: Building place table..." 0
+if [ ! -f "$PLACES_TABLE" ]; then
+    PLACES_CSV=$(mktemp)
+    if wget -q -O "$PLACES_CSV" "$PLACES_SOURCE"; then
+        python "$INSTALL_SOURCE/utils/geocoder/build_place_table.py" "$PLACES_CSV" "$PLACES_TABLE" >> "/var/log/carpi/install.daemons.log"
+    fi
+    rm -f "$PLACES_CSV"
+fi
+
 # ## Setup completed
 setStatus "Setup completed, Daemons installed" 100
 sleep 2
@@ -82,6 +82,8 @@ UI_FILES=(
 )
 CONFIG_FILE="$DIR_UI/ui.conf"
 CONFIG_FILE_DESTINATION="/etc/carpi/ui.conf"
+REDIS_CONFIG="/etc/redis/redis.conf"
+REDIS_SOCKET="/var/run/redis/redis-server.sock"
 
 # ## Step 1: Install Dependencies
 setStatus "Step 1: Installing dependencies..." 0
@@ -113,6 +115,18 @@ else
     copyFile "$CONFIG_FILE_DESTINATION.template" "$CONFIG_FILE"
 fi
 
+# ## Step 6: Configuring Redis Unix Domain Socket
+setStatus "Step 6: Configuring Redis Unix Domain Socket..." 0
+if [ -f "$REDIS_CONFIG" ]; then
+    if ! grep -q "^unixsocket " "$REDIS_CONFIG"; then
+        echo "unixsocket $REDIS_SOCKET" >> "$REDIS_CONFIG"
+        echo "unixsocketperm 777" >> "$REDIS_CONFIG"
+        systemctl restart redis-server
+    fi
+    REDIS_SOCKET=$(grep "^unixsocket " "$REDIS_CONFIG" | awk '{print $2}')
+    sed -i "s|^socket =\s*$|socket = $REDIS_SOCKET|" "$CONFIG_FILE_DESTINATION"
+fi
+
 # ## Setup completed
 setStatus "Setup completed" 100
 sleep 2
@@ -101,18 +101,18 @@ if [ ! -d "$INSTALL_DESTINATION" ]; then
     mkdir -p "$INSTALL_DESTINATION"
 fi
 
-echo "[*] Installing Python Dependencies ..."
-pip install geopy reverse_geocoder
-
 echo "[*] Installing CarPi Commons ..."
 copyFile "$INSTALL_DESTINATION" "$DIR_COMMONS/CarPiConfig.py"
 copyFile "$INSTALL_DESTINATION" "$DIR_COMMONS/CarPiLogging.py"
 copyFile "$INSTALL_DESTINATION" "$DIR_COMMONS/CarPiThreading.py"
+copyFile "$INSTALL_DESTINATION" "$DIR_COMMONS/GeoDistance.py"
 copyFile "$INSTALL_DESTINATION" "$DIR_COMMONS/RedisKeys.py"
 copyFile "$INSTALL_DESTINATION" "$DIR_COMMONS/RedisUtils.py"
 
 echo "[*] Installing Daemons ..."
 copyFile "$INSTALL_DESTINATION" "$DIR_DAEMONS/GpsDaemon.py"
+copyFile "$INSTALL_DESTINATION" "$DIR_DAEMONS/GpsdClient.py"
+copyFile "$INSTALL_DESTINATION" "$DIR_DAEMONS/ReverseGeocoder.py"
 chmod +x "$INSTALL_DESTINATION/GpsDaemon.py"
 
 echo "[*] Cleaning up ..."
@@ -0,0 +1,137 @@
+#!/usr/bin/env python
+"""
+MIT License
+
+Copyright (c) 2017 Raphael "rGunti" Guntersweiler
+
+Permission is hereby granted, free of charge, to any person obtaining a copy
+of this software and associated documentation files (the "Software"), to deal
+in the Software without restriction, including without limitation the rights
+to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+copies of the Software, and to permit persons to whom the Software is
+furnished to do so, subject to the following conditions:
+
+The above copyright notice and this permission notice shall be included in all
+copies or substantial portions of the Software.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+SOFTWARE.
+"""
+from math import cos, radians
+from os import path
+from random import Random
+import sys
+import unittest
+
+sys.path.append(path.join(path.dirname(path.abspath(__file__)), '..', 'CarPiCommons'))
+
+import GeoDistance
+from GeoDistance import METHOD_HAVERSINE, METHOD_ELLIPSOID, METHOD_VINCENTY, DISTANCE_FUNCTIONS, \
+    vincenty_distance, haversine_distance, ellipsoid_distance, get_path_distances, get_path_distance
+
+# Reference from Vincenty's paper (Flinders Peak -> Buninyong)
+REFERENCE = ((-37.95103342, 144.42486789), (-37.65282114, 143.92649554), 54972.271)
+
+PAIRS_PER_DISTANCE = 200
+
+
+def create_pairs(rnd, distance, count):
+    """
+    Creates pairs of points roughly <distance> meters apart, anywhere between 60 deg South and North
+    :param Random rnd:
+    :param float distance: In meters
+    :param int count:
+    :return list of (float, float, float, float):
+    """
+    pairs = []
+    for i in range(count):
+        lat = rnd.uniform(-60, 60)
+        lon = rnd.uniform(-180, 180)
+        d_lat = rnd.uniform(-1, 1) * distance / 111320.0
+        d_lon = rnd.uniform(-1, 1) * distance / (111320.0 * cos(radians(lat)))
+        pairs.append((lat, lon, lat + d_lat, lon + d_lon))
+    return pairs
+
+
+class DistanceTest(unittest.TestCase):
+    def setUp(self):
+        self._rnd = Random(42)
+
+    def test_vincenty_reference(self):
+        (lat1, lon1), (lat2, lon2), expected = REFERENCE
+        self.assertAlmostEqual(vincenty_distance(lat1, lon1, lat2, lon2), expected, delta=0.001)
+        self.assertAlmostEqual(vincenty_distance(lat2, lon2, lat1, lon1), expected, delta=0.001)
+
+    def test_same_point(self):
+        for f in DISTANCE_FUNCTIONS.values():
+            self.assertEqual(f(47.0, 8.0, 47.0, 8.0), 0)
+
+    def test_ellipsoid_compared_to_vincenty(self):
+        # Accurate to a centimeter for the distance between GPS samples
+        for distance in [1, 10, 100, 1000]:
+            for pair in create_pairs(self._rnd, distance, PAIRS_PER_DISTANCE):
+                self.assertAlmostEqual(ellipsoid_distance(*pair), vincenty_distance(*pair), delta=0.01,
+                                       msg='{} m: {}'.format(distance, pair))
+
+    def test_haversine_compared_to_vincenty(self):
+        for distance in [10, 1000, 100000]:
+            for pair in create_pairs(self._rnd, distance, PAIRS_PER_DISTANCE):
+                reference = vincenty_distance(*pair)
+                self.assertLessEqual(abs(haversine_distance(*pair) - reference), reference * 0.006,
+                                     '{} m: {}'.format(distance, pair))
+
+    def test_antimeridian(self):
+        self.assertAlmostEqual(ellipsoid_distance(0, 179.9999, 0, -179.9999),
+                               vincenty_distance(0, 179.9999, 0, -179.9999), delta=0.01)
+
+    def test_unknown_method(self):
+        self.assertRaises(ValueError, GeoDistance.get_distance_function, 'flat')
+
+
+class PathDistanceTest(unittest.TestCase):
+    def setUp(self):
+        rnd = Random(42)
+        # About 3 m between two points (~100 km/h at 10 Hz)
+        self._lats, self._lons = [47.0], [8.0]
+        for i in range(999):
+            self._lats.append(self._lats[-1] + rnd.uniform(-1, 1) * 2.7e-5)
+            self._lons.append(self._lons[-1] + rnd.uniform(-1, 1) * 4e-5)
+        self._numpy = GeoDistance.numpy
+
+    def tearDown(self):
+        GeoDistance.numpy = self._numpy
+
+    def _check_path_distances(self):
+        lats, lons = self._lats, self._lons
+        for method in [METHOD_HAVERSINE, METHOD_ELLIPSOID, METHOD_VINCENTY]:
+            f = DISTANCE_FUNCTIONS[method]
+            distances = get_path_distances(lats, lons, method)
+            self.assertEqual(len(distances), len(lats) - 1)
+            for i in range(1, len(lats)):
+                expected = f(lats[i - 1], lons[i - 1], lats[i], lons[i])
+                # numpy wraps the longitude difference, which costs a few digits
+                self.assertAlmostEqual(distances[i - 1], expected, delta=1e-6, msg=method)
+
+    def test_path_distances(self):
+        self._check_path_distances()
+
+    def test_path_distances_without_numpy(self):
+        GeoDistance.numpy = None
+        self._check_path_distances()
+
+    def test_missing_points_are_skipped(self):
+        lats = [47.0, 47.0001, float('nan'), 47.0002, 47.0003]
+        lons = [8.0, 8.0, float('nan'), 8.0, 8.0]
+        expected = ellipsoid_distance(47.0, 8.0, 47.0001, 8.0) + ellipsoid_distance(47.0002, 8.0, 47.0003, 8.0)
+        self.assertAlmostEqual(get_path_distance(lats, lons), expected, delta=1e-6)
+        GeoDistance.numpy = None
+        self.assertAlmostEqual(get_path_distance(lats, lons), expected, delta=1e-6)
+
+
+if __name__ == '__main__':
+    unittest.main()
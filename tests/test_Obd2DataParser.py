@@ -0,0 +1,85 @@
+#!/usr/bin/env python
+"""
+MIT License
+
+Copyright (c) 2017 Raphael "rGunti" Guntersweiler
+
+Permission is hereby granted, free of charge, to any person obtaining a copy
+of this software and associated documentation files (the "Software"), to deal
+in the Software without restriction, including without limitation the rights
+to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+copies of the Software, and to permit persons to whom the Software is
+furnished to do so, subject to the following conditions:
+
+The above copyright notice and this permission notice shall be included in all
+copies or substantial portions of the Software.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+SOFTWARE.
+"""
+from os import path
+from math import isnan
+import sys
+import unittest
+
+sys.path.append(path.join(path.dirname(path.abspath(__file__)), '..', 'CarPiCommons'))
+sys.path.append(path.join(path.dirname(path.abspath(__file__)), '..', 'CarPiDaemons'))
+
+from Obd2DataParser import decode_obj
+from RedisKeys import ObdRedisKeys
+
+
+class DecodeObjTest(unittest.TestCase):
+    def test_values(self):
+        data = decode_obj({
+            'ATRV': 'ATRV|12.6V||>',
+            '0101': '0101|410183076500||>',
+            '0103': '0103|41030200||>',
+            '0105': '0105|41057B||>',
+            '010C': '010C|410C1AF8||>',
+            '010D': '010D|410D32||>',
+            '0134': '0134|41348000807F||>'
+        })
+        self.assertEqual(data[ObdRedisKeys.KEY_BATTERY_VOLTAGE], 12.6)
+        self.assertEqual(data[ObdRedisKeys.KEY_MIL_STATUS], True)
+        self.assertEqual(data[ObdRedisKeys.KEY_DTC_COUNT], 3)
+        self.assertEqual(data[ObdRedisKeys.KEY_FUELSYS_1_STATUS], 2)
+        self.assertEqual(data[ObdRedisKeys.KEY_FUELSYS_2_STATUS], 0)
+        self.assertEqual(data[ObdRedisKeys.KEY_COOLANT_TEMP], 83)
+        self.assertEqual(data[ObdRedisKeys.KEY_ENGINE_RPM], 1726.0)
+        self.assertEqual(data[ObdRedisKeys.KEY_VEHICLE_SPEED], 50)
+        self.assertAlmostEqual(data[ObdRedisKeys.KEY_O2_SENSOR_FAEQV], 1.0)
+        self.assertAlmostEqual(data[ObdRedisKeys.KEY_O2_SENSOR_CURRENT], 0.49609375)
+        self.assertEqual(data[ObdRedisKeys.KEY_ALIVE], 1)
+
+    def test_invalid_values(self):
+        data = decode_obj({
+            '010C': '010C|NO DATA||>',
+            '010D': '010D|410D||>',
+            '0103': ''
+        })
+        self.assertTrue(isnan(data[ObdRedisKeys.KEY_ENGINE_RPM]))
+        self.assertTrue(isnan(data[ObdRedisKeys.KEY_VEHICLE_SPEED]))
+        self.assertTrue(isnan(data[ObdRedisKeys.KEY_FUELSYS_1_STATUS]))
+        self.assertTrue(isnan(data[ObdRedisKeys.KEY_FUELSYS_2_STATUS]))
+
+    def test_dtcs(self):
+        # The first data byte is the number of DTCs
+        for pid, response, expected in [
+            ('03', '03|4301010300000000||>', ['P0103']),
+            ('03', '03|430201330000||>', ['P0133']),
+            ('03', '03|4300||>', []),
+            ('03', '03|NO DATA||>', []),
+            ('07', '07|47020103C1040000||>', ['P0103', 'U0104'])
+        ]:
+            key = ObdRedisKeys.KEY_CURRENT_DTCS if pid == '03' else ObdRedisKeys.KEY_PENDING_DTCS
+            self.assertEqual(decode_obj({pid: response})[key], expected, response)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,64 @@
+#!/usr/bin/env python
+"""
+MIT License
+
+Copyright (c) 2017 Raphael "rGunti" Guntersweiler
+
+Permission is hereby granted, free of charge, to any person obtaining a copy
+of this software and associated documentation files (the "Software"), to deal
+in the Software without restriction, including without limitation the rights
+to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+copies of the Software, and to permit persons to whom the Software is
+furnished to do so, subject to the following conditions:
+
+The above copyright notice and this permission notice shall be included in all
+copies or substantial portions of the Software.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+SOFTWARE.
+"""
+from datetime import datetime
+from os import path
+import sys
+import unittest
+
+import pytz
+
+sys.path.append(path.join(path.dirname(path.abspath(__file__)), '..', 'CarPiCommons'))
+
+import RedisUtils
+from RedisUtils import decode_value, unpack_value, _serialize
+from RedisKeys import GpsRedisKeys
+
+
+class DecodeValueTest(unittest.TestCase):
+    def tearDown(self):
+        RedisUtils.RCONFIG_VALUE_ENCODING = RedisUtils.ENCODING_TEXT
+
+    def test_timestamps_decode_the_same_with_both_encodings(self):
+        now = datetime(2017, 11, 5, 12, 34, 56, 789000, pytz.utc)
+        for encoding in [RedisUtils.ENCODING_TEXT, RedisUtils.ENCODING_PACKED]:
+            RedisUtils.RCONFIG_VALUE_ENCODING = encoding
+            stored = _serialize(now, GpsRedisKeys.KEY_ALIVE)
+            self.assertEqual(decode_value(GpsRedisKeys.KEY_ALIVE, unpack_value(stored)), now, encoding)
+
+    def test_text_timestamps(self):
+        self.assertEqual(decode_value(GpsRedisKeys.KEY_ALIVE, '2017-11-05 14:34:56+02:00'),
+                         datetime(2017, 11, 5, 12, 34, 56, tzinfo=pytz.utc))
+        self.assertIsNone(decode_value(GpsRedisKeys.KEY_ALIVE, 'invalid'))
+
+    def test_floats(self):
+        RedisUtils.RCONFIG_VALUE_ENCODING = RedisUtils.ENCODING_PACKED
+        stored = _serialize(47.5, GpsRedisKeys.KEY_LATITUDE)
+        self.assertEqual(decode_value(GpsRedisKeys.KEY_LATITUDE, unpack_value(stored)), 47.5)
+        self.assertEqual(decode_value(GpsRedisKeys.KEY_LATITUDE, '47.5'), 47.5)
+        self.assertIsNone(decode_value(GpsRedisKeys.KEY_LATITUDE, 'nan'))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,203 @@
+#!/usr/bin/env python
+"""
+MIT License
+
+Copyright (c) 2017 Raphael "rGunti" Guntersweiler
+
+Permission is hereby granted, free of charge, to any person obtaining a copy
+of this software and associated documentation files (the "Software"), to deal
+in the Software without restriction, including without limitation the rights
+to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+copies of the Software, and to permit persons to whom the Software is
+furnished to do so, subject to the following conditions:
+
+The above copyright notice and this permission notice shall be included in all
+copies or substantial portions of the Software.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+SOFTWARE.
+"""
+from math import radians, sin, cos
+from os import path
+from random import Random
+import sys
+import unittest
+
+sys.path.append(path.join(path.dirname(path.abspath(__file__)), '..', 'CarPiCommons'))
+sys.path.append(path.join(path.dirname(path.abspath(__file__)), '..', 'CarPiDaemons'))
+
+from GeoDistance import ellipsoid_distance
+from RedisKeys import GpsRedisKeys, ObdRedisKeys, FusionRedisKeys
+from RedisUtils import DataSnapshot
+from SpeedFusionDaemon import SpeedFusionFilter, SpeedFusion
+
+STEP = 0.05  # [s] 20 Hz
+GPS_INTERVAL = 20  # steps
+OBD_INTERVAL = 2  # steps
+
+START = (47.0, 8.0)
+M_PER_DEG_LAT = 111180.0
+M_PER_DEG_LON = 111180.0 * cos(radians(START[0]))
+
+# Simulated GPS errors (std. deviation) and the errors reported with each fix
+GPS_POSITION_NOISE = 3.0  # [m]
+GPS_SPEED_NOISE = 0.2  # [m/s]
+GPS_TRACK_NOISE = 1.0  # [deg]
+GPS_REPORTED_ERRORS = (6.0, 0.5, 3.0)  # EPX/EPY [m], EPS [m/s], EPD [deg]
+
+MAX_TRACK_ERROR = 2.0  # [deg]
+MAX_SPEED_ERROR = 0.5  # [m/s]
+MAX_POSITION_ERROR = 10.0  # [m]
+MAX_DEAD_RECKONING_ERROR = 15.0  # [m] after 10 s without GPS
+
+
+def straight(t):
+    return 20.0, 45.0
+
+
+def turn(t):
+    """
+    Heads North for 20 s, then turns East at 9 deg/s (about 0.3 g at 72 km/h)
+    """
+    return 20.0, min(max(t - 20.0, 0.0) * 9.0, 90.0)
+
+
+def simulate(drive, duration, gps_from=0.0, gps_gap=None):
+    """
+    Simulates a drive with GPS fixes at 1 Hz and the OBD speed at 10 Hz
+    :param function drive: Returns the speed [m/s] and track [deg] at the given time
+    :param float duration: In seconds
+    :param float gps_from: Time of the first GPS fix
+    :param (float, float)|None gps_gap: Time span without GPS fixes
+    :return list of (float, float, float, float, float):
+    Time, speed error, track error, position error and fused speed
+    """
+    rnd = Random(42)
+    f = SpeedFusionFilter()
+    east = north = 0.0
+    samples = []
+    for step in range(int(duration / STEP)):
+        t = step * STEP
+        speed, track = drive(t)
+        if step:
+            east += speed * STEP * sin(radians(track))
+            north += speed * STEP * cos(radians(track))
+        f.predict(t)
+
+        in_gap = gps_gap and gps_gap[0] <= t < gps_gap[1]
+        if step % GPS_INTERVAL == 0 and t >= gps_from and not in_gap:
+            epx, eps, epd = GPS_REPORTED_ERRORS
+            f.update_gps(START[0] + (north + rnd.gauss(0, GPS_POSITION_NOISE)) / M_PER_DEG_LAT,
+                         START[1] + (east + rnd.gauss(0, GPS_POSITION_NOISE)) / M_PER_DEG_LON,
+                         epx, epx,
+                         speed + rnd.gauss(0, GPS_SPEED_NOISE), eps,
+                         (track + rnd.gauss(0, GPS_TRACK_NOISE)) % 360, epd)
+        if step % OBD_INTERVAL == 0:
+            # OBD reports whole km/h
+            f.update_obd(float(int(round(speed * 3.6))))
+
+        fused_track = f.get_track()
+        track_error = abs((fused_track - track + 180) % 360 - 180) if fused_track is not None else None
+        lat, lon = f.get_position()
+        position_error = ellipsoid_distance(lat, lon, START[0] + north / M_PER_DEG_LAT,
+                                            START[1] + east / M_PER_DEG_LON) if lat is not None else None
+        samples.append((t, abs(f.get_speed() - speed), track_error, position_error, f.get_speed()))
+    return samples
+
+
+class SpeedFusionFilterTest(unittest.TestCase):
+    def assert_max_errors(self, samples, start, end=None):
+        samples = [s for s in samples if s[0] >= start and (end is None or s[0] < end)]
+        self.assertLessEqual(max([s[1] for s in samples]), MAX_SPEED_ERROR, 'speed')
+        self.assertLessEqual(max([s[2] for s in samples]), MAX_TRACK_ERROR, 'track')
+        self.assertLessEqual(max([s[3] for s in samples]), MAX_POSITION_ERROR, 'position')
+
+    def test_obd_only_updates_the_speed(self):
+        f = SpeedFusionFilter()
+        f.predict(0.0)
+        f.update_gps(START[0], START[1], 5.0, 5.0, 20.0, 0.5, 90.0, 3.0)
+        for i in range(1, 21):
+            f.predict(i * 0.1)
+            f.update_obd(90.0)
+        self.assertAlmostEqual(f.get_track(), 90.0, delta=0.1)
+        self.assertGreater(f.get_speed(), 22.0)
+
+    def test_obd_before_the_first_fix(self):
+        # The direction made up from OBD alone must not survive the first GPS heading
+        f = SpeedFusionFilter()
+        for i in range(30):
+            f.predict(i * 0.1)
+            f.update_obd(72.0)
+        self.assertTrue(f.has_velocity())
+        self.assertAlmostEqual(f.get_speed(), 20.0, delta=0.5)
+        f.predict(3.0)
+        f.update_gps(START[0], START[1], 5.0, 5.0, 20.0, 0.5, 90.0, 3.0)
+        self.assertAlmostEqual(f.get_track(), 90.0, delta=0.5)
+        self.assertAlmostEqual(f.get_speed(), 20.0, delta=0.5)
+
+    def test_straight_run(self):
+        self.assert_max_errors(simulate(straight, 60), 10)
+
+    def test_obd_speed_before_the_first_fix(self):
+        self.assert_max_errors(simulate(straight, 30, gps_from=3), 13)
+
+    def test_turn(self):
+        samples = simulate(turn, 50)
+        self.assert_max_errors(samples, 10, 20)
+        # The track lags behind during the turn, but has to settle afterwards
+        self.assert_max_errors(samples, 37)
+        self.assertLessEqual(max([s[4] for s in samples]) - 20.0, MAX_SPEED_ERROR, 'speed overshoots')
+
+    def test_dead_reckoning(self):
+        samples = simulate(straight, 40, gps_gap=(20, 30))
+        self.assertLessEqual(max([s[3] for s in samples if 20 <= s[0] < 30]), MAX_DEAD_RECKONING_ERROR)
+
+
+class SpeedFusionTest(unittest.TestCase):
+    def setUp(self):
+        self._fusion = SpeedFusion(SpeedFusionFilter(), obd_update_interval=1, max_dead_reckoning=10, timeout=5)
+        self._snapshot = DataSnapshot(0, {}, frozenset(), {})
+
+    def _update(self, now, **values):
+        data = dict(self._snapshot.data)
+        data.update(values)
+        self._snapshot = self._snapshot.create_next(data)
+        return self._fusion.update(self._snapshot, now)
+
+    def _gps(self, now, lat=START[0]):
+        return self._update(now, **{
+            GpsRedisKeys.KEY_TIME: str(now),
+            GpsRedisKeys.KEY_FIX_MODE: 3,
+            GpsRedisKeys.KEY_LATITUDE: lat,
+            GpsRedisKeys.KEY_LONGITUDE: START[1],
+            GpsRedisKeys.KEY_SPEED: 0.0,
+            GpsRedisKeys.KEY_TRACK: 0.0
+        })
+
+    def test_no_measurements(self):
+        self.assertEqual(self._update(0.0), SpeedFusion.get_empty_data())
+
+    def test_reset_on_timeout(self):
+        data = self._update(0.0, **{ObdRedisKeys.KEY_ALIVE: 1, ObdRedisKeys.KEY_VEHICLE_SPEED: 36.0})
+        self.assertIsNotNone(data[FusionRedisKeys.KEY_SPEED])
+        self.assertIsNotNone(self._update(4.0, **{ObdRedisKeys.KEY_ALIVE: 0})[FusionRedisKeys.KEY_SPEED])
+        self.assertEqual(self._update(6.0), SpeedFusion.get_empty_data())
+
+    def test_drop_position_without_gps(self):
+        self.assertIsNotNone(self._gps(0.0)[FusionRedisKeys.KEY_LATITUDE])
+        obd = {ObdRedisKeys.KEY_ALIVE: 1, ObdRedisKeys.KEY_VEHICLE_SPEED: 0.0}
+        for now in range(1, 11):
+            self.assertIsNotNone(self._update(float(now), **obd)[FusionRedisKeys.KEY_LATITUDE])
+        data = self._update(11.0, **obd)
+        self.assertIsNone(data[FusionRedisKeys.KEY_LATITUDE])
+        self.assertIsNotNone(data[FusionRedisKeys.KEY_SPEED])
+        self.assertIsNotNone(self._gps(12.0)[FusionRedisKeys.KEY_LATITUDE])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,68 @@
+#!/usr/bin/env python
+"""
+MIT License
+
+Copyright (c) 2017 Raphael "rGunti" Guntersweiler
+
+Permission is hereby granted, free of charge, to any person obtaining a copy
+of this software and associated documentation files (the "Software"), to deal
+in the Software without restriction, including without limitation the rights
+to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+copies of the Software, and to permit persons to whom the Software is
+furnished to do so, subject to the following conditions:
+
+The above copyright notice and this permission notice shall be included in all
+copies or substantial portions of the Software.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+SOFTWARE.
+"""
+from os import path
+from shutil import rmtree
+from tempfile import mkdtemp
+import sys
+import unittest
+
+sys.path.append(path.join(path.dirname(path.abspath(__file__)), '..', 'CarPiCommons'))
+
+from TripLog import TripLogWriter, read_trip_log, COLUMN_TIME, COLUMN_SPEED
+
+
+class TripLogWriterTest(unittest.TestCase):
+    def setUp(self):
+        self._directory = mkdtemp()
+        self._path = path.join(self._directory, 'trip.trip')
+
+    def tearDown(self):
+        rmtree(self._directory)
+
+    def _read_times(self):
+        return [list(chunk[COLUMN_TIME]) for chunk in read_trip_log(self._path)]
+
+    def test_round_trip(self):
+        writer = TripLogWriter(self._path, chunk_size=2, max_chunk_age=60)
+        for i in range(5):
+            writer.append([i, 47.0, 8.0, None, 800, 30], now=i)
+        self.assertEqual(self._read_times(), [[0, 1], [2, 3]])
+        writer.close()
+        chunks = list(read_trip_log(self._path))
+        self.assertEqual([list(chunk[COLUMN_TIME]) for chunk in chunks], [[0, 1], [2, 3], [4]])
+        self.assertNotEqual(chunks[0][COLUMN_SPEED][0], chunks[0][COLUMN_SPEED][0])  # None => NaN
+
+    def test_flush_if_due_without_new_rows(self):
+        writer = TripLogWriter(self._path, chunk_size=600, max_chunk_age=10)
+        writer.append([0, 47.0, 8.0, 0, 800, 30], now=0)
+        writer.flush_if_due(9)
+        self.assertEqual(self._read_times(), [])
+        writer.flush_if_due(10)
+        self.assertEqual(self._read_times(), [[0]])
+        writer.close()
+
+
+if __name__ == '__main__':
+    unittest.main()
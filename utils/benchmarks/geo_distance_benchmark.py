@@ -0,0 +1,97 @@
+#!/usr/bin/env python
+"""
+MIT License
+
+Copyright (c) 2017 Raphael "rGunti" Guntersweiler
+
+Permission is hereby granted, free of charge, to any person obtaining a copy
+of this software and associated documentation files (the "Software"), to deal
+in the Software without restriction, including without limitation the rights
+to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+copies of the Software, and to permit persons to whom the Software is
+furnished to do so, subject to the following conditions:
+
+The above copyright notice and this permission notice shall be included in all
+copies or substantial portions of the Software.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+SOFTWARE.
+"""
+from math import cos, radians
+from os import path
+from random import Random
+from timeit import timeit
+import sys
+
+sys.path.append(path.join(path.dirname(path.abspath(__file__)), '..', '..', 'CarPiCommons'))
+
+from GeoDistance import DISTANCE_FUNCTIONS, METHOD_HAVERSINE, METHOD_ELLIPSOID, METHOD_VINCENTY, \
+    get_path_distances, numpy
+
+try:
+    from geopy.distance import vincenty as geopy_vincenty
+except ImportError:
+    geopy_vincenty = None
+
+# The accuracy of the distance functions is covered by tests/test_GeoDistance.py
+ITERATIONS = 10000
+PATH_POINTS = 36000  # One hour of samples at 10 Hz
+
+
+def create_pairs(rnd, distance, count):
+    """
+    Creates pairs of points roughly <distance> meters apart, anywhere between 60 deg South and North
+    :param Random rnd:
+    :param float distance: In meters
+    :param int count:
+    :return list of (float, float, float, float):
+    """
+    pairs = []
+    for i in range(count):
+        lat = rnd.uniform(-60, 60)
+        lon = rnd.uniform(-180, 180)
+        d_lat = rnd.uniform(-1, 1) * distance / 111320.0
+        d_lon = rnd.uniform(-1, 1) * distance / (111320.0 * cos(radians(lat)))
+        pairs.append((lat, lon, lat + d_lat, lon + d_lon))
+    return pairs
+
+
+def create_path(rnd, count):
+    """
+    Creates a path with points about 3 m apart (~100 km/h at 10 Hz)
+    :param Random rnd:
+    :param int count:
+    :return (list of float, list of float):
+    """
+    lats, lons = [47.0], [8.0]
+    for i in range(count - 1):
+        lats.append(lats[-1] + rnd.uniform(-1, 1) * 2.7e-5)
+        lons.append(lons[-1] + rnd.uniform(-1, 1) * 4e-5)
+    return lats, lons
+
+
+if __name__ == "__main__":
+    rnd = Random(42)
+
+    print('Speed ({} distances between GPS samples)'.format(ITERATIONS))
+    pairs = create_pairs(rnd, 3, ITERATIONS)
+    for method in [METHOD_VINCENTY, METHOD_HAVERSINE, METHOD_ELLIPSOID]:
+        f = DISTANCE_FUNCTIONS[method]
+        t = timeit(lambda: [f(*pair) for pair in pairs], number=1)
+        print('{:<10} {:>8.2f} us per distance'.format(method, t / ITERATIONS * 1e6))
+    if geopy_vincenty:
+        t = timeit(lambda: [geopy_vincenty(p[:2], p[2:]).meters for p in pairs], number=1)
+        print('{:<10} {:>8.2f} us per distance'.format('geopy', t / ITERATIONS * 1e6))
+    print('')
+
+    lats, lons = create_path(rnd, PATH_POINTS)
+    print('Recomputing a trip of {} points ({})'.format(
+        PATH_POINTS, 'vectorized with numpy' if numpy else 'numpy not installed'))
+    for method in [METHOD_VINCENTY, METHOD_HAVERSINE, METHOD_ELLIPSOID]:
+        t = timeit(lambda: get_path_distances(lats, lons, method), number=1)
+        print('{:<10} {:>8.2f} ms'.format(method, t * 1e3))
@@ -0,0 +1,68 @@
+#!/usr/bin/env python
+"""
+MIT License
+
+Copyright (c) 2017 Raphael "rGunti" Guntersweiler
+
+Permission is hereby granted, free of charge, to any person obtaining a copy
+of this software and associated documentation files (the "Software"), to deal
+in the Software without restriction, including without limitation the rights
+to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+copies of the Software, and to permit persons to whom the Software is
+furnished to do so, subject to the following conditions:
+
+The above copyright notice and this permission notice shall be included in all
+copies or substantial portions of the Software.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+SOFTWARE.
+"""
+from os import path, devnull
+from timeit import timeit
+import sys
+
+sys.path.append(path.join(path.dirname(path.abspath(__file__)), '..', '..', 'CarPiCommons'))
+sys.path.append(path.join(path.dirname(path.abspath(__file__)), '..', '..', 'CarPiDaemons'))
+
+from Obd2DataParser import decode_obj, set_debug_log
+
+ITERATIONS = 10000
+
+# Responses as returned by the OBD daemon for a typical poll sequence
+RESPONSES = {
+    'ATRV': 'ATRV|12.6V||>',
+    '0101': '0101|410183076500||>',
+    '0103': '0103|41030200||>',
+    '0105': '0105|41057B||>',
+    '010B': '010B|410B1E||>',
+    '010C': '010C|410C1AF8||>',
+    '010D': '010D|410D32||>',
+    '010F': '010F|410F3C||>',
+    '0134': '0134|41348000807F||>'
+}
+
+
+def run():
+    decode_obj(RESPONSES)
+
+
+if __name__ == "__main__":
+    print('Decoding {} PIDs, {} iterations'.format(len(RESPONSES), ITERATIONS))
+
+    # Every value is logged with debug_log enabled
+    set_debug_log(True)
+    stdout = sys.stdout
+    sys.stdout = open(devnull, 'w')
+    logged = timeit(run, number=ITERATIONS)
+    sys.stdout.close()
+    sys.stdout = stdout
+    print('decode_obj with debug_log: {:>8.2f} us per poll'.format(logged / ITERATIONS * 1e6))
+
+    set_debug_log(False)
+    t = timeit(run, number=ITERATIONS)
+    print('decode_obj:                {:>8.2f} us per poll'.format(t / ITERATIONS * 1e6))
@@ -0,0 +1,76 @@
+#!/usr/bin/env python
+"""
+MIT License
+
+Copyright (c) 2017 Raphael "rGunti" Guntersweiler
+
+Permission is hereby granted, free of charge, to any person obtaining a copy
+of this software and associated documentation files (the "Software"), to deal
+in the Software without restriction, including without limitation the rights
+to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+copies of the Software, and to permit persons to whom the Software is
+furnished to do so, subject to the following conditions:
+
+The above copyright notice and this permission notice shall be included in all
+copies or substantial portions of the Software.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+SOFTWARE.
+"""
+from os import path
+from timeit import timeit
+import sys
+
+sys.path.append(path.join(path.dirname(path.abspath(__file__)), '..', '..', 'CarPiCommons'))
+
+from RedisKeys import GpsRedisKeys, ObdRedisKeys
+from RedisUtils import get_shared_redis, get_piped, set_piped
+
+ITERATIONS = 5000
+
+TCP_HOST = 'localhost'
+TCP_PORT = 6379
+UNIX_SOCKET = '/var/run/redis/redis-server.sock'
+DB = 15
+
+# The keys the UI requests on every fetch
+KEYS = GpsRedisKeys.KEYS + ObdRedisKeys.KEYS
+
+
+def measure(r):
+    """
+    Measures the average round-trip time of get_piped on the given client
+    :param Redis r:
+    :return float: Seconds per call
+    """
+    get_piped(r, KEYS)  # establish the connection before measuring
+    return timeit(lambda: get_piped(r, KEYS), number=ITERATIONS) / ITERATIONS
+
+
+if __name__ == "__main__":
+    # Usage: redis_socket_benchmark.py [unix socket path] [tcp host] [tcp port]
+    if len(sys.argv) > 1:
+        UNIX_SOCKET = sys.argv[1]
+    if len(sys.argv) > 2:
+        TCP_HOST = sys.argv[2]
+    if len(sys.argv) > 3:
+        TCP_PORT = int(sys.argv[3])
+
+    tcp = get_shared_redis(host=TCP_HOST, port=TCP_PORT, db=DB)
+    unix = get_shared_redis(socket=UNIX_SOCKET, db=DB)
+
+    set_piped(tcp, dict((key, '0') for key in KEYS))
+
+    print('Requesting {} keys with get_piped, {} iterations (db {})'.format(len(KEYS), ITERATIONS, DB))
+    tcp_time = measure(tcp)
+    print('TCP ({}:{}):{:>28.2f} us per call'.format(TCP_HOST, TCP_PORT, tcp_time * 1e6))
+    unix_time = measure(unix)
+    print('Unix Domain Socket ({}):{:>8.2f} us per call'.format(UNIX_SOCKET, unix_time * 1e6))
+    print('Speedup: {:.2f}x'.format(tcp_time / unix_time))
+
+    tcp.delete(*KEYS)
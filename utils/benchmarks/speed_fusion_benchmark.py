@@ -0,0 +1,53 @@
+#!/usr/bin/env python
+"""
+MIT License
+
+Copyright (c) 2017 Raphael "rGunti" Guntersweiler
+
+Permission is hereby granted, free of charge, to any person obtaining a copy
+of this software and associated documentation files (the "Software"), to deal
+in the Software without restriction, including without limitation the rights
+to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+copies of the Software, and to permit persons to whom the Software is
+furnished to do so, subject to the following conditions:
+
+The above copyright notice and this permission notice shall be included in all
+copies or substantial portions of the Software.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+SOFTWARE.
+
+Times one step of the SpeedFusionFilter (predict + OBD update), which runs at
+the OBD update rate. The accuracy of the filter is covered by
+tests/test_SpeedFusionDaemon.py
+"""
+from os import path
+from timeit import timeit
+import sys
+
+sys.path.append(path.join(path.dirname(path.abspath(__file__)), '..', '..', 'CarPiCommons'))
+sys.path.append(path.join(path.dirname(path.abspath(__file__)), '..', '..', 'CarPiDaemons'))
+
+from SpeedFusionDaemon import SpeedFusionFilter
+
+STEP = 0.05  # [s] 20 Hz
+ITERATIONS = 10000
+
+
+if __name__ == "__main__":
+    f = SpeedFusionFilter()
+    f.update_gps(47.0, 8.0, 5.0, 5.0, 20.0, 0.5, 45.0, 3.0)
+    clock = [0.0]
+
+    def run_step():
+        clock[0] += STEP
+        f.predict(clock[0])
+        f.update_obd(72.0)
+
+    t = timeit(run_step, number=ITERATIONS)
+    print('Filter step (predict + OBD update): {:.1f} us'.format(t / ITERATIONS * 1e6))
@@ -0,0 +1,68 @@
+#!/usr/bin/env python
+"""
+MIT License
+
+Copyright (c) 2017 Raphael "rGunti" Guntersweiler
+
+Permission is hereby granted, free of charge, to any person obtaining a copy
+of this software and associated documentation files (the "Software"), to deal
+in the Software without restriction, including without limitation the rights
+to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+copies of the Software, and to permit persons to whom the Software is
+furnished to do so, subject to the following conditions:
+
+The above copyright notice and this permission notice shall be included in all
+copies or substantial portions of the Software.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+SOFTWARE.
+
+Builds the place table used by the GPS Daemon to determine the current location.
+Usage: build_place_table.py <places.csv> <places.bin> [cell size in degrees]
+
+The input is a CSV file with the columns lat, lon, name, admin1, admin2 and cc
+(e.g. rg_cities1000.csv of the reverse_geocoder package, which is based on GeoNames).
+"""
+from csv import reader
+from os import path
+import sys
+
+sys.path.append(path.join(path.dirname(path.abspath(__file__)), '..', '..', 'CarPiDaemons'))
+
+from ReverseGeocoder import build_place_table, DEFAULT_CELL_SIZE
+
+CSV_COLUMNS = ['lat', 'lon', 'name', 'admin1', 'admin2', 'cc']
+
+
+def read_places(csv_path):
+    """
+    :param str csv_path:
+    :return list of (float, float, unicode, unicode, unicode, unicode):
+    """
+    places = []
+    with open(csv_path, 'rb') as f:
+        rows = reader(f)
+        header = next(rows)
+        columns = [header.index(column) for column in CSV_COLUMNS]
+        for row in rows:
+            lat, lon, name, admin1, admin2, cc = [row[i] for i in columns]
+            places.append((float(lat), float(lon),
+                           name.decode('utf-8'), admin1.decode('utf-8'),
+                           admin2.decode('utf-8'), cc.decode('utf-8')))
+    return places
+
+
+if __name__ == "__main__":
+    if len(sys.argv) < 3:
+        print('Usage: {} <places.csv> <places.bin> [cell size in degrees]'.format(sys.argv[0]))
+        sys.exit(1)
+
+    cell_size = float(sys.argv[3]) if len(sys.argv) > 3 else DEFAULT_CELL_SIZE
+    places = read_places(sys.argv[1])
+    count = build_place_table(places, sys.argv[2], cell_size)
+    print('{} places written to {}'.format(count, sys.argv[2]))